@@ -1,6 +1,5 @@
 import csv
 import os.path
-import time
 from smart_util import Util
 
 
@@ -47,6 +46,9 @@ class NYC:
     max_pickup_coordinates_lng = -73.65
     max_pickup_coordinates_lat = 40.95
     max_pickup_coordinates_zoom = 11
+    # result rows of construct_sql_str() are (id, x, y) points (see PostgreSQL.query_points())
+    points_result = True
+    tables = [table]
     indexes = [
         index_on_pickup_datetime,
         index_on_trip_distance,
@@ -84,31 +86,24 @@ class NYC:
 
         # generate hint if plan is 1 ~ 7
         if 1 <= _plan <= 7:
-            # translate the _plan number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
             hint = "/*+ BitmapScan(t"
 
             # pick_datetime
-            if plan_bits[5] == 1:
+            if Util.use_index(0, _plan, 3):
                 hint = hint + " " + NYC.index_on_pickup_datetime
 
             # trip_distance
-            if plan_bits[6] == 1:
+            if Util.use_index(1, _plan, 3):
                 hint = hint + " " + NYC.index_on_trip_distance
 
             # pickup_coordinates
-            if plan_bits[7] == 1:
+            if Util.use_index(2, _plan, 3):
                 hint = hint + " " + NYC.index_on_pickup_coordinates
 
             hint = hint + ") */"
             sql = hint + sql
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
 
     # time probing query of selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -138,27 +133,20 @@ class NYC:
 
         # set up filtering on sample table if filtering combination is 1 ~ 7
         if 1 <= _fc <= 7:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # pickup_datetime
-            if fc_bits[5] == 1:
+            if Util.use_index(0, _fc, 3):
                 sql = sql + " AND t.pickup_datetime between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # trip_distance
-            if fc_bits[6] == 1:
+            if Util.use_index(1, _fc, 3):
                 sql = sql + " AND t.trip_distance between " + str(_query["trip_distance_start"]) + " and " + str(_query["trip_distance_end"])
 
             # pickup_coordinates
-            if fc_bits[7] == 1:
+            if Util.use_index(2, _fc, 3):
                 sql = sql + " AND t.pickup_coordinates <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                                "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
 
     # collect selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -189,20 +177,16 @@ class NYC:
 
         # set up filtering on sample table if filtering combination is 1 ~ 7
         if 1 <= _fc <= 7:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # pickup_datetime
-            if fc_bits[5] == 1:
+            if Util.use_index(0, _fc, 3):
                 sql = sql + " AND t.pickup_datetime between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # trip_distance
-            if fc_bits[6] == 1:
+            if Util.use_index(1, _fc, 3):
                 sql = sql + " AND t.trip_distance between " + str(_query["trip_distance_start"]) + " and " + str(_query["trip_distance_end"])
 
             # pickup_coordinates
-            if fc_bits[7] == 1:
+            if Util.use_index(2, _fc, 3):
                 sql = sql + " AND t.pickup_coordinates <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                                "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
@@ -210,6 +194,89 @@ class NYC:
         sel = sel[0][0]
         return float(sel) / float(_table_size)
 
+    # filtering predicates of given query on each dimension, in the order of hint ids
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @return - [list of _dimension predicate strings on table alias t]
+    # TODO - dimension is not used for NYC dataset, only support 3D.
+    @staticmethod
+    def sel_predicates(_dimension, _query):
+        return [
+            # pickup_datetime
+            "t.pickup_datetime between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'",
+            # trip_distance
+            "t.trip_distance between " + str(_query["trip_distance_start"]) + " and " +
+            str(_query["trip_distance_end"]),
+            # pickup_coordinates
+            "t.pickup_coordinates <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
+                                        "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
+        ]
+
+    # collect selectivities of all filtering combinations on given query in one scan of the table
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @param _table - table name on which to collect selectivities
+    # @param _table_size - the size of the table provided above
+    # @return - [list of 2**_dimension-1 floats], selectivity [0, 1] of filtering combination fc at index fc - 1
+    @staticmethod
+    def sels_query(_db, _dimension, _query, _table, _table_size):
+        sql = Util.sels_sql(_table, NYC.sel_predicates(_dimension, _query))
+        sels = _db.query(sql)  # [(1, 2, ..., 2**d-1)]
+        return [float(sel) / float(_table_size) for sel in sels[0]]
+
+    # time the single scan probing query of selectivities of all filtering combinations on given query
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @param _table - table name on which to run the selectivity probing query
+    # @return - time (seconds) of the single scan probing query of all filtering combinations on given query
+    @staticmethod
+    def time_sels_query(_db, _dimension, _query, _table):
+        sql = Util.sels_sql(_table, NYC.sel_predicates(_dimension, _query))
+        return _db.time(sql)
+
+    # parameters of the selectivity predicates of a query, shipped in the VALUES list of the batched probing query
+    # @param _dimension - dimension of queries
+    # @return - [list of (query key, SQL type)]
+    @staticmethod
+    def sel_parameters(_dimension):
+        return [("start_time", "timestamp"), ("end_time", "timestamp"),
+                ("trip_distance_start", "numeric"), ("trip_distance_end", "numeric"),
+                ("lng0", "float8"), ("lat0", "float8"), ("lng1", "float8"), ("lat1", "float8")]
+
+    # selectivity predicates on parameters of alias q, in the order of hint ids, see sel_parameters()
+    # @param _dimension - dimension of queries
+    # @return - [list of _dimension predicate strings on table alias t and parameters alias q]
+    @staticmethod
+    def batch_sel_predicates(_dimension):
+        return [
+            # pickup_datetime
+            "t.pickup_datetime between q.start_time and q.end_time",
+            # trip_distance
+            "t.trip_distance between q.trip_distance_start and q.trip_distance_end",
+            # pickup_coordinates
+            "t.pickup_coordinates <@ box(point(q.lng0, q.lat0), point(q.lng1, q.lat1))"
+        ]
+
+    # collect selectivities of all filtering combinations on given queries in one batched probing query
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _queries - [list of query objects], see sel_query()
+    # @param _table - table name on which to collect selectivities
+    # @param _table_size - the size of the table provided above
+    # @return - [list of [list of 2**_dimension-1 floats]], sels of each query in the order of _queries,
+    #           see sels_query()
+    @staticmethod
+    def batch_sels_query(_db, _dimension, _queries, _table, _table_size):
+        sql = Util.batch_sels_sql(_table, NYC.sel_parameters(_dimension), _queries,
+                                  NYC.batch_sel_predicates(_dimension))
+        rows = _db.query(sql)  # [(qid, 1, 2, ..., 2**d-1), ...]
+        if len(rows) != len(_queries):
+            print("Batched probing query of " + str(len(_queries)) + " queries failed on table [" + _table + "]!")
+            exit(0)
+        return [[float(sel) / float(_table_size) for sel in row[1:]] for row in rows]
+
     # load queries into memory
     # TODO - dimension is not used for NYC dataset, only support 3D.
     @staticmethod
@@ -258,7 +325,7 @@ class NYC:
             exit(0)
         
         sql = "SELECT id, " \
-              "       pickup_coordinates " \
+              "       pickup_coordinates[0], pickup_coordinates[1] " \
               "  FROM " + _table + " t " \
               " WHERE t.pickup_datetime between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'" \
               "   AND t.trip_distance between " + str(_query["trip_distance_start"]) + " and " + str(_query["trip_distance_end"]) + \
@@ -282,24 +349,22 @@ class NYC:
             print("Given plan id " + str(_plan) + " is not invalid!")
             exit(0)
 
+        hint = ""
+
         # generate hint if plan is 1 ~ 7
         if 1 <= _plan <= 7:
-            # translate the _plan number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
             hint = "/*+ BitmapScan(t"
 
             # pick_datetime
-            if plan_bits[5] == 1:
+            if Util.use_index(0, _plan, 3):
                 hint = hint + " " + NYC.index_on_pickup_datetime
 
             # trip_distance
-            if plan_bits[6] == 1:
+            if Util.use_index(1, _plan, 3):
                 hint = hint + " " + NYC.index_on_trip_distance
 
             # pickup_coordinates
-            if plan_bits[7] == 1:
+            if Util.use_index(2, _plan, 3):
                 hint = hint + " " + NYC.index_on_pickup_coordinates
 
             hint = hint + ") */"
@@ -1,10 +1,32 @@
+import asyncio
+import io
+import json
+import numpy as np
 import psycopg2
+import queue
+import time
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
 
 
 class PostgreSQL:
 
-    def __init__(self, _hostname, _username, _password, _database, _timeout=0):
+    timings = ["client", "server"]
+
+    # signature of COPY ... TO STDOUT (FORMAT binary)
+    copy_signature = b"PGCOPY\n\xff\r\n\x00"
+    # one (id int8, x float8, y float8) row of COPY ... TO STDOUT (FORMAT binary), big-endian:
+    #   number of fields (int16), and (length (int32), value) of each field
+    copy_points_dtype = np.dtype([("fields", ">i2"),
+                                  ("id_length", ">i4"), ("id", ">i8"),
+                                  ("x_length", ">i4"), ("x", ">f8"),
+                                  ("y_length", ">i4"), ("y", ">f8")])
+    points_dtype = np.dtype([("id", "<i8"), ("x", "<f8"), ("y", "<f8")])
+
+    # @param _timeout - statement timeout (milliseconds), 0 for no timeout
+    # @param _timing - timing backend of time(), client - wall clock around the query on the client,
+    #                  server - also collect the server-side stats of the query (see time())
+    def __init__(self, _hostname, _username, _password, _database, _timeout=0, _timing="client"):
         self.config = {
             "host": _hostname,
             "user": _username,
@@ -13,39 +35,213 @@ class PostgreSQL:
         }
         self.conn = 0
         self.cursor = 0
+        if _timing not in PostgreSQL.timings:
+            print("Timing [" + str(_timing) + "] is not supported, must be one of " + str(PostgreSQL.timings) + "!")
+            exit(0)
+        self.timing = _timing
+        # server-side stats of the last query run by time()
+        self.last_stats = None
+        # session statement timeout (milliseconds) and settings, re-applied when the connection is reopened
+        self.timeout = _timeout
+        self.settings = []
+        # statement timeout (milliseconds) of each transaction (SET LOCAL), set by the checkout of PostgreSQLPool
+        self.local_timeout = 0
         self.open()
-        if _timeout > 0:
-            self.command("SET statement_timeout=" + str(_timeout))
 
     def open(self):
         self.conn = psycopg2.connect(**self.config)
         self.cursor = self.conn.cursor()
+        if self.timeout > 0:
+            self.command("SET statement_timeout=" + str(self.timeout))
+        for setting in self.settings:
+            self.command("SET " + setting)
+
+    # reopen the connection, e.g., after it was dropped or the database was restarted
+    # @param retries - number of retries (one per second) if the database is not accepting connections yet
+    def reconnect(self, retries=0):
+        try:
+            self.close()
+        except Exception:
+            pass
+        while True:
+            try:
+                self.open()
+                return
+            except Exception as error:
+                if retries <= 0:
+                    raise
+                print("Connecting failed, retry in 1 second: " + str(error).strip())
+                retries -= 1
+                time.sleep(1)
+
+    # @return - bool, if the connection is alive (health check)
+    def ping(self):
+        if self.conn.closed:
+            return False
+        try:
+            self.cursor.execute("SELECT 1")
+            self.cursor.fetchall()
+            self.conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    # run a session setting (e.g., jit=off), kept across reconnects
+    def set_session(self, setting):
+        self.settings.append(setting)
+        self.command("SET " + setting)
+
+    # start the transaction with the statement timeout of the checkout (SET LOCAL lasts until commit / rollback),
+    #   so that it is re-applied after each commit / rollback
+    def begin(self):
+        if self.local_timeout > 0 and \
+                self.conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self.cursor.execute("SET LOCAL statement_timeout=" + str(self.local_timeout))
 
     def query(self, sql):
         if self.conn is None:
             self.conn = psycopg2.connect(**self.config)
             self.cursor = self.conn.cursor()
         try:
+            self.begin()
             self.cursor.execute(sql)
             return self.cursor.fetchall()
         except (Exception, psycopg2.extensions.QueryCanceledError) as error:
+            # the connection is dropped, reopen it for the next query
+            if self.conn.closed:
+                self.reconnect()
+                return [("timeout",)]
             self.cursor.execute("ROLLBACK")
             self.commit()
             return [("timeout",)]
         except (Exception, psycopg2.DatabaseError) as error:
             return error
 
+    # run a query of (id, x, y) rows, e.g., (id, coordinate[0], coordinate[1]) of a visualization query,
+    #   and transfer the result in binary (COPY ... TO STDOUT (FORMAT binary)) decoded straight into NumPy,
+    #   instead of the text rows parsed by the default cursor
+    #   a leading hint (/*+ ... */) of the sql is kept at the head of the COPY statement for pg_hint_plan
+    # @param sql - SQL selecting 3 columns, castable to (int8, float8, float8)
+    # @return - numpy structured array of points_dtype (id, x, y), each row indexable as (id, x, y),
+    #           or [("timeout",)] if the query timed out, the same as query(), other errors exit
+    def query_points(self, sql):
+        if self.conn is None:
+            self.conn = psycopg2.connect(**self.config)
+            self.cursor = self.conn.cursor()
+        hint, sql = PostgreSQL.split_hint(sql)
+        copy_sql = hint + "COPY (SELECT r.id::int8, r.x::float8, r.y::float8 " \
+                          "        FROM (" + sql + ") AS r(id, x, y)) TO STDOUT (FORMAT binary)"
+        buffer = io.BytesIO()
+        try:
+            self.begin()
+            self.cursor.copy_expert(copy_sql, buffer)
+        except psycopg2.extensions.QueryCanceledError:
+            # the connection is dropped, reopen it for the next query
+            if self.conn.closed:
+                self.reconnect()
+                return [("timeout",)]
+            self.cursor.execute("ROLLBACK")
+            self.commit()
+            return [("timeout",)]
+        except (Exception, psycopg2.DatabaseError) as error:
+            # not a timeout, e.g., the result is not castable to (int8, float8, float8)
+            print("Query [" + sql + "] failed to transfer (id, x, y) points: " + str(error))
+            exit(0)
+        return PostgreSQL.decode_points(buffer.getvalue())
+
+    # split the leading pg_hint_plan hint (/*+ ... */) off the sql,
+    #   so that it can be kept at the head of a wrapping statement (e.g., COPY, EXPLAIN)
+    # @param sql - SQL, with or without a leading hint
+    # @return - (hint followed by a space, or "" if there is no hint, the rest of the sql)
+    @staticmethod
+    def split_hint(sql):
+        if sql.lstrip().startswith("/*+"):
+            hint, sql = sql.split("*/", 1)
+            return hint + "*/ ", sql
+        return "", sql
+
+    # decode the output of COPY (id int8, x float8, y float8) TO STDOUT (FORMAT binary)
+    # @param data - bytes
+    # @return - numpy structured array of points_dtype (id, x, y)
+    @staticmethod
+    def decode_points(data):
+        if not data.startswith(PostgreSQL.copy_signature):
+            print("Binary COPY output does not start with the PGCOPY signature!")
+            exit(0)
+        # signature, flags (int32), header extension length (int32) + header extension
+        header_size = len(PostgreSQL.copy_signature) + 8 + \
+            int(np.frombuffer(data, dtype=">i4", count=1, offset=len(PostgreSQL.copy_signature) + 4)[0])
+        # trailer: number of fields = -1 (int16)
+        body = data[header_size:len(data) - 2]
+        if len(body) % PostgreSQL.copy_points_dtype.itemsize != 0:
+            print("Binary COPY output is not a sequence of non-null (int8, float8, float8) rows!")
+            exit(0)
+        rows = np.frombuffer(body, dtype=PostgreSQL.copy_points_dtype)
+        if np.any(rows["fields"] != 3) or np.any(rows["id_length"] != 8) or \
+                np.any(rows["x_length"] != 8) or np.any(rows["y_length"] != 8):
+            print("Binary COPY output is not a sequence of non-null (int8, float8, float8) rows!")
+            exit(0)
+        points = np.empty(len(rows), dtype=PostgreSQL.points_dtype)
+        points["id"] = rows["id"]
+        points["x"] = rows["x"]
+        points["y"] = rows["y"]
+        return points
+
     def command(self, sql):
         if self.conn is None:
             self.conn = psycopg2.connect(**self.config)
             self.cursor = self.conn.cursor()
         try:
+            self.begin()
             self.cursor.execute(sql)
             self.commit()
         except (Exception, psycopg2.DatabaseError) as error:
             print(error)
+            # the connection is dropped, reopen it for the next command
+            if self.conn.closed:
+                self.reconnect()
         return True
 
+    # time the sql
+    #   in client timing, the sql runs as is, and the time includes transferring and parsing the result rows
+    #   in server timing, the sql runs with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), the result rows are not sent,
+    #     and the server-side stats are kept in last_stats (None if the query timed out or failed):
+    #       {planning_time, execution_time (seconds), shared_hit_blocks, shared_read_blocks}
+    # @return - time (seconds) of running the sql measured on the client
+    def time(self, sql):
+        self.last_stats = None
+        if self.timing == "server":
+            start = time.time()
+            # the hint stays at the head of the statement for pg_hint_plan
+            hint, sql = PostgreSQL.split_hint(sql)
+            result = self.query(hint + "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+            end = time.time()
+            self.last_stats = PostgreSQL.parse_explain_analyze(result)
+            return end - start
+        start = time.time()
+        self.query(sql)
+        end = time.time()
+        return end - start
+
+    # @param result - result of EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), [([{"Plan": {...}, ...}],)]
+    # @return - {planning_time, execution_time (seconds), shared_hit_blocks, shared_read_blocks},
+    #           None if the result is not a plan (e.g., timeout)
+    @staticmethod
+    def parse_explain_analyze(result):
+        try:
+            explain = result[0][0]
+            if isinstance(explain, str):
+                explain = json.loads(explain)
+            explain = explain[0]
+            return {
+                "planning_time": explain["Planning Time"] / 1000.0,
+                "execution_time": explain["Execution Time"] / 1000.0,
+                "shared_hit_blocks": explain["Plan"].get("Shared Hit Blocks", 0),
+                "shared_read_blocks": explain["Plan"].get("Shared Read Blocks", 0)
+            }
+        except (TypeError, IndexError, KeyError, ValueError):
+            return None
+
     def size_table(self, _table):
         sql = "SELECT count(1) " \
               "  FROM " + _table + ""
@@ -76,3 +272,99 @@ class PostgreSQL:
     def date_to_string(_date):
         return _date.strftime("%Y-%m-%d")
 
+
+###########################################################
+#  PostgreSQLPool
+#
+# Description:
+#   Pool of PostgreSQL connections to one database, shared by the labeling, probing and Bao scripts,
+#     so that the connections are opened once out of the hot paths,
+#     and each connection is used by one thread (or task) at a time.
+# Implementation:
+#   A connection is checked out for exclusive use, and checked in again when done:
+#     with pool.checkout(4000) as db:   # or: async with pool.checkout_async(4000) as db:
+#         db.query(sql)
+#   The statement timeout of a checkout is set per transaction (SET LOCAL, see PostgreSQL.begin()),
+#     so that connections with different timeouts are not needed.
+#   A connection idle for longer than the health check interval (or closed) is pinged on checkout,
+#     and reopened if it is dropped.
+#
+###########################################################
+class PostgreSQLPool:
+
+    # @param _size - number of connections
+    # @param _timing - timing backend of the connections, see PostgreSQL
+    # @param _health_check_interval - seconds a connection can stay idle before it is pinged on checkout
+    def __init__(self, _hostname, _username, _password, _database, _size=1, _timing="client",
+                 _health_check_interval=30):
+        if _size < 1:
+            print("Size of the pool must be at least 1, but " + str(_size) + " is given!")
+            exit(0)
+        self.health_check_interval = _health_check_interval
+        self.dbs = []
+        self.idle = queue.LifoQueue()
+        for i in range(0, _size):
+            db = PostgreSQL(_hostname, _username, _password, _database, _timing=_timing)
+            db.last_used = time.time()
+            self.dbs.append(db)
+            self.idle.put(db)
+
+    def size(self):
+        return len(self.dbs)
+
+    # check out a connection, blocks until one is idle
+    # @param _timeout - statement timeout (milliseconds) of the checkout, 0 for no timeout
+    # @return - PostgreSQL object
+    def acquire(self, _timeout=0):
+        db = self.idle.get()
+        # health check
+        if db.conn.closed or time.time() - db.last_used > self.health_check_interval:
+            if not db.ping():
+                db.reconnect()
+        db.local_timeout = _timeout
+        return db
+
+    # check in the connection, ending its transaction
+    def release(self, db):
+        db.local_timeout = 0
+        if not db.conn.closed:
+            try:
+                db.conn.rollback()
+            except Exception:
+                pass
+        db.last_used = time.time()
+        self.idle.put(db)
+
+    # release the connection of a finished acquire() future whose waiter is gone
+    def release_acquired(self, acquiring):
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            self.release(acquiring.result())
+
+    # context manager of acquire() and release()
+    @contextmanager
+    def checkout(self, _timeout=0):
+        db = self.acquire(_timeout)
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+    # async context manager of acquire() and release(), waits for an idle connection without blocking the event loop,
+    #   the queries of the connection are blocking, run them in an executor
+    #   if the waiting task is cancelled (e.g., by asyncio.wait_for), the connection acquired after is released
+    @asynccontextmanager
+    async def checkout_async(self, _timeout=0):
+        acquiring = asyncio.get_running_loop().run_in_executor(None, self.acquire, _timeout)
+        try:
+            db = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(self.release_acquired)
+            raise
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+    def close(self):
+        for db in self.dbs:
+            db.close()
@@ -19,8 +19,10 @@ class Agent:
 
     tried_actions = []
 
-    def __init__(self, dimension, num_of_joins=1, num_of_sample_ratios=0, sampling_plan_only=False):
+    # @param - rng: random.Random object used for exploration. Default: None (a new unseeded random generator)
+    def __init__(self, dimension, num_of_joins=1, num_of_sample_ratios=0, sampling_plan_only=False, rng=None):
         self.dimension = dimension
+        self.rng = rng if rng is not None else random.Random()
         self.current_step = 0
         self.num_actions = Util.num_of_plans(dimension, num_of_joins, num_of_sample_ratios, sampling_plan_only)
 
@@ -34,10 +36,10 @@ class Agent:
         rate = strategy.get_exploration_rate(self.current_step)
         self.current_step += 1
 
-        if rate > random.random():  # explore
-            action = random.randrange(self.num_actions)
+        if rate > self.rng.random():  # explore
+            action = self.rng.randrange(self.num_actions)
             while action in self.tried_actions:
-                action = random.randrange(self.num_actions)
+                action = self.rng.randrange(self.num_actions)
             self.tried_actions.append(action)
             # print("    ...random")
             return action
@@ -0,0 +1,97 @@
+import json
+import os
+import numpy as np
+
+
+###########################################################
+#  ArrayFile
+#
+# Description:
+#   Store a set of named numpy arrays plus a metadata object in one flat binary file,
+#     which can be memory-mapped back without parsing or copying the array data.
+# Layout:
+#   [magic: 8 bytes][version: uint32][header_size: uint32][header: json, utf-8][padding]
+#   [array 1 data][padding][array 2 data][padding] ...
+#   header = {"metadata": {...},
+#             "arrays": [{"name": "coefs", "dtype": "<f8", "shape": [7, 7], "offset": 128}, ...]}
+#   Every array data starts at an offset aligned to 8 bytes and is stored in C order.
+#
+###########################################################
+class ArrayFile:
+
+    magic = b"MALIVA\x00\x00"
+    version = 1
+    alignment = 8
+
+    @staticmethod
+    def align(offset):
+        return (offset + ArrayFile.alignment - 1) // ArrayFile.alignment * ArrayFile.alignment
+
+    # dump arrays and metadata into the file, the file is replaced atomically
+    # @param - out_file: path of the output file
+    # @param - arrays: {name: numpy array}
+    # @param - metadata: json serializable object
+    @staticmethod
+    def dump(out_file, arrays, metadata):
+        arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+        # header size depends on the offsets, so compute offsets until the header size is stable
+        header_size = 0
+        while True:
+            offset = ArrayFile.align(16 + header_size)
+            entries = []
+            for name, array in arrays.items():
+                entries.append({"name": name,
+                                "dtype": array.dtype.str,
+                                "shape": list(array.shape),
+                                "offset": offset})
+                offset = ArrayFile.align(offset + array.nbytes)
+            header = json.dumps({"metadata": metadata, "arrays": entries}).encode("utf-8")
+            if len(header) == header_size:
+                break
+            header_size = len(header)
+
+        tmp_file = out_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(ArrayFile.magic)
+            f.write(np.array([ArrayFile.version, header_size], dtype="<u4").tobytes())
+            f.write(header)
+            for entry, array in zip(entries, arrays.values()):
+                f.write(b"\x00" * (entry["offset"] - f.tell()))
+                f.write(array.tobytes())
+        os.replace(tmp_file, out_file)
+
+    # load arrays and metadata from the file
+    # @param - in_file: path of the input file
+    # @param - mmap: boolean, memory-map the arrays (read-only) instead of reading them into memory. Default: True
+    # @return - ({name: numpy array}, metadata)
+    @staticmethod
+    def load(in_file, mmap=True):
+        if not os.path.isfile(in_file):
+            print("[" + in_file + "] does NOT exist! Exit!")
+            exit(0)
+        with open(in_file, "rb") as f:
+            magic = f.read(len(ArrayFile.magic))
+            if magic != ArrayFile.magic:
+                print("[" + in_file + "] is not an array file: magic " + str(magic) + " is found, " +
+                      str(ArrayFile.magic) + " is expected!")
+                exit(0)
+            version, header_size = np.frombuffer(f.read(8), dtype="<u4")
+            if version != ArrayFile.version:
+                print("Array file version " + str(version) + " of " + in_file + " is not supported!")
+                exit(0)
+            header = json.loads(f.read(int(header_size)).decode("utf-8"))
+            if not mmap:
+                f.seek(0)
+                buffer = np.frombuffer(f.read(), dtype=np.uint8)
+        if mmap:
+            buffer = np.memmap(in_file, dtype=np.uint8, mode="r")
+
+        arrays = {}
+        for entry in header["arrays"]:
+            dtype = np.dtype(entry["dtype"])
+            shape = tuple(entry["shape"])
+            size = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            start = entry["offset"]
+            arrays[entry["name"]] = buffer[start:start + size].view(dtype).reshape(shape)
+        return arrays, header["metadata"]
@@ -1,8 +1,8 @@
-import psycopg2
 import socket
 import struct
 import time
 import json
+from postgresql import PostgreSQLPool
 from smart_util import Util
 
 
@@ -16,16 +16,15 @@ TERMINAL_MESSAGE = "{\"final\": true}\n"
 
 class Bao:
 
-    def __init__(self, _database_config, _dataset, dimension=3, num_of_joins=1):
-        self.config = {
-            "host": _database_config.hostname,
-            "user": _database_config.username,
-            "password": _database_config.password,
-            "database": _dataset.database,
-        }
-        # init PG connection
-        self.conn = psycopg2.connect(**self.config)
-        self.cursor = self.conn.cursor()
+    # @param _pool - PostgreSQLPool object shared with the caller. Default: None (a pool of one connection)
+    def __init__(self, _database_config, _dataset, dimension=3, num_of_joins=1, _pool=None):
+        # init PG connection pool
+        if _pool is None:
+            _pool = PostgreSQLPool(_database_config.hostname,
+                                   _database_config.username,
+                                   _database_config.password,
+                                   _dataset.database)
+        self.pool = _pool
         self.dataset = _dataset
         self.dimension = dimension
         self.num_of_joins = num_of_joins
@@ -82,14 +81,17 @@ class Bao:
             end = time.time()
             planning_time = end - start
         
-        # run query against PostgreSQL
-        start = time.time()
-        try:
-            self.cursor.execute(sql)
-            self.cursor.fetchall()
-        except Exception as error:
-            print(error)
-        end = time.time()
+        # run query against PostgreSQL, transfer the (id, coordinate[0], coordinate[1]) rows in binary,
+        #   or the rows as they are if the result of the dataset is not points
+        with self.pool.checkout() as db:
+            start = time.time()
+            if self.dataset.points_result:
+                result = db.query_points(sql)
+            else:
+                result = db.query(sql)
+            end = time.time()
+        if len(result) > 0 and result[0][0] == "timeout":
+            print("Query failed: " + sql)
         querying_time = end - start
 
         # if Bao REWARD enabled, report query plan and running time to bao_server
@@ -158,12 +160,12 @@ class Bao:
         
         # explain sql to PostgreSQL for plan json
         sql = "EXPLAIN (FORMAT JSON) " + sql
-        try:
-            self.cursor.execute(sql)
-            return self.cursor.fetchall()[0][0]  # [(real_plan,)]
-        except Exception as error:
-            print(error)
+        with self.pool.checkout() as db:
+            result = db.query(sql)  # [(real_plan,)]
+        if result[0][0] == "timeout":
+            print("Explain failed: " + sql)
             return None
+        return result[0][0]
 
     def arm_to_hint(self, sql, arm):
         # generate hint if arm is 1 ~ self.num_of_arms-1 (index starting from 0, arm[0] is no hint at all)
@@ -223,11 +225,13 @@ class Bao:
             }
         }
     # ]
-    def transform_plan_json(self, plan_json):
+    @staticmethod
+    def transform_plan_json(plan_json):
         root_node = plan_json[0]["Plan"]
-        return {"Plan": self.transform_node(root_node)}
+        return {"Plan": Bao.transform_node(root_node)}
     
-    def transform_node(self, node):
+    @staticmethod
+    def transform_node(node):
         new_node = {}
         new_node["Node Type"] = node["Node Type"]
         if "Relation Name" in node:
@@ -239,7 +243,7 @@ class Bao:
         if "Plans" in node:
             new_node["Plans"] = []
             for child in node["Plans"]:
-                new_node["Plans"].append(self.transform_node(child))
+                new_node["Plans"].append(Bao.transform_node(child))
         return new_node
     
     def reward_json(self, querying_time):
@@ -0,0 +1,83 @@
+import argparse
+import config
+from postgresql import PostgreSQL
+from smart_grid_sketch import Grid_Sketch
+from smart_sample_engine import Sample_Engine
+
+
+###########################################################
+#  smart_build_grid_sketch.py
+#
+# Purpose:
+#   build the grid sketch (see Grid_Sketch) of a table, to estimate selectivities without probing the table
+#
+# Arguments:
+#   -ds  / --dataset          dataset of the table. Default: twitter
+#   -d   / --dimension        dimension of the queries. Default: 3
+#   -t   / --table            table name on which to build the sketch
+#   -sc  / --sample_cache     local cache file of the table's predicate columns (see Sample_Engine),
+#                             built from the table if it does not exist
+#   -nb  / --num_of_buckets   number of equi-depth buckets of each axis of the grid. Default: 16
+#   -if  / --in_file          input file that holds queries whose keywords are kept in the keyword table,
+#                             can be given multiple times. Default: []
+#   -of  / --out_file         output file that holds the sketch
+#
+###########################################################
+
+
+if __name__ == "__main__":
+
+    # parse arguments
+    parser = argparse.ArgumentParser(description="Build grid sketch of a table.")
+    parser.add_argument("-ds", "--dataset", help="dataset: dataset of the table. Default: twitter",
+                        type=str, required=False, default="twitter")
+    parser.add_argument("-d", "--dimension", help="dimension: dimension of the queries. Default: 3",
+                        type=int, required=False, default=3)
+    parser.add_argument("-t", "--table", help="table: table name on which to build the sketch", required=True)
+    parser.add_argument("-sc", "--sample_cache",
+                        help="sample_cache: local cache file of the table's predicate columns",
+                        type=str, required=True)
+    parser.add_argument("-nb", "--num_of_buckets",
+                        help="num_of_buckets: number of equi-depth buckets of each axis of the grid. Default: 16",
+                        type=int, required=False, default=16)
+    parser.add_argument("-if", "--in_file",
+                        help="in_file: input file that holds queries whose keywords are kept in the keyword table",
+                        action='append', required=False, default=[])
+    parser.add_argument("-of", "--out_file", help="out_file: output file that holds the sketch",
+                        type=str, required=True)
+    args = parser.parse_args()
+
+    dataset_name = args.dataset
+    dimension = args.dimension
+    table = args.table
+    sample_cache_file = args.sample_cache
+    num_of_buckets = args.num_of_buckets
+    in_files = args.in_file
+    out_file = args.out_file
+
+    database_config = config.database_configs["postgresql"]
+    dataset = config.datasets[dataset_name]
+
+    # initialize DB handle
+    postgresql = PostgreSQL(
+        database_config.hostname,
+        database_config.username,
+        database_config.password,
+        dataset.database
+    )
+
+    # 1. load the predicate columns of the table
+    sample_engine = Sample_Engine(dataset_name, dimension, table, sample_cache_file, postgresql)
+
+    # 2. collect keywords of the queries
+    keywords = []
+    for in_file in in_files:
+        for query in dataset.load_queries_file(dimension, in_file):
+            if "keyword" in query:
+                keywords.append(query["keyword"])
+
+    # 3. build the sketch
+    print("start building grid sketch of table [" + table + "] ...")
+    Grid_Sketch.build(sample_engine, out_file, num_of_buckets, keywords)
+    postgresql.close()
+    print("grid sketch saved to file [" + out_file + "].")
@@ -0,0 +1,76 @@
+import subprocess
+
+
+###########################################################
+#  Cache_Control
+#
+# Description:
+#   Control the buffer-cache state under which the labeling scripts measure the queries,
+#     so that the labeled times match the cache regime the queries are served in:
+#       none - no control, the cache state left by the former measurements (the shuffled order)
+#       warm - load the tables and all indexes of the dataset (or the given relations) into the buffer cache
+#              (pg_prewarm) before each run
+#       cold - run the restart command (e.g., restart PostgreSQL and drop the OS page cache)
+#              before each measurement, the database must be locally controllable,
+#              and the queries are measured on one connection, reopened after the restart
+# Implementation:
+#   The mode is recorded in the metadata of the output files (see metadata()).
+#
+###########################################################
+class Cache_Control:
+
+    modes = ["none", "warm", "cold"]
+
+    # @param - mode: str, one of modes. Default: none
+    # @param - dataset: dataset class, provides tables and indexes to prewarm
+    # @param - restart_command: str, shell command run before each measurement in cold mode,
+    #          e.g., "pg_ctl -D /var/lib/postgresql/data -w restart && sync && echo 3 > /proc/sys/vm/drop_caches"
+    # @param - relations: [list of str], tables and indexes to prewarm instead of the dataset's, e.g., a sample table.
+    #          Default: None (dataset.tables + dataset.indexes)
+    def __init__(self, mode="none", dataset=None, restart_command=None, relations=None):
+        if mode not in Cache_Control.modes:
+            print("Cache mode [" + str(mode) + "] is not supported, must be one of " + str(Cache_Control.modes) + "!")
+            exit(0)
+        if mode == "warm" and dataset is None and relations is None:
+            print("Dataset or relations must be given for warm cache mode!")
+            exit(0)
+        if mode == "cold" and not restart_command:
+            print("Restart command must be given for cold cache mode!")
+            exit(0)
+        self.mode = mode
+        self.restart_command = restart_command
+        if relations is not None:
+            self.relations = list(relations)
+        elif dataset is not None:
+            self.relations = dataset.tables + dataset.indexes
+        else:
+            self.relations = []
+
+    def is_warm(self):
+        return self.mode == "warm"
+
+    def is_cold(self):
+        return self.mode == "cold"
+
+    # load the relations into the buffer cache
+    # @param - db: PostgreSQL object
+    def warm(self, db):
+        db.command("CREATE EXTENSION IF NOT EXISTS pg_prewarm")
+        for relation in self.relations:
+            blocks = db.query("SELECT pg_prewarm('" + relation + "')")
+            print("prewarmed [" + relation + "]: " + str(blocks[0][0]) + " blocks.")
+
+    # evict the caches by running the restart command,
+    #   the connections opened before are closed by the caller and reopened after
+    def evict(self):
+        completed = subprocess.run(self.restart_command, shell=True)
+        if completed.returncode != 0:
+            print("Restart command [" + self.restart_command + "] failed with code " +
+                  str(completed.returncode) + "!")
+            exit(0)
+
+    # @return - dict, cache state of the measurements, recorded with the output files
+    def metadata(self):
+        return {"cache_mode": self.mode,
+                "prewarmed_relations": self.relations if self.is_warm() else [],
+                "restart_command": self.restart_command if self.is_cold() else None}
@@ -0,0 +1,100 @@
+import argparse
+import config
+import json
+import progressbar
+from postgresql import PostgreSQL
+from smart_explain_estimator import Explain_Cache
+from smart_util import Util
+
+
+###########################################################
+#  smart_collect_queries_explains.py
+#
+# Purpose:
+#   collect PostgreSQL EXPLAIN (FORMAT JSON) plans (without ANALYZE) of all hinted plans for given queries
+#
+# Arguments:
+#   -ds  / --dataset        dataset to run the queries on. Default: twitter
+#   -d   / --dimension      dimension of the queries. Default: 3
+#   -nj  / --num_join       number of join methods. Default: 1
+#   -if  / --in_file        input file that holds the queries
+#   -of  / --out_file       output file that holds the explained plans. Default: explains_[in_file].jsonl
+#
+# Dependencies:
+#   python3.7 & pip: https://docs.aws.amazon.com/elasticbeanstalk/latest/dg/eb-cli3-install-linux.html
+#   pip install progressbar
+#
+# Output:
+#   format (jsonl), one line for each (query, plan):
+#     {"id": 1, "plan": 1, "explain_time": 0.0012, "plan_json": {"Plan": {...}}}
+#     * plan_json is transformed by Bao.transform_plan_json()
+#
+###########################################################
+
+
+if __name__ == "__main__":
+
+    # parse arguments
+    parser = argparse.ArgumentParser(description="Collect EXPLAIN plans of benchmark queries.")
+    parser.add_argument("-ds", "--dataset", help="dataset: dataset to run the queries on. Default: twitter",
+                        type=str, required=False, default="twitter")
+    parser.add_argument("-d", "--dimension", help="dimension: dimension of the queries. Default: 3",
+                        type=int, required=False, default=3)
+    parser.add_argument("-nj", "--num_join", help="num_join: number of join methods. Default: 1",
+                        required=False, type=int, default=1)
+    parser.add_argument("-if", "--in_file", help="in_file: input file that holds the queries", required=True)
+    parser.add_argument("-of", "--out_file",
+                        help="out_file: output file that holds the explained plans. Default: explains_[in_file].jsonl",
+                        type=str, required=False, default=None)
+    args = parser.parse_args()
+
+    dataset = args.dataset
+    dimension = args.dimension
+    num_of_joins = args.num_join
+    in_file = args.in_file
+    out_file = args.out_file
+    if out_file is None:
+        out_file = "explains_" + in_file + ".jsonl"
+
+    database_config = config.database_configs["postgresql"]
+    dataset = config.datasets[dataset]
+    num_of_plans = Util.num_of_plans(dimension, num_of_joins)
+
+    # initialize DB handle
+    postgresql = PostgreSQL(
+        database_config.hostname,
+        database_config.username,
+        database_config.password,
+        dataset.database,
+        database_config.timeout
+    )
+    explain_cache = Explain_Cache(postgresql)
+
+    # 1. read queries into memory
+    queries = dataset.load_queries_file(dimension, in_file)
+    print("loaded ", len(queries), " queries into memory.")
+
+    # 2. explain all hinted plans of each query
+    print("start explaining queries ...")
+    num_of_failures = 0
+    bar = progressbar.ProgressBar(maxval=len(queries),
+                                  widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
+    bar.start()
+    with open(out_file, "w") as f_out:
+        for index, query in enumerate(queries):
+            sql = dataset.construct_sql_str(query, dimension)
+            for plan in range(1, num_of_plans + 1):
+                hint = dataset.construct_hint_str(dimension, plan)
+                plan_json, explain_time = explain_cache.explain(hint + sql)
+                if plan_json is None:
+                    num_of_failures += 1
+                    continue
+                f_out.write(json.dumps({"id": query["id"],
+                                        "plan": plan,
+                                        "explain_time": explain_time,
+                                        "plan_json": plan_json}) + "\n")
+            bar.update(index + 1)
+    bar.finish()
+
+    postgresql.close()
+    print("explained plans wrote to file [" + out_file + "], " + str(num_of_failures) + " failures.")
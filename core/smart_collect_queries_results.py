@@ -2,7 +2,7 @@ import argparse
 import config
 import progressbar
 import time
-from postgresql import PostgreSQL
+from postgresql import PostgreSQLPool
 from smart_util import Util
 
 
@@ -27,6 +27,7 @@ from smart_util import Util
 #     format (csv):
 #       id, coordinate[0], coordinate[1]
 #       ...
+#     or the selected columns of the query if the result of the dataset is not points (e.g., tpch)
 #
 ###########################################################
 
@@ -67,13 +68,12 @@ if __name__ == "__main__":
 
     num_of_plans = Util.num_of_plans(dimension)
 
-    # initialize DB handle with timeout
-    postgresql = PostgreSQL(
+    # initialize DB handle
+    pool = PostgreSQLPool(
         database_config.hostname,
         database_config.username,
         database_config.password,
-        dataset.database,
-        time_out * 1000
+        dataset.database
     )
 
     print("start collecting queries results ...")
@@ -120,17 +120,24 @@ if __name__ == "__main__":
                 best_plan_id = plan_id
         
         # construct sql for this query with best plan_id on given table
-        sql = dataset.construct_sql_str(query, _dimension=dimension, _plan=best_plan_id, _table=table)
+        sql = dataset.construct_hint_str(dimension, best_plan_id) + \
+            dataset.construct_sql_str(query, _dimension=dimension, _table=table)
         
-        # run query againt db
+        # run query againt db with timeout, transfer the (id, coordinate[0], coordinate[1]) rows in binary,
+        #   or the rows as they are if the result of the dataset is not points
         running_queries_count += 1
-        result = postgresql.query(sql)
+        with pool.checkout(time_out * 1000) as postgresql:
+            if dataset.points_result:
+                result = postgresql.query_points(sql)
+            else:
+                result = postgresql.query(sql)
         
         # dump the result to file if not timeout
-        if result[0][0] != "timeout":
+        if len(result) == 0 or result[0][0] != "timeout":
             success_queries_count += 1
             Util.dump_query_result(result_path, query_id, -1, -1, result)
     bar.finish()
+    pool.close()
 
     end = time.time()
     print("done, time: " + str(end - start) + " seconds.")
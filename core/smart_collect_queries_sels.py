@@ -4,6 +4,8 @@ import os.path
 import progressbar
 import time
 from postgresql import PostgreSQL
+from smart_grid_sketch import Grid_Sketch
+from smart_sample_engine import Sample_Engine
 from smart_util import Util
 
 
@@ -18,6 +20,16 @@ from smart_util import Util
 #   -d   / --dimension      dimension: dimension of the queries. Default: 3
 #   -if  / --in_file        input file that holds the queries
 #   -t   / --table          table name on which to collect selectivities
+#   -ss  / --single_scan    collect selectivities of all filtering combinations of a query in one scan of the table.
+#                           Default: False
+#   -sc  / --sample_cache   local cache file of the table's predicate columns, if given, selectivities are computed
+#                           in process by Sample_Engine (the cache file is built from the table if it does not exist).
+#                           Default: None
+#   -gs  / --grid_sketch    grid sketch file built by smart_build_grid_sketch.py, if given,
+#                           selectivities are estimated from the sketch without probing the table. Default: None
+#   -bs  / --batch_size     collect selectivities of all filtering combinations of batch_size queries in one probing
+#                           query (parameters of the queries in a VALUES list joined LATERAL to the single scan),
+#                           0 to probe query by query. Default: 0
 #
 # Dependencies:
 #   python3.7 & pip: https://docs.aws.amazon.com/elasticbeanstalk/latest/dg/eb-cli3-install-linux.html
@@ -48,14 +60,34 @@ if __name__ == "__main__":
                         required=False, default=3)
     parser.add_argument("-if", "--in_file", help="in_file: input file that holds the queries", required=True)
     parser.add_argument("-t", "--table", help="table: table name on which to collect selectivities", required=True)
+    parser.add_argument("-ss", "--single_scan",
+                        help="single_scan: collect selectivities of all filtering combinations of a query "
+                             "in one scan of the table. Default: False",
+                        dest='single_scan', action='store_true')
+    parser.set_defaults(single_scan=False)
+    parser.add_argument("-sc", "--sample_cache",
+                        help="sample_cache: local cache file of the table's predicate columns. Default: None",
+                        type=str, required=False, default=None)
+    parser.add_argument("-gs", "--grid_sketch",
+                        help="grid_sketch: grid sketch file built by smart_build_grid_sketch.py. Default: None",
+                        type=str, required=False, default=None)
+    parser.add_argument("-bs", "--batch_size",
+                        help="batch_size: collect selectivities of batch_size queries in one probing query, "
+                             "0 to probe query by query. Default: 0",
+                        type=int, required=False, default=0)
     args = parser.parse_args()
 
     dataset = args.dataset
     dimension = args.dimension
     in_file = args.in_file
     table = args.table
+    single_scan = args.single_scan
+    sample_cache_file = args.sample_cache
+    grid_sketch_file = args.grid_sketch
+    batch_size = args.batch_size
 
     database_config = config.database_configs["postgresql"]
+    dataset_name = dataset
     dataset = config.datasets[dataset]
 
     # initialize DB handle
@@ -70,7 +102,16 @@ if __name__ == "__main__":
 
     # 0. collect the size of the table provided
     print("start collecting table size ...")
-    table_size = postgresql.size_table(table)
+    sample_engine = None
+    grid_sketch = None
+    if grid_sketch_file is not None:
+        grid_sketch = Grid_Sketch(dataset_name, dimension, table, grid_sketch_file)
+        table_size = grid_sketch.table_size
+    elif sample_cache_file is not None:
+        sample_engine = Sample_Engine(dataset_name, dimension, table, sample_cache_file, postgresql)
+        table_size = sample_engine.table_size
+    else:
+        table_size = postgresql.size_table(table)
     print("size of table [" + table + "] = " + str(table_size))
 
     print("start collecting selectivities for queries ...")
@@ -89,12 +130,39 @@ if __name__ == "__main__":
     bar = progressbar.ProgressBar(maxval=len(queries),
                                       widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
     bar.start()
-    # loop queries
-    for index, query in enumerate(queries):
-        # loop possible filtering combinations (001 ~ 111)
-        for fc in range(1, num_of_plans + 1):
-            query["sel_" + str(fc)] = dataset.sel_query(postgresql, dimension, query, fc, table, table_size)
-        bar.update(index + 1)
+    if batch_size > 0 and grid_sketch is None and sample_engine is None:
+        # loop batches of queries
+        for begin in range(0, len(queries), batch_size):
+            batch = queries[begin:begin + batch_size]
+            # all filtering combinations (001 ~ 111) of all queries in the batch in one probing query
+            batch_sels = dataset.batch_sels_query(postgresql, dimension, batch, table, table_size)
+            for query, sels in zip(batch, batch_sels):
+                for fc in range(1, num_of_plans + 1):
+                    query["sel_" + str(fc)] = sels[fc - 1]
+            bar.update(begin + len(batch))
+    else:
+        # loop queries
+        for index, query in enumerate(queries):
+            if grid_sketch is not None:
+                # all filtering combinations (001 ~ 111) estimated from the sketch
+                sels = grid_sketch.sels_query(query)
+                for fc in range(1, num_of_plans + 1):
+                    query["sel_" + str(fc)] = sels[fc - 1]
+            elif sample_engine is not None:
+                # all filtering combinations (001 ~ 111) computed in process
+                sels = sample_engine.sels_query(query)
+                for fc in range(1, num_of_plans + 1):
+                    query["sel_" + str(fc)] = sels[fc - 1]
+            elif single_scan:
+                # all filtering combinations (001 ~ 111) in one probing query
+                sels = dataset.sels_query(postgresql, dimension, query, table, table_size)
+                for fc in range(1, num_of_plans + 1):
+                    query["sel_" + str(fc)] = sels[fc - 1]
+            else:
+                # loop possible filtering combinations (001 ~ 111)
+                for fc in range(1, num_of_plans + 1):
+                    query["sel_" + str(fc)] = dataset.sel_query(postgresql, dimension, query, fc, table, table_size)
+            bar.update(index + 1)
     bar.finish()
     end = time.time()
     print("running probing queries against DB is done, time: " + str(end - start) + " seconds.")
@@ -66,6 +66,8 @@ class Environment1:
     # @param - sample_pointer: int, [0 ~ 2],
     #                          pointer to the sample size to use for the query_estimator. Default: 0 (5K)
     # @param - num_of_joins: int, number of join methods in hints set.
+    # @param - quantile: float, (0, 1), quantile of the estimated time distribution used as the estimate time,
+    #                    e.g., 0.9 makes the planner conservative against the time budget. Default: 0.5
     def __init__(self,
                  dimension,
                  labeled_queries,
@@ -75,7 +77,8 @@ class Environment1:
                  query_estimator,
                  time_budget,
                  sample_pointer=0,
-                 num_of_joins=1):
+                 num_of_joins=1,
+                 quantile=0.5):
 
         self.dimension = dimension
         self.num_of_joins = num_of_joins
@@ -85,6 +88,7 @@ class Environment1:
         self.query_estimator = query_estimator
         self.time_budget = time_budget
         self.sample_pointer = sample_pointer
+        self.quantile = quantile
 
         # initialize the lookup dict of plan_id -> [list of sel ids]
         #   Example of plan_sels_table for dimension=3:
@@ -132,6 +136,7 @@ class Environment1:
         self.tried_plans = None
         self.tried_plans_time = None
         self.sample_known_sels = None
+        self.estimate_times_all = None
 
         # reset environment
         self.reset()
@@ -145,6 +150,7 @@ class Environment1:
         self.tried_plans = []
         self.tried_plans_time = []
         self.sample_known_sels = set()
+        self.estimate_times_all = None
         # initialize state
         sel_queries_costs = self.samples_sel_queries_costs[self.sample_pointer]
         for plan in range(1, self.num_of_plans + 1):
@@ -168,18 +174,13 @@ class Environment1:
         query_sels = sample_query_sels[self.qid]
 
         sample_need_sels = set()
-        # get the input vector for Query_Estimator
-        xte = []
-        sel_ids = Util.sel_ids_of_plan(plan, self.dimension, self.num_of_joins)
-        x = []
-        for sel_id in sel_ids:
-            x.append(query_sels["sel_" + str(sel_id)])
+        for sel_id in self.plan_sels_table[plan]:
             sample_need_sels.add("sel_" + str(sel_id))
-        xte.append(x)
 
-        # estimate query time
-        ypr = self.query_estimator.predict(plan, xte)
-        estimate_time = ypr[0, 0]
+        # estimate query times of all plans once per query
+        if self.estimate_times_all is None:
+            self.estimate_times_all = self.query_estimator.predict_all(query_sels, quantile=self.quantile)
+        estimate_time = self.estimate_times_all[plan - 1]
 
         # get real cost
         real_cost = 0.0
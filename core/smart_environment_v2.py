@@ -1,4 +1,5 @@
 import torch
+from smart_online_query_estimator import Online_Query_Estimator
 from smart_util import Util
 
 
@@ -65,6 +66,11 @@ class Environment2:
     # @param - sample_pointer: int, [0 ~ 2],
     #                          pointer to the sample size to use for the query_estimator. Default: 0 (5k)
     # @param - num_of_joins: int, number of join methods in hints set.
+    # @param - quantile: float, (0, 1), quantile of the estimated time distribution used as the estimate time,
+    #                    e.g., 0.9 makes the planner conservative against the time budget. Default: 0.5
+    # @param - online: bool, fold the real time of each executed plan into the query_estimator,
+    #                  which must be an Online_Query_Estimator, so that the later queries are planned
+    #                  with the corrected models. Default: False
     def __init__(self,
                  dimension,
                  labeled_queries,
@@ -74,8 +80,13 @@ class Environment2:
                  query_estimator,
                  time_budget,
                  sample_pointer=0,
-                 num_of_joins=1):
+                 num_of_joins=1,
+                 quantile=0.5,
+                 online=False):
 
+        if online and not isinstance(query_estimator, Online_Query_Estimator):
+            print("Online mode requires an Online_Query_Estimator!")
+            exit(0)
         self.dimension = dimension
         self.num_of_joins = num_of_joins
         self.num_of_plans = Util.num_of_plans(dimension, num_of_joins)
@@ -84,6 +95,8 @@ class Environment2:
         self.query_estimator = query_estimator
         self.time_budget = time_budget
         self.sample_pointer = sample_pointer
+        self.quantile = quantile
+        self.online = online
 
         # initialize the lookup dict of plan_id -> [list of sel ids]
         #   Example of plan_sels_table for dimension=3:
@@ -131,6 +144,7 @@ class Environment2:
         self.tried_plans = None
         self.tried_plans_time = None
         self.sample_known_sels = None
+        self.estimate_times_all = None
 
         # reset environment
         self.reset()
@@ -144,6 +158,7 @@ class Environment2:
         self.tried_plans = []
         self.tried_plans_time = []
         self.sample_known_sels = set()
+        self.estimate_times_all = None
         # initialize state
         sel_queries_costs = self.samples_sel_queries_costs[self.sample_pointer]
         for plan in range(1, self.num_of_plans + 1):
@@ -167,18 +182,13 @@ class Environment2:
         query_sels = sample_query_sels[self.qid]
 
         sample_need_sels = set()
-        # get the input vector for Query_Estimator
-        xte = []
-        sel_ids = Util.sel_ids_of_plan(plan, self.dimension, self.num_of_joins)
-        x = []
-        for sel_id in sel_ids:
-            x.append(query_sels["sel_" + str(sel_id)])
+        for sel_id in self.plan_sels_table[plan]:
             sample_need_sels.add("sel_" + str(sel_id))
-        xte.append(x)
 
-        # estimate query time
-        ypr = self.query_estimator.predict(plan, xte)
-        estimate_time = ypr[0, 0]
+        # estimate query times of all plans once per query
+        if self.estimate_times_all is None:
+            self.estimate_times_all = self.query_estimator.predict_all(query_sels, quantile=self.quantile)
+        estimate_time = self.estimate_times_all[plan - 1]
 
         # get real cost
         real_cost = 0.0
@@ -228,6 +238,9 @@ class Environment2:
             labeled_query = self.labeled_queries[self.qid]
             real_time = labeled_query["time_" + str(plan)]
             self.query_time = real_time
+            # the plan is executed, learn from its real time (right-censored if it timed out)
+            if self.online:
+                self.query_estimator.update(self.executed_query_sels(), plan, real_time)
             # query real running time also meets the time_budget
             if self.state.get_elapsed_time() + real_time <= self.time_budget:
                 self.done_reason = "win"
@@ -254,6 +267,10 @@ class Environment2:
 
         return reward
 
+    # @return - {id, sel_1, sel_2, ..., sel_(2**d-1)}, sels of the query the executed plan was estimated on
+    def executed_query_sels(self):
+        return self.samples_query_sels[self.sample_pointer][self.qid]
+
     def get_state(self):
         return self.state
 
@@ -0,0 +1,151 @@
+import numpy as np
+from statistics import NormalDist
+from smart_environment_v2 import Environment2
+
+
+# Different from Environment2,
+#   Environment3 does not probe one fixed sample (sample_pointer) for all queries,
+#   but probes progressively per plan of a query:
+#     the sels of the plan are first collected on the smallest sample,
+#     and the next larger sample is probed only if the estimate time is too uncertain to tell
+#     whether the plan fits the remaining budget or not.
+#   The uncertainty of a sel collected on a sample of n rows is its binomial (Wilson score) confidence interval,
+#     which is propagated through the linear model of the plan (Query_Estimator) into an interval of estimate time:
+#       the plan is decided on the current sample if the remaining budget is out of the interval,
+#       otherwise it escalates to the next sample (if the probe is expected to fit the remaining budget).
+#   Every probe on every sample is charged to the elapsed time, so that the cheap queries stay cheap,
+#     and only the ambiguous ones pay for the big sample probes.
+#   The state (estimate_costs) reflects the costs of the smallest sample, where every plan starts probing.
+class Environment3(Environment2):
+
+    # @param - dimension, labeled_queries, samples_labeled_sel_queries, samples_query_sels,
+    #          samples_sel_queries_costs, query_estimator, time_budget: see Environment2
+    # @param - sample_sizes: [list of int], number of rows of each sample,
+    #          * ordered by the sample sizes ascending (e.g., 5k, 50k, 500k), the same as samples_query_sels
+    # @param - num_of_joins: int, number of join methods in hints set.
+    # @param - quantile: float, (0, 1), see Environment2. Default: 0.5
+    # @param - confidence: float, (0, 1), confidence level of the sels' intervals. Default: 0.95
+    # @param - online: bool, see Environment2. Default: False
+    def __init__(self,
+                 dimension,
+                 labeled_queries,
+                 samples_labeled_sel_queries,
+                 samples_query_sels,
+                 samples_sel_queries_costs,
+                 query_estimator,
+                 time_budget,
+                 sample_sizes,
+                 num_of_joins=1,
+                 quantile=0.5,
+                 confidence=0.95,
+                 online=False):
+
+        if len(sample_sizes) != len(samples_query_sels):
+            print("lengths of sample_sizes & samples_query_sels must be the same for Environment3!")
+            exit(0)
+        self.sample_sizes = list(sample_sizes)
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        if query_estimator.coefs is None:
+            query_estimator.compact()
+
+        # initialize member variables
+        self.samples_known_sels = None
+        self.samples_estimate_times = None
+        self.sample_pointers = None
+
+        super().__init__(dimension,
+                         labeled_queries,
+                         samples_labeled_sel_queries,
+                         samples_query_sels,
+                         samples_sel_queries_costs,
+                         query_estimator,
+                         time_budget,
+                         sample_pointer=0,
+                         num_of_joins=num_of_joins,
+                         quantile=quantile,
+                         online=online)
+
+    def reset(self, qid=-1):
+        super().reset(qid)
+        # known sels of each sample, the smallest one is shared with Environment2 to update the estimate_costs
+        self.samples_known_sels = [set() for sample_size in self.sample_sizes]
+        self.samples_known_sels[0] = self.sample_known_sels
+        # estimate times of all plans on each probed sample, {sample_pointer: numpy 1d array}
+        self.samples_estimate_times = {}
+        # the sample on which each tried plan was decided
+        self.sample_pointers = []
+        return
+
+    # Wilson score interval of sels collected on a sample of n rows
+    # @return - (numpy 1d array of lower bounds, numpy 1d array of upper bounds)
+    def sels_bounds(self, sels, n):
+        z2 = self.z ** 2
+        center = (sels + z2 / (2 * n)) / (1 + z2 / n)
+        half_width = self.z / (1 + z2 / n) * np.sqrt(sels * (1 - sels) / n + z2 / (4 * n ** 2))
+        return np.clip(center - half_width, 0.0, 1.0), np.clip(center + half_width, 0.0, 1.0)
+
+    # interval of estimate time of plan given the sels' intervals on sample of sample_pointer,
+    #   shifted by the same quantile as the estimate time (see Query_Estimator.predict_all())
+    # @return - (lower bound, upper bound) of the estimate time
+    def estimate_time_bounds(self, plan, sample_pointer):
+        query_sels = self.samples_query_sels[sample_pointer][self.qid]
+        all_sels = self.query_estimator.sels_vector(query_sels)
+        sel_indexes = self.query_estimator.plan_sel_indexes[plan]
+        sels = all_sels[sel_indexes]
+        lower, upper = self.sels_bounds(sels, self.sample_sizes[sample_pointer])
+        coefs = self.query_estimator.coefs[plan - 1, sel_indexes]
+        intercept = self.query_estimator.intercepts[plan - 1]
+        shift = self.query_estimator.quantile_shift(self.query_estimator.predict_all(all_sels),
+                                                    self.quantile)[plan - 1]
+        # the linear model is monotone in each sel, so the extremes are at the bounds
+        return intercept + np.sum(np.minimum(coefs * lower, coefs * upper)) + shift, \
+            intercept + np.sum(np.maximum(coefs * lower, coefs * upper)) + shift
+
+    def estimate_query(self, plan):
+        sample_need_sels = set()
+        for sel_id in self.plan_sels_table[plan]:
+            sample_need_sels.add("sel_" + str(sel_id))
+
+        remain_budget = self.time_budget - self.state.get_elapsed_time()
+        real_cost = 0.0
+        estimate_time = 0.0
+        sample_pointer = 0
+        while True:
+            # get real cost of the sels newly probed on this sample
+            sample_new_sels = sample_need_sels.difference(self.samples_known_sels[sample_pointer])
+            labled_sel_query = self.samples_labeled_sel_queries[sample_pointer][self.qid]
+            for sel in sample_new_sels:
+                real_cost += labled_sel_query["time_" + sel]
+            self.samples_known_sels[sample_pointer].update(sample_new_sels)
+
+            # estimate query times of all plans once per query per sample
+            if sample_pointer not in self.samples_estimate_times:
+                query_sels = self.samples_query_sels[sample_pointer][self.qid]
+                self.samples_estimate_times[sample_pointer] = \
+                    self.query_estimator.predict_all(query_sels, quantile=self.quantile)
+            estimate_time = self.samples_estimate_times[sample_pointer][plan - 1]
+
+            # the largest sample
+            if sample_pointer == len(self.sample_sizes) - 1:
+                break
+            # the remaining budget is out of the interval, the plan is separated on this sample
+            lower_time, upper_time = self.estimate_time_bounds(plan, sample_pointer)
+            if not lower_time <= remain_budget - real_cost <= upper_time:
+                break
+            # the probe on the next sample is expected to use up the remaining budget
+            next_cost = 0.0
+            for sel in sample_need_sels.difference(self.samples_known_sels[sample_pointer + 1]):
+                next_cost += self.samples_sel_queries_costs[sample_pointer + 1][int(sel[len("sel_"):]) - 1]
+            if real_cost + next_cost >= remain_budget:
+                break
+            sample_pointer += 1
+
+        self.sample_pointers.append(sample_pointer)
+        return estimate_time, real_cost
+
+    # the executed plan was estimated on the sample it was decided on
+    def executed_query_sels(self):
+        return self.samples_query_sels[self.sample_pointers[-1]][self.qid]
+
+    def get_sample_pointers(self):
+        return self.sample_pointers
@@ -5,6 +5,9 @@ from smart_agent import Agent
 from smart_dqn import DQN
 from smart_environment import Environment
 from smart_environment_v2 import Environment2
+from smart_environment_v3 import Environment3
+from smart_gym import DQNPolicy, GymEnvironment, RandomPolicy, evaluate_policy
+from smart_online_query_estimator import Online_Query_Estimator
 from smart_query_estimator import Query_Estimator
 import torch
 
@@ -14,19 +17,30 @@ import torch
 #
 #  -d  / --dimension       dimension: dimension of the queries. Default: 3
 #  -nj / --num_join        number of join methods. Default: 1
-#  -mf / --model_file      input file that holds trained dqn model
+#  -mf / --model_file      input file that holds trained dqn model, not required by the random policy
 #  -lf / --labeled_file    input file that holds labeled queries for evaluation
 #  -uc / --unit_cost       time (second) to collect selectivity value for one condition
 #  -tb / --time_budget     time (second) for a query to be viable
 #  -ef / --evaluated_file  output file that holds the evaluated queries result
 #  -v  / --version         version of DQN and environment to use
 #  -dbg  / --debug         debug query id
-#  ** Only required when version = 1/2:
+#  -gym  / --gym           evaluate the policy through GymEnvironment (see smart_gym.py). Default: False
+#  -pl   / --policy        policy to evaluate through GymEnvironment, dqn - the DQN model,
+#                          random - a random baseline without DQN model (implies -gym). Default: dqn
+#  -sd   / --seed          seed of the random policy. Default: None
+#  ** Only required when version = 1/2/3:
 #  -llsf / --list_labeled_sel_file  list of labeled_sel_queries files for different sample sizes
 #  -lsqf / --list_sel_query_file    list of sel_queries files for different sample sizes
 #  -scf  / --sel_costs_file         input file that holds sel queries costs for different sample sizes
 #  -qmp  / --qe_model_path          input path to load the models used by Query Estimator
 #  -sp   / --sample_pointer         pointer to the sample size to use for the query_estimator. Default: 0
+#  -qt   / --quantile               quantile of estimated times used to choose plans. Default: 0.5
+#  -ol   / --online                 update the Query Estimator online from the real time of each executed plan,
+#                                   in the evaluation order (see Online_Query_Estimator). Default: False
+#  -ob   / --out_bundle             output bundle file to write the online updated models to. Default: None
+#  ** Only required when version = 3:
+#  -lss  / --list_sample_size       list of numbers of rows of the samples, in the same order as -lsqf
+#  -cl   / --confidence             confidence level of the sels' intervals to escalate samples. Default: 0.95
 #
 # Dependencies:
 #   python3.7 & pip: https://docs.aws.amazon.com/elasticbeanstalk/latest/dg/eb-cli3-install-linux.html
@@ -34,6 +48,97 @@ import torch
 #
 ###########################################################
 
+# New the environment of given version
+#
+# @param - dimension, labeled_queries, unit_cost, time_budget, samples_labeled_sel_queries, samples_query_sels,
+#          samples_sel_queries_costs, query_estimator, sample_pointer, version, num_of_joins, quantile,
+#          sample_sizes, confidence, online: see evaluate_dqn()
+# @return - Environment object of the version
+def new_environment(dimension,
+                    labeled_queries,
+                    unit_cost,
+                    time_budget,
+                    samples_labeled_sel_queries=[],
+                    samples_query_sels=[],
+                    samples_sel_queries_costs=None,
+                    query_estimator=None,
+                    sample_pointer=0,
+                    version='1',
+                    num_of_joins=1,
+                    quantile=0.5,
+                    sample_sizes=[],
+                    confidence=0.95,
+                    online=False):
+    # version 0
+    if version == '0':
+        env = Environment(dimension, labeled_queries, unit_cost, time_budget, num_of_joins)
+    # version 1/2
+    elif version == '1' or version == '2':
+        env = Environment2(dimension,
+                           labeled_queries,
+                           samples_labeled_sel_queries,
+                           samples_query_sels,
+                           samples_sel_queries_costs,
+                           query_estimator,
+                           time_budget,
+                           sample_pointer=sample_pointer,
+                           num_of_joins=num_of_joins,
+                           quantile=quantile,
+                           online=online)
+    # version 3
+    elif version == '3':
+        env = Environment3(dimension,
+                           labeled_queries,
+                           samples_labeled_sel_queries,
+                           samples_query_sels,
+                           samples_sel_queries_costs,
+                           query_estimator,
+                           time_budget,
+                           sample_sizes,
+                           num_of_joins=num_of_joins,
+                           quantile=quantile,
+                           confidence=confidence,
+                           online=online)
+    # default
+    else:
+        env = Environment(dimension, labeled_queries, unit_cost, time_budget, num_of_joins)
+        print("Invalid version " + str(version) + "!")
+        exit(0)
+
+    return env
+
+
+# Evaluate a policy (see smart_gym.py) through a GymEnvironment of the environment
+#
+# @param - env: Environment object, see new_environment()
+# @param - policy: callable (obs, mask) -> action, e.g., DQNPolicy, RandomPolicy
+# @param - labeled_queries: [list of query objects] to evaluate, in order
+# @param - time_budget: float, time (second) for a query to be viable
+# @return - (list of evaluated query objects, win_rate), see evaluate_dqn()
+def evaluate_gym(env, policy, labeled_queries, time_budget):
+    query_ids = [query["id"] for query in labeled_queries]
+    gym_env = GymEnvironment(env, query_ids, shuffle=False)
+    (_, results) = evaluate_policy(gym_env, policy, query_ids)
+    evaluated_queries = []
+    win_rate = 0.0
+    for result in results:
+        win = result["total_time"] <= time_budget
+        if win:
+            win_rate += 1
+        evaluated_queries.append(
+            {"id": result["qid"],
+             "planning_time": result["elapsed_time"],
+             "querying_time": result["query_time"],
+             "total_time": result["total_time"],
+             "win": (1 if win else 0),
+             "plans_tried": "_".join(str(x) for x in result["plans"]),
+             "reason": result["done_reason"]
+             }
+        )
+    win_rate = win_rate / len(labeled_queries)
+    return evaluated_queries, win_rate
+
+
 # Evaluate DQN
 #
 # @param - dimension: dimension of the queries
@@ -44,7 +149,7 @@ import torch
 # @param - time_budget: float, time (second) for a query to be viable
 # @param - version: int, version of DQN and environment to use
 #
-# * Only valid when version == 1/2:
+# * Only valid when version == 1/2/3:
 # @param - samples_labeled_sel_queries: [list of [list of sel queries times]], each inside list being
 #          [{id, time_sel_1, time_sel_2, ..., time_sel_(2**d-1)}]
 #          * the outside list is ordered by the sample sizes ascending (e.g., 5k, 50k, 500k)
@@ -57,6 +162,14 @@ import torch
 # @param - query_estimator: object, Query_Estimator class instance
 # @param - sample_pointer: int, [0~2], pointer to the sample size to use for the query_estimator. Default: 0
 # @param - num_of_joins: int, number of join methods in hints set.
+# @param - quantile: float, (0, 1), quantile of the estimated time distribution used to choose plans,
+#                    higher quantiles are more conservative against the time budget. Default: 0.5
+# @param - sample_sizes: [list of int], number of rows of each sample, only valid when version == 3,
+#          * ordered by the sample sizes ascending (e.g., 5k, 50k, 500k)
+# @param - confidence: float, (0, 1), confidence level of the sels' intervals, only valid when version == 3.
+#                      Default: 0.95
+# @param - online: bool, update the query_estimator (Online_Query_Estimator) from the real time of each executed plan,
+#                  only valid when version == 1/2/3. Default: False
 #
 # @return - (list of evaluated query objects, win_rate), each query object being
 #           {id, planning_time, querying_time, total_time, win(1/0), plans_tried(x_x_x_x), reason}
@@ -72,34 +185,32 @@ def evaluate_dqn(dimension,
                  sample_pointer=0,
                  version='1',
                  debug_qid=-1,
-                 num_of_joins=1):
+                 num_of_joins=1,
+                 quantile=0.5,
+                 sample_sizes=[],
+                 confidence=0.95,
+                 online=False):
 
     # set DQN model as the policy_net for agent
     policy_net = dqn_model
 
     # init objects
-    # version 0
-    if version == '0':
-        env = Environment(dimension, labeled_queries, unit_cost, time_budget, num_of_joins)
-        agent = Agent(dimension, num_of_joins)
-    # version 1/2
-    elif version == '1' or version == '2':
-        env = Environment2(dimension,
-                           labeled_queries,
-                           samples_labeled_sel_queries,
-                           samples_query_sels,
-                           samples_sel_queries_costs,
-                           query_estimator,
-                           time_budget,
-                           sample_pointer=sample_pointer,
-                           num_of_joins=num_of_joins)
-        agent = Agent(dimension, num_of_joins)
-    # default
-    else:
-        env = Environment(dimension, labeled_queries, unit_cost, time_budget, num_of_joins)
-        agent = Agent(dimension, num_of_joins)
-        print("Invalid version " + str(version) + "!")
-        exit(0)
+    env = new_environment(dimension,
+                          labeled_queries,
+                          unit_cost,
+                          time_budget,
+                          samples_labeled_sel_queries=samples_labeled_sel_queries,
+                          samples_query_sels=samples_query_sels,
+                          samples_sel_queries_costs=samples_sel_queries_costs,
+                          query_estimator=query_estimator,
+                          sample_pointer=sample_pointer,
+                          version=version,
+                          num_of_joins=num_of_joins,
+                          quantile=quantile,
+                          sample_sizes=sample_sizes,
+                          confidence=confidence,
+                          online=online)
+    agent = Agent(dimension, num_of_joins)
 
     # evaluate labeled queries one by one
     evaluated_queries = []
@@ -132,13 +243,15 @@ def evaluate_dqn(dimension,
 
             # ++++++++++ DEBUG ++++++++++ #
             if qid == debug_qid:
-                if version == '1' or version == '2':
+                if version == '1' or version == '2' or version == '3':
                     estimate_time = state.get_estimate_times()[plan - 1]
                     real_cost = -reward
                     print("[DEBUG]        Remain budget: " + str(remain_budget) +
                           ", estimate plan [" + str(plan) +
                           "], estimate time: " + str(estimate_time) +
                           ", real cost: " + str(real_cost) + ".")
+                if version == '3':
+                    print("[DEBUG]        decided on sample [" + str(env.get_sample_pointers()[-1]) + "].")
             # ---------- DEBUG ---------- #
 
         planning_time = state.get_elapsed_time()
@@ -186,8 +299,8 @@ if __name__ == "__main__":
     parser.add_argument("-nj", "--num_join", help="num_join: number of join methods. Default: 1", 
                         required=False, type=int, default=1)
     parser.add_argument("-mf", "--model_file",
-                        help="model_file: input file that holds trained dqn model",
-                        type=str, required=True)
+                        help="model_file: input file that holds trained dqn model, not required by the random policy",
+                        type=str, required=False, default=None)
     parser.add_argument("-lf", "--labeled_file",
                         help="labeled_file: input file that holds labeled queries for evaluation",
                         type=str, required=True)
@@ -206,6 +319,16 @@ if __name__ == "__main__":
     parser.add_argument("-dbg", "--debug",
                         help="debug: debug query id. Default: -1",
                         type=int, required=False, default=-1)
+    parser.add_argument("-gym", "--gym",
+                        help="gym: evaluate the policy through GymEnvironment. Default: False",
+                        dest='gym', action='store_true')
+    parser.set_defaults(gym=False)
+    parser.add_argument("-pl", "--policy",
+                        help="policy: policy to evaluate through GymEnvironment, dqn / random. Default: dqn",
+                        type=str, required=False, default="dqn", choices=["dqn", "random"])
+    parser.add_argument("-sd", "--seed",
+                        help="seed: seed of the random policy. Default: None",
+                        type=int, required=False, default=None)
     parser.add_argument("-llsf", "--list_labeled_sel_file",
                         help="list_labeled_sel_file: list of labeled_sel_queries files for different sample sizes",
                         action='append', required=False, default=[])
@@ -221,6 +344,23 @@ if __name__ == "__main__":
     parser.add_argument("-sp", "--sample_pointer",
                         help="sample_pointer: pointer to the sample size to use for the query_estimator. Default: 0",
                         type=int, required=False, default=0)
+    parser.add_argument("-qt", "--quantile",
+                        help="quantile: quantile of estimated times used to choose plans. Default: 0.5",
+                        type=float, required=False, default=0.5)
+    parser.add_argument("-lss", "--list_sample_size",
+                        help="list_sample_size: list of numbers of rows of the samples, in the same order as -lsqf",
+                        type=int, action='append', required=False, default=[])
+    parser.add_argument("-cl", "--confidence",
+                        help="confidence: confidence level of the sels' intervals to escalate samples. Default: 0.95",
+                        type=float, required=False, default=0.95)
+    parser.add_argument("-ol", "--online",
+                        help="online: update the Query Estimator online from the real time of each executed plan. "
+                             "Default: False",
+                        dest='online', action='store_true')
+    parser.set_defaults(online=False)
+    parser.add_argument("-ob", "--out_bundle",
+                        help="out_bundle: output bundle file to write the online updated models to. Default: None",
+                        type=str, required=False, default=None)
     args = parser.parse_args()
 
     dimension = args.dimension
@@ -233,12 +373,23 @@ if __name__ == "__main__":
     version = args.version
     debug_qid = args.debug
     sample_pointer = args.sample_pointer
+    quantile = args.quantile
+    sample_sizes = args.list_sample_size
+    confidence = args.confidence
+    online = args.online
+    out_bundle = args.out_bundle
+    policy = args.policy
+    gym = args.gym or policy == "random"
+
+    if policy == "dqn" and dqn_model_file is None:
+        print("-mf / --model_file is required by the dqn policy!")
+        exit(0)
 
     # load labeled queries into memory
     labeled_queries = Util.load_labeled_queries_file(dimension, labeled_queries_file, num_of_joins)
 
-    # For version = 1/2
-    if version == '1' or version == '2':
+    # For version = 1/2/3
+    if version == '1' or version == '2' or version == '3':
         list_labeled_sel_file = args.list_labeled_sel_file
         list_sel_query_file = args.list_sel_query_file
         sel_costs_file = args.sel_costs_file
@@ -260,13 +411,19 @@ if __name__ == "__main__":
         if len(list_labeled_sel_file) != len(list_sel_query_file):
             print("lengths of list_labeled_sel_file & list_sel_query_file must be the same when --version is 2!")
             exit(0)
+        if version == '3' and len(sample_sizes) != len(list_sel_query_file):
+            print("-lss / --list_sample_size is required for each of list_sel_query_file when --version is 3!")
+            exit(0)
 
         samples_labeled_sel_queries = Util.load_labeled_sel_queries_files(dimension, list_labeled_sel_file)
         samples_query_sels = Util.load_queries_sels_files(dimension, list_sel_query_file)
         samples_sel_queries_costs = Util.load_sel_queries_costs_file(dimension, sel_costs_file)
 
         # new a Query Estimator
-        query_estimator = Query_Estimator(dimension, num_of_joins)
+        if online:
+            query_estimator = Online_Query_Estimator(dimension, num_of_joins, snapshot_file=out_bundle)
+        else:
+            query_estimator = Query_Estimator(dimension, num_of_joins)
         # load Query Estimator models from files
         query_estimator.load(qe_model_path)
     else:
@@ -276,40 +433,77 @@ if __name__ == "__main__":
         query_estimator = None
 
     # load DQN model
-    # version 0
-    if version == '0':
-        dqn_model = DQN(dimension, num_of_joins)
-    # version 1/2
-    elif version == '1' or version == '2':
-        dqn_model = DQN(dimension, num_of_joins)
-    # default
-    else:
-        dqn_model = DQN(dimension, num_of_joins)
-        print("Invalid version " + str(version) + "!")
-        exit(0)
-    dqn_model.load_state_dict(torch.load(dqn_model_file))
-    dqn_model.eval()
-    print("DQN model loaded into memory.")
+    if policy == "dqn":
+        # version 0
+        if version == '0':
+            dqn_model = DQN(dimension, num_of_joins)
+        # version 1/2/3
+        elif version == '1' or version == '2' or version == '3':
+            dqn_model = DQN(dimension, num_of_joins)
+        # default
+        else:
+            dqn_model = DQN(dimension, num_of_joins)
+            print("Invalid version " + str(version) + "!")
+            exit(0)
+        dqn_model.load_state_dict(torch.load(dqn_model_file))
+        dqn_model.eval()
+        print("DQN model loaded into memory.")
 
+    # evaluate the policy through GymEnvironment
+    if gym:
+        env = new_environment(dimension,
+                              labeled_queries,
+                              unit_cost,
+                              time_budget,
+                              samples_labeled_sel_queries=samples_labeled_sel_queries,
+                              samples_query_sels=samples_query_sels,
+                              samples_sel_queries_costs=samples_sel_queries_costs,
+                              query_estimator=query_estimator,
+                              sample_pointer=sample_pointer,
+                              version=version,
+                              num_of_joins=num_of_joins,
+                              quantile=quantile,
+                              sample_sizes=sample_sizes,
+                              confidence=confidence,
+                              online=online)
+        if policy == "dqn":
+            gym_policy = DQNPolicy(dqn_model)
+        else:
+            gym_policy = RandomPolicy(args.seed)
+        (evaluated_queries, win_rate) = evaluate_gym(env, gym_policy, labeled_queries, time_budget)
     # evaluated DQN
-    (evaluated_queries, win_rate) = evaluate_dqn(dimension,
-                                                 dqn_model,
-                                                 labeled_queries,
-                                                 unit_cost,
-                                                 time_budget,
-                                                 samples_labeled_sel_queries=samples_labeled_sel_queries,
-                                                 samples_query_sels=samples_query_sels,
-                                                 samples_sel_queries_costs=samples_sel_queries_costs,
-                                                 query_estimator=query_estimator,
-                                                 sample_pointer=sample_pointer,
-                                                 version=version,
-                                                 debug_qid=debug_qid,
-                                                 num_of_joins=num_of_joins)
+    else:
+        (evaluated_queries, win_rate) = evaluate_dqn(dimension,
+                                                     dqn_model,
+                                                     labeled_queries,
+                                                     unit_cost,
+                                                     time_budget,
+                                                     samples_labeled_sel_queries=samples_labeled_sel_queries,
+                                                     samples_query_sels=samples_query_sels,
+                                                     samples_sel_queries_costs=samples_sel_queries_costs,
+                                                     query_estimator=query_estimator,
+                                                     sample_pointer=sample_pointer,
+                                                     version=version,
+                                                     debug_qid=debug_qid,
+                                                     num_of_joins=num_of_joins,
+                                                     quantile=quantile,
+                                                     sample_sizes=sample_sizes,
+                                                     confidence=confidence,
+                                                     online=online)
+
+    # write the online updated models
+    if online and query_estimator is not None:
+        query_estimator.snapshot()
+        print("query estimator updated by " + str(query_estimator.num_of_updates) + " executions (" +
+              str(query_estimator.num_of_censored) + " timeouts censored, " +
+              str(query_estimator.num_of_skipped) + " skipped)" +
+              (", bundle saved to file [" + out_bundle + "]." if out_bundle is not None else "."))
 
     # in debug mode, do not output evaluated queries
     if debug_qid == -1:
         # output evaluated queries to console
-        print("======== Evaluation of DQN ========")
+        print("======== Evaluation of DQN ========" if policy == "dqn" else
+              "=== Evaluation of random policy ===")
         print(labeled_queries_file)
         print("-----------------------------------")
         print("qid,    planning_time,    querying_time,    total_time,    win,    plans_tried,    reason")
@@ -18,6 +18,9 @@ from smart_query_estimator import Query_Estimator
 #  -lsqf / --list_sel_query_file    list of sel_queries files for different sample sizes
 #  -qmp  / --qe_model_path          input path to load the models used by Query Estimator
 #  -sp   / --sample_pointer         pointer to the sample size to use for the query_estimator. Default: 0
+#  -qt   / --quantile               quantile of estimated times used to choose plans. Default: 0.5
+#  -llssf / --list_labeled_sels_file  list of labeled_sels_queries files (single scan probing) for different sample sizes,
+#                                     if given, all sels are collected by one single scan probing query. Default: []
 #
 # Dependencies:
 #   python3.7 & pip: https://docs.aws.amazon.com/elasticbeanstalk/latest/dg/eb-cli3-install-linux.html
@@ -40,9 +43,14 @@ from smart_query_estimator import Query_Estimator
 # @param - samples_query_sels: [list of [list of query_sels]], each inside list being
 #          [{id, sel_1, sel_2, ..., sel_(2**d-1)}]
 #          * the outside list is ordered by the sample sizes ascending (e.g., 5k, 50k, 500k)
+# @param - samples_labeled_sels_queries: [list of [list of single scan sel queries times]], each inside list being
+#          [{id, time_sels, time_sels_std}], if given, the planning time is the time of the single scan probing query
+#          * the outside list is ordered by the sample sizes ascending (e.g., 5k, 50k, 500k)
 # @param - query_estimator: object, Query_Estimator class instance
 # @param - sample_pointer: int, [0~2], pointer to the sample size to use for the query_estimator. Default: 0
 # @param - num_of_joins: int, number of join methods in hints set.
+# @param - quantile: float, (0, 1), quantile of the estimated time distribution used to choose plans,
+#                    higher quantiles are more conservative against the time budget. Default: 0.5
 #
 # @return - (list of evaluated query objects, win_rate), each query object being
 #           {id, planning_time, querying_time, total_time, win(1/0), plans_tried(x_x_x_x), reason}
@@ -51,10 +59,12 @@ def evaluate_naive(dimension,
                    unit_cost,
                    samples_labeled_sel_queries=[],
                    samples_query_sels=[],
+                   samples_labeled_sels_queries=[],
                    query_estimator=None,
                    sample_pointer=0,
                    version='1',
-                   num_of_joins=1):
+                   num_of_joins=1,
+                   quantile=0.5):
 
     num_of_plans = Util.num_of_plans(dimension, num_of_joins)
     num_of_sels = 2 ** dimension - 1
@@ -66,6 +76,12 @@ def evaluate_naive(dimension,
         for labeled_sel_query in sample_labeled_sel_queries:
             labeled_sel_queries[labeled_sel_query["id"]] = labeled_sel_query
 
+        # store the labeled_sels_queries of given sample_pointer into a hash map with query["id"] as the key
+        labeled_sels_queries = {}
+        if len(samples_labeled_sels_queries) > 0:
+            for labeled_sels_query in samples_labeled_sels_queries[sample_pointer]:
+                labeled_sels_queries[labeled_sels_query["id"]] = labeled_sels_query
+
         # store the queries_sels into a hash map with query["id] as the key
         sample_queries_sels = samples_query_sels[sample_pointer]
         queries_sels = {}
@@ -103,26 +119,23 @@ def evaluate_naive(dimension,
         elif version == '1':
             # pay the cost of estimating all the plan's query time
             planning_time = 0.0
-            labeled_sel_query = labeled_sel_queries[qid]
-            for sel in range(1, num_of_sels + 1):
-                planning_time += labeled_sel_query["time_sel_" + str(sel)]
+            if qid in labeled_sels_queries:
+                # all sels are collected by one single scan probing query
+                planning_time = labeled_sels_queries[qid]["time_sels"]
+            else:
+                labeled_sel_query = labeled_sel_queries[qid]
+                for sel in range(1, num_of_sels + 1):
+                    planning_time += labeled_sel_query["time_sel_" + str(sel)]
 
             # estimate all queries and select the fastest plan, 
             # then get the real querying time of the plan
             min_estimate_time = 100.0
             min_estimate_plan = 0
             query_sels = queries_sels[qid]
+            # estimate query times of all plans in one shot
+            estimate_times = query_estimator.predict_all(query_sels, quantile=quantile)
             for plan in range(1, num_of_plans + 1):
-                # get the input vector for Query_Estimator
-                xte = []
-                sel_ids = Util.sel_ids_of_plan(plan, dimension, num_of_joins)
-                x = []
-                for sel_id in sel_ids:
-                    x.append(query_sels["sel_" + str(sel_id)])
-                xte.append(x)
-                # estimate query time
-                ypr = query_estimator.predict(plan, xte)
-                estimate_time = ypr[0, 0]
+                estimate_time = estimate_times[plan - 1]
                 if estimate_time < min_estimate_time:
                     min_estimate_time = estimate_time
                     min_estimate_plan = plan
@@ -182,6 +195,13 @@ if __name__ == "__main__":
     parser.add_argument("-sp", "--sample_pointer",
                         help="sample_pointer: pointer to the sample size to use for the query_estimator. Default: 0",
                         type=int, required=False, default=0)
+    parser.add_argument("-qt", "--quantile",
+                        help="quantile: quantile of estimated times used to choose plans. Default: 0.5",
+                        type=float, required=False, default=0.5)
+    parser.add_argument("-llssf", "--list_labeled_sels_file",
+                        help="list_labeled_sels_file: list of labeled_sels_queries files (single scan probing) "
+                             "for different sample sizes. Default: []",
+                        action='append', required=False, default=[])
     args = parser.parse_args()
 
     dimension = args.dimension
@@ -191,6 +211,7 @@ if __name__ == "__main__":
     evaluated_queries_file = args.evaluated_file
     version = args.version
     sample_pointer = args.sample_pointer
+    quantile = args.quantile
 
     # load labeled queries into memory
     labeled_queries = Util.load_labeled_queries_file(dimension, labeled_queries_file, num_of_joins)
@@ -217,6 +238,7 @@ if __name__ == "__main__":
 
         samples_labeled_sel_queries = Util.load_labeled_sel_queries_files(dimension, list_labeled_sel_file)
         samples_query_sels = Util.load_queries_sels_files(dimension, list_sel_query_file)
+        samples_labeled_sels_queries = Util.load_labeled_sels_queries_files(args.list_labeled_sels_file)
 
         # new a Query Estimator
         query_estimator = Query_Estimator(dimension, num_of_joins)
@@ -225,6 +247,7 @@ if __name__ == "__main__":
     else:
         samples_labeled_sel_queries = []
         samples_query_sels = []
+        samples_labeled_sels_queries = []
         query_estimator = None
 
     # evaluate Naive solution
@@ -233,10 +256,12 @@ if __name__ == "__main__":
                                        unit_cost,
                                        samples_labeled_sel_queries=samples_labeled_sel_queries,
                                        samples_query_sels=samples_query_sels,
+                                       samples_labeled_sels_queries=samples_labeled_sels_queries,
                                        query_estimator=query_estimator,
                                        sample_pointer=sample_pointer,
                                        version=version,
-                                       num_of_joins=num_of_joins)
+                                       num_of_joins=num_of_joins,
+                                       quantile=quantile)
 
     # output evaluated queries to console
     print("======== Evaluation of Naive Solution ========")
@@ -0,0 +1,144 @@
+import math
+import numpy as np
+import pickle
+import time
+from config import QueryTimeEstimatorConfig as conf
+from smart_bao_client import Bao
+from smart_util import Util
+from sklearn.linear_model import LinearRegression
+
+
+###########################################################
+#  Explain_Cache
+#
+# Description:
+#   Run EXPLAIN (FORMAT JSON) (without ANALYZE) for SQL strings and cache the parsed plans by the SQL text,
+#     so that every distinct SQL text is explained and transformed (Bao.transform_plan_json) only once.
+#
+###########################################################
+class Explain_Cache:
+
+    # @param - db: PostgreSQL object, handle to the database. Default: None (offline, cache only)
+    def __init__(self, db=None):
+        self.db = db
+        self.plans = {}
+        self.explain_times = {}
+
+    # @param - sql: str, the (hinted) SQL to explain
+    # @return - (transformed plan json, explain time in seconds), plan json is None if EXPLAIN fails
+    def explain(self, sql):
+        if sql in self.plans:
+            return self.plans[sql], self.explain_times[sql]
+        if self.db is None:
+            print("SQL is not in the explain cache and there is no database to explain it: " + sql)
+            exit(0)
+        start = time.time()
+        result = self.db.query("EXPLAIN (FORMAT JSON) " + sql)  # [(plan_json,)]
+        end = time.time()
+        if not isinstance(result, list) or not isinstance(result[0][0], list):
+            return None, end - start
+        plan_json = Bao.transform_plan_json(result[0][0])
+        self.plans[sql] = plan_json
+        self.explain_times[sql] = end - start
+        return plan_json, end - start
+
+
+###########################################################
+#  Explain_Estimator
+#
+# Description:
+#   Estimate query time on different query plans from PostgreSQL's EXPLAIN output of the hinted query,
+#     instead of from selectivities probed on sample tables.
+# Implementation:
+#   We train one dedicated linear regression model for each of the plans [1 ~ 2**d-1],
+#     the same as Query_Estimator, on the features of the plan json (see explain_features()):
+#       log(1 + total cost), log(1 + rows) of the root node,
+#       log(1 + total cost), log(1 + rows) summed over the index scan nodes,
+#       number of nodes of each type in node_types.
+#
+###########################################################
+class Explain_Estimator:
+
+    node_types = ["Seq Scan",
+                  "Index Scan",
+                  "Index Only Scan",
+                  "Bitmap Index Scan",
+                  "Bitmap Heap Scan",
+                  "BitmapAnd",
+                  "BitmapOr",
+                  "Nested Loop",
+                  "Hash Join",
+                  "Merge Join",
+                  "Gather",
+                  "Sort"]
+
+    num_of_features = 4 + len(node_types)
+
+    def __init__(self, dimension, num_of_joins=1):
+        self.dimension = dimension
+        self.num_of_joins = num_of_joins
+        self.num_of_plans = Util.num_of_plans(dimension, num_of_joins)
+        self.models = {}
+        for plan in range(1, self.num_of_plans + 1):
+            self.models[plan] = LinearRegression()
+
+    # @param plan_json - transformed plan json, {"Plan": {"Node Type", "Total Cost", "Plan Rows", "Plans", ...}}
+    # @return - list of num_of_features floats
+    @staticmethod
+    def explain_features(plan_json):
+        root = plan_json["Plan"]
+        index_cost = 0.0
+        index_rows = 0.0
+        counts = [0] * len(Explain_Estimator.node_types)
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            node_type = node["Node Type"]
+            if node_type in Explain_Estimator.node_types:
+                counts[Explain_Estimator.node_types.index(node_type)] += 1
+            if "Index Name" in node:
+                index_cost += node["Total Cost"]
+                index_rows += node["Plan Rows"]
+            stack.extend(node.get("Plans", []))
+        return [math.log1p(root["Total Cost"]),
+                math.log1p(root["Plan Rows"]),
+                math.log1p(index_cost),
+                math.log1p(index_rows)] + counts
+
+    # fit model for plan
+    # @prame _plan - int, the plan id of the model
+    # @param _x - numpy 2d array, each row is explain_features() of the plan for one query
+    # @param _y - numpy 2d array, each row has only the target value for the corresponding query
+    def fit(self, _plan, _x, _y):
+        # remove those data points that are no less than the timeout cut
+        filter_index = _y[:, 0] < conf.timeout
+        if np.sum(filter_index) >= 1:
+            _x = _x[filter_index]
+            _y = _y[filter_index]
+        self.models[_plan].fit(_x, _y)
+
+    # predict time for plan
+    # @param _plan - int, the plan id of the model
+    # @param _x - numpy 2d array, each row is explain_features() of the plan for one query
+    # @return y - numpy 2d array, each row has only the predicted value for the corresponding query
+    def predict(self, _plan, _x):
+        y = self.models[_plan].predict(np.asarray(_x, dtype=np.float64))
+        return np.asarray(y, dtype=np.float32).reshape(-1, 1)
+
+    # save all models to files under the given path
+    def save(self, path):
+        # trim the last '/'
+        if path.endswith('/'):
+            path = path[:-1]
+        for plan in range(1, self.num_of_plans + 1):
+            model_file = path + "/explain_estimator_plan_" + str(plan) + ".model"
+            pickle.dump(self.models[plan], open(model_file, "wb"))
+
+    # load all models from files under the given path
+    def load(self, path):
+        # trim the last '/'
+        if path.endswith('/'):
+            path = path[:-1]
+        for plan in range(1, self.num_of_plans + 1):
+            model_file = path + "/explain_estimator_plan_" + str(plan) + ".model"
+            self.models[plan] = pickle.load(open(model_file, "rb"))
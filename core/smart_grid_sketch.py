@@ -0,0 +1,162 @@
+import numpy as np
+from smart_array_file import ArrayFile
+from smart_sample_engine import Sample_Engine
+
+
+###########################################################
+#  Grid_Sketch
+#
+# Description:
+#   Estimate selectivities of filtering combinations from an offline-built synopsis of a (sample) table,
+#     without probing any table at planning time.
+# Implementation:
+#   Every range dimension is one axis of the grid, every box dimension is two axes (x and y),
+#     each axis is split into num_of_buckets equi-depth buckets (by the quantiles of the column),
+#     plus one last bucket for NULL values,
+#     and the grid holds the number of rows in each cell (the joint distribution of all axes).
+#   The sel of a filtering combination fc on a query is
+#     sum(grid * w_1 x w_2 x ... x w_a) / number of rows,
+#     w_i[b] = fraction of bucket b of axis i covered by the query's predicate on axis i (uniform in bucket),
+#              (0 for the NULL bucket) if the dimension of axis i is in fc, else 1 for all buckets.
+#   Text dimensions (Twitter keyword) are not in the grid, but in a keyword table of keyword -> sel,
+#     and are assumed independent of the other dimensions: sel(text & others) = sel(keyword) * sel(others).
+#   The sketch is stored in an ArrayFile, so every process memory-maps and shares the same file.
+#
+###########################################################
+class Grid_Sketch:
+
+    # @param - dataset_name: str, dataset the sketch must be built for, e.g., twitter
+    # @param - dimension: int, dimension of the queries, the sketch must be built for
+    # @param - table: str, table the sketch must be built on
+    # @param - in_file: str, the ArrayFile of the sketch built by Grid_Sketch.build()
+    def __init__(self, dataset_name, dimension, table, in_file):
+        self.arrays, metadata = ArrayFile.load(in_file)
+        if metadata["dataset"] != dataset_name or metadata["table"] != table:
+            print("Grid sketch [" + in_file + "] is built for table [" + str(metadata["table"]) + "] of dataset [" +
+                  str(metadata["dataset"]) + "], not [" + table + "] of [" + dataset_name + "]! Exit!")
+            exit(0)
+        if metadata["dimension"] != dimension:
+            print("Grid sketch [" + in_file + "] is built for dimension " + str(metadata["dimension"]) +
+                  ", not " + str(dimension) + "! Exit!")
+            exit(0)
+        self.dataset_name = dataset_name
+        self.table = table
+        self.dimension = dimension
+        self.table_size = metadata["table_size"]
+        self.axes = metadata["axes"]
+        self.keywords = {keyword: index for index, keyword in enumerate(metadata["keywords"])}
+        self.specs = Sample_Engine.dimension_specs[self.dataset_name][:self.dimension]
+        self.grid = self.arrays["grid"]
+
+    # axes of the grid for given specs
+    # @return - [list of {hint_id, array, start, end, time}], one for each axis in the grid order
+    @staticmethod
+    def spec_axes(specs):
+        axes = []
+        for hint_id, spec in enumerate(specs):
+            if spec["kind"] == "range":
+                axes.append({"hint_id": hint_id, "array": spec["column"],
+                             "start": spec["start"], "end": spec["end"], "time": spec["time"]})
+            elif spec["kind"] == "box":
+                axes.append({"hint_id": hint_id, "array": spec["column"] + "_x",
+                             "start": spec["box"][0], "end": spec["box"][2], "time": False})
+                axes.append({"hint_id": hint_id, "array": spec["column"] + "_y",
+                             "start": spec["box"][1], "end": spec["box"][3], "time": False})
+        return axes
+
+    # build the sketch from the cached columns of a sample table and dump it into out_file
+    # @param - sample_engine: Sample_Engine object of the table
+    # @param - out_file: str, output ArrayFile
+    # @param - num_of_buckets: int, number of equi-depth buckets of each axis
+    # @param - keywords: [list of str], keywords of text predicates to keep in the keyword table. Default: []
+    @staticmethod
+    def build(sample_engine, out_file, num_of_buckets, keywords=[]):
+        axes = Grid_Sketch.spec_axes(sample_engine.specs)
+        arrays = {}
+        cells = np.zeros(sample_engine.table_size, dtype=np.int64)
+        shape = []
+        for index, axis in enumerate(axes):
+            values = np.asarray(sample_engine.arrays[axis["array"]])
+            known = values[~np.isnan(values)]
+            if len(known) == 0:
+                edges = np.zeros(1, dtype=np.float64)
+            else:
+                edges = np.unique(np.quantile(known, np.linspace(0.0, 1.0, num_of_buckets + 1)))
+            # a single distinct value still makes one bucket [v, v]
+            num_of_value_buckets = max(len(edges) - 1, 1)
+            buckets = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, num_of_value_buckets - 1)
+            buckets[np.isnan(values)] = num_of_value_buckets
+            cells = cells * (num_of_value_buckets + 1) + buckets
+            shape.append(num_of_value_buckets + 1)
+            arrays["edges_" + str(index)] = edges
+        arrays["grid"] = np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape).astype(np.float64)
+
+        # keyword table
+        text_specs = [spec for spec in sample_engine.specs if spec["kind"] == "text"]
+        keywords = sorted(set(keywords)) if len(text_specs) > 0 else []
+        keyword_sels = []
+        for keyword in keywords:
+            mask = sample_engine.mask(text_specs[0], {text_specs[0]["keyword"]: keyword})
+            keyword_sels.append(np.count_nonzero(mask) / float(sample_engine.table_size))
+        arrays["keyword_sels"] = np.array(keyword_sels, dtype=np.float64)
+
+        metadata = {"dataset": sample_engine.dataset_name,
+                    "table": sample_engine.table,
+                    "dimension": sample_engine.dimension,
+                    "table_size": sample_engine.table_size,
+                    "axes": axes,
+                    "keywords": keywords}
+        ArrayFile.dump(out_file, arrays, metadata)
+
+    # @return - numpy 1d array, fraction of each bucket (NULL bucket last) of axis covered by the query's predicate
+    def axis_weights(self, index, query):
+        axis = self.axes[index]
+        edges = self.arrays["edges_" + str(index)]
+        start = Sample_Engine.to_number(query[axis["start"]], axis["time"])
+        end = Sample_Engine.to_number(query[axis["end"]], axis["time"])
+        start, end = min(start, end), max(start, end)
+        weights = np.zeros(self.grid.shape[index], dtype=np.float64)
+        if len(edges) == 1:
+            weights[0] = 1.0 if start <= edges[0] <= end else 0.0
+            return weights
+        lows = edges[:-1]
+        highs = edges[1:]
+        overlaps = np.clip(np.minimum(highs, end) - np.maximum(lows, start), 0.0, None)
+        weights[:-1] = overlaps / (highs - lows)
+        return weights
+
+    # @return - float, sel of the text predicate of the query, 1 / table_size for keywords not in the keyword table
+    def keyword_sel(self, spec, query):
+        keyword = query[spec["keyword"]]
+        if keyword not in self.keywords:
+            return 1.0 / self.table_size
+        return float(self.arrays["keyword_sels"][self.keywords[keyword]])
+
+    # estimate selectivities of all filtering combinations on given query
+    # @param - query: query object, see dataset's sel_query()
+    # @return - [list of 2**d-1 floats], selectivity [0, 1] of filtering combination fc at index fc - 1
+    def sels_query(self, query):
+        query_weights = [self.axis_weights(index, query) for index in range(0, len(self.axes))]
+        all_weights = [np.ones(self.grid.shape[index], dtype=np.float64) for index in range(0, len(self.axes))]
+        sels = []
+        for fc in range(1, 2 ** self.dimension):
+            # hint_id 0 is the highest bit of fc
+            in_fc = [fc & (1 << (self.dimension - 1 - hint_id)) != 0 for hint_id in range(0, self.dimension)]
+            count = self.grid
+            # contract the first axis each time, so the remaining axes keep their order
+            for index, axis in enumerate(self.axes):
+                weights = query_weights[index] if in_fc[axis["hint_id"]] else all_weights[index]
+                count = np.tensordot(weights, count, axes=([0], [0]))
+            sel = float(count) / self.table_size
+            for hint_id, spec in enumerate(self.specs):
+                if spec["kind"] == "text" and in_fc[hint_id]:
+                    sel *= self.keyword_sel(spec, query)
+            sels.append(sel)
+        return sels
+
+    # estimate selectivity of given filtering combination on given query
+    # @param - query: query object, see dataset's sel_query()
+    # @param - fc: 1 ~ 2**d-1, filtering combination
+    # @return - float, selectivity [0, 1] of given filtering combination on given query
+    def sel_query(self, query, fc):
+        return self.sels_query(query)[fc - 1]
@@ -0,0 +1,171 @@
+import random
+import time
+import numpy as np
+from smart_environment_q import EnvironmentQ
+
+
+###########################################################
+#  GymEnvironment
+#
+# Description:
+#   Wrap one of the MDP environments (Environment, Environment1, Environment2, EnvironmentPlus, EnvironmentQ)
+#     behind a reset/step interface:
+#       obs = reset()
+#       obs, reward, done, info = step(action)
+#     where obs is a float32 numpy vector (the state tensor) and action is 0 ~ num_of_plans-1,
+#     mapped to the plan id of the environment (plan = action + 1, EnvironmentQ: plan = action, its plans start from 0).
+#   The action mask is built from the actions issued through the wrapper in current episode.
+#   Queries are visited in an order shuffled by the environment's own seeded random generator,
+#     so a run is repeatable given the same seed, independently of the global random module.
+#
+###########################################################
+class GymEnvironment:
+
+    # @param - env: object, instance of one of the Environment classes
+    # @param - query_ids: [list of query ids] the environment iterates on
+    # @param - seed: int, seed of the random generator that shuffles queries. Default: None
+    # @param - shuffle: boolean, shuffle the queries order every pass of all queries. Default: True
+    def __init__(self, env, query_ids, seed=None, shuffle=True):
+        self.env = env
+        self.query_ids = list(query_ids)
+        self.num_of_actions = env.num_of_plans
+        # plan ids of EnvironmentQ (sampling plans) start from 0, the others from 1
+        self.plan_offset = 0 if isinstance(env, EnvironmentQ) else 1
+        self.tried_actions = set()
+        self.shuffle = shuffle
+        self.rng = random.Random(seed)
+        self.order = []
+        self.pointer = 0
+        self.qid = None
+        if len(self.query_ids) == 0:
+            print("GymEnvironment requires at least one query id!")
+            exit(0)
+
+    def seed(self, seed=None):
+        self.rng = random.Random(seed)
+        self.order = []
+        self.pointer = 0
+
+    # query id of the next episode, reshuffle the queries order after each pass
+    def next_qid(self):
+        if self.pointer >= len(self.order):
+            self.order = list(self.query_ids)
+            if self.shuffle:
+                self.rng.shuffle(self.order)
+            self.pointer = 0
+        qid = self.order[self.pointer]
+        self.pointer += 1
+        return qid
+
+    # @param - qid: query id of the episode, Default: None (next query id in the shuffled order)
+    # @return - obs
+    def reset(self, qid=None):
+        if qid is None:
+            qid = self.next_qid()
+        self.qid = qid
+        self.tried_actions = set()
+        self.env.reset(qid)
+        return self.observe()
+
+    def observe(self):
+        return self.env.get_state().get_tensor().numpy().astype(np.float32)[0]
+
+    # @return - plan id of the environment for given action
+    def plan_of_action(self, action):
+        return int(action) + self.plan_offset
+
+    # boolean vector of actions that have not been tried in current episode
+    def action_mask(self):
+        mask = np.ones(self.num_of_actions, dtype=bool)
+        for action in self.tried_actions:
+            mask[action] = False
+        return mask
+
+    # @param - action: int, 0 ~ num_of_plans-1
+    # @return - (obs, reward, done, info)
+    def step(self, action):
+        if not 0 <= int(action) < self.num_of_actions:
+            print("Action " + str(action) + " is out of range [0, " + str(self.num_of_actions) + ")!")
+            exit(0)
+        plan = self.plan_of_action(action)
+        self.tried_actions.add(int(action))
+        reward = self.env.take_action(plan)
+        info = {"qid": self.qid,
+                "plan": plan,
+                "done_reason": self.env.get_done_reason(),
+                "query_time": self.env.get_query_time(),
+                "elapsed_time": self.env.get_state().get_elapsed_time()}
+        return self.observe(), float(reward), bool(self.env.done), info
+
+    def close(self):
+        self.env.close()
+
+
+###########################################################
+#  Policies
+#
+# Description:
+#   A policy is a callable (obs, mask) -> action,
+#     obs is the observation vector and mask is the boolean vector of actions still available.
+#
+###########################################################
+class RandomPolicy:
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def __call__(self, obs, mask):
+        return self.rng.choice(np.flatnonzero(mask).tolist())
+
+
+class DQNPolicy:
+
+    # @param - policy_net: DQN object
+    def __init__(self, policy_net):
+        self.policy_net = policy_net
+
+    def __call__(self, obs, mask):
+        import torch
+        with torch.no_grad():
+            q_values = self.policy_net(torch.from_numpy(obs).unsqueeze(0)).numpy()[0]
+        q_values[~mask] = -np.inf
+        return int(np.argmax(q_values))
+
+
+# Evaluate a policy on given queries with a GymEnvironment
+#
+# @param - env: GymEnvironment object
+# @param - policy: callable (obs, mask) -> action
+# @param - query_ids: [list of query ids] to evaluate. Default: None (env.query_ids)
+# @return - (win_rate, [list of episode results]), each episode result being
+#          {qid, done_reason, query_time, elapsed_time, total_time, plans (plan ids tried), reward, decide_time}
+def evaluate_policy(env, policy, query_ids=None):
+    if query_ids is None:
+        query_ids = env.query_ids
+    results = []
+    wins = 0
+    for qid in query_ids:
+        obs = env.reset(qid)
+        done = False
+        plans = []
+        reward = 0.0
+        decide_time = 0.0
+        info = {}
+        while not done:
+            start = time.perf_counter()
+            action = policy(obs, env.action_mask())
+            decide_time += time.perf_counter() - start
+            obs, reward, done, info = env.step(action)
+            plans.append(info["plan"])
+        if info["done_reason"] == "win":
+            wins += 1
+        results.append({"qid": qid,
+                        "done_reason": info["done_reason"],
+                        "query_time": info["query_time"],
+                        "elapsed_time": info["elapsed_time"],
+                        "total_time": info["query_time"] + info["elapsed_time"],
+                        "plans": plans,
+                        "reward": reward,
+                        "decide_time": decide_time})
+    win_rate = wins / len(query_ids) if len(query_ids) > 0 else 0.0
+    return win_rate, results
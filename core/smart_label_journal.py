@@ -0,0 +1,134 @@
+import csv
+import json
+import os
+import os.path
+import threading
+
+
+###########################################################
+#  Label_Journal
+#
+# Description:
+#   Append-only journal of the measurements of the labeling scripts
+#     (smart_label_queries.py, smart_label_sel_queries.py, smart_label_sample_queries.py),
+#   so that a labeling job killed in the middle of a run resumes from the journal and skips the measured pairs,
+#     and the labeled files can be derived from the journal at any time.
+# Implementation:
+#   Each measurement is appended as one record as soon as it completes, and flushed to disk:
+#     format (csv):
+#       run, query_id, plan_id, time, timed_out(1/0)
+#       ...
+#   Records of existing journal file are loaded into memory on open, and new records are appended to it.
+#   A record of the same (run, query_id, plan_id) replaces the former one (the last one wins).
+#   The configuration of the measurements (dataset, database, timeout, timing, cache mode, settings, tables)
+#     is written to a sidecar file [journal_file].config.json when the journal is created,
+#   and a journal measured under a different (or unknown) configuration is refused instead of resumed,
+#     so that its measurements are never mixed with the new ones.
+#
+###########################################################
+class Label_Journal:
+
+    # @param - journal_file: str, the journal file, created if it does not exist
+    # @param - config: dict, configuration of the measurements, must match the one of an existing journal.
+    #          Default: None (not checked)
+    def __init__(self, journal_file, config=None):
+        self.journal_file = journal_file
+        self.config_file = journal_file + ".config.json"
+        if config is not None:
+            self.check_config(config)
+        # {run: {(query_id, plan_id): (time, timed_out)}}
+        self.records = {}
+        complete = True
+        if os.path.isfile(journal_file):
+            with open(journal_file, "r") as csv_in:
+                content = csv_in.read()
+            complete = len(content) == 0 or content.endswith("\n")
+            for row in csv.reader(content.splitlines(), delimiter=',', quotechar='"'):
+                # a record cut by a crash is not complete
+                try:
+                    run, query_id, plan_id, time, timed_out = int(row[0]), int(row[1]), int(row[2]), \
+                        float(row[3]), int(row[4]) == 1
+                except (ValueError, IndexError):
+                    continue
+                if len(row) != 5:
+                    continue
+                self.records.setdefault(run, {})[(query_id, plan_id)] = (time, timed_out)
+        self.lock = threading.Lock()
+        self.out = open(journal_file, "a")
+        # end the record cut by a crash, so that new records start on a new line
+        if not complete:
+            self.out.write("\n")
+        self.writer = csv.writer(self.out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+
+    # check the configuration against the one of the existing journal, or write it for a new journal
+    # @param - config: dict, configuration of the measurements
+    def check_config(self, config):
+        # compare in the json form, e.g., tuples as lists
+        config = json.loads(json.dumps(config))
+        if os.path.isfile(self.config_file):
+            with open(self.config_file, "r") as json_in:
+                journal_config = json.load(json_in)
+            if journal_config != config:
+                keys = sorted(key for key in set(journal_config) | set(config)
+                              if journal_config.get(key) != config.get(key))
+                print("Journal [" + self.journal_file + "] was measured with a different configuration, " +
+                      ", ".join(key + ": " + str(journal_config.get(key)) + " (now " + str(config.get(key)) + ")"
+                                for key in keys) + "! Remove it or give another journal file! Exit!")
+                exit(0)
+        elif os.path.isfile(self.journal_file) and os.path.getsize(self.journal_file) > 0:
+            print("Journal [" + self.journal_file + "] has no configuration file [" + self.config_file + "], "
+                  "its measurements cannot be verified! Remove it or give another journal file! Exit!")
+            exit(0)
+        else:
+            with open(self.config_file, "w") as json_out:
+                json.dump(config, json_out, indent=2, sort_keys=True)
+
+    # @return - int, number of records loaded from / appended to the journal
+    def size(self):
+        return sum(len(run) for run in self.records.values())
+
+    # @return - bool, if (query_id, plan_id) is measured in run
+    def has(self, run, query_plan):
+        return query_plan in self.records.get(run, {})
+
+    # append one measurement to the journal, called concurrently from the labeling workers
+    # @param - run: int, run index (0 ~ num_of_runs - 1)
+    # @param - query_plan: (query_id, plan_id)
+    # @param - time: float, measured time (seconds)
+    # @param - timed_out: bool, if the measurement hit the timeout
+    # @return - time
+    def record(self, run, query_plan, time, timed_out=False):
+        with self.lock:
+            self.writer.writerow([run, query_plan[0], query_plan[1], time, 1 if timed_out else 0])
+            self.out.flush()
+            os.fsync(self.out.fileno())
+            self.records.setdefault(run, {})[query_plan] = (time, timed_out)
+        return time
+
+    # @return - {(query_id, plan_id): time}, measurements of run
+    def times(self, run):
+        return {query_plan: record[0] for query_plan, record in self.records.get(run, {}).items()}
+
+    # @return - {(query_id, plan_id): [list of times]}, measurements in runs before the given run
+    def measurements(self, before_run):
+        measurements = {}
+        for run in sorted(self.records):
+            if run >= before_run:
+                continue
+            for query_plan, record in self.records[run].items():
+                measurements.setdefault(query_plan, []).append(record[0])
+        return measurements
+
+    # @return - {(query_id, plan_id): number of timed out measurements} in runs before the given run
+    def timeouts(self, before_run):
+        timeouts = {}
+        for run, records in self.records.items():
+            if run >= before_run:
+                continue
+            for query_plan, record in records.items():
+                if record[1]:
+                    timeouts[query_plan] = timeouts.get(query_plan, 0) + 1
+        return timeouts
+
+    def close(self):
+        self.out.close()
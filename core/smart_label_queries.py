@@ -2,10 +2,13 @@ import argparse
 import config
 import csv
 import math
-import progressbar
-import random
 import time
-from postgresql import PostgreSQL
+from statistics import NormalDist
+from postgresql import PostgreSQL, PostgreSQLPool
+from smart_cache_control import Cache_Control
+from smart_label_journal import Label_Journal
+from smart_label_stats import Label_Stats
+from smart_labeler import Labeler
 from smart_util import Util
 
 
@@ -19,12 +22,39 @@ from smart_util import Util
 #   -ds  / --dataset        dataset to run the queries on. Default: twitter
 #   -d   / --dimension      dimension of the queries. Default: 3
 #   -if  / --in_file        input file that holds the queries
-#   -run / --run            run how many times
+#   -run / --run            run how many times (at most how many times if time_budget is given)
 #   -oo  / --original_only  tag query performance for the original plan only
 #   -ho  / --hint_only      tag query performance for the hinted plans only
 #   -sp  / --start_plan     tag query performance for a range of plan ids, start id
 #   -ep  / --end_plan       tag query performance for a range of plan ids, end id
 #   -nj  / --num_join       number of join methods. Default: 1
+#   -nc  / --num_connections  number of concurrent connections to run the queries on. Default: 1
+#   -set / --setting        session setting of each connection, e.g., max_parallel_workers_per_gather=0,
+#                           can be given multiple times. Default: []
+#   -pin / --pin_cpu        CPU id to pin the backend of a connection to (round robin over connections,
+#                           the database must run on this host), can be given multiple times. Default: []
+#   -mt  / --max_timeouts   skip the remaining runs of a (query, plan) pair after it times out this many times,
+#                           and label it as censored (time = timeout cut), 0 to run all pairs in all runs. Default: 0
+#   -jf  / --journal_file   append-only journal of the measurements, a killed job resumes from it and skips
+#                           the measured pairs. Default: [in_file].journal
+#                           A journal measured under a different configuration (see Label_Journal) is refused.
+#   -dv  / --derive         derive the output files from the journal only, without running any query. Default: False
+#   -tb  / --time_budget    time (second) for a query to be viable, repeat a (query, plan) pair adaptively:
+#                           after min_runs, a pair is not run again once the confidence interval of its mean time
+#                           is narrower than tolerance * time_budget (half width), or does not cover time_budget,
+#                           so that the repeats go to the noisy pairs around the budget,
+#                           0 to run all pairs in all runs. Default: 0
+#   -tol / --tolerance      tolerance of the half width of the confidence interval, relative to time_budget.
+#                           Default: 0.05
+#   -mr  / --min_runs       run each (query, plan) pair at least this many times if time_budget is given. Default: 3
+#   -cl  / --confidence     confidence level of the confidence interval if time_budget is given. Default: 0.95
+#   -cm  / --cache_mode     buffer-cache state of the measurements (see Cache_Control):
+#                           none - no control, warm - prewarm the table and all indexes before each run,
+#                           cold - run restart_command before each measurement (one connection only). Default: none
+#   -rc  / --restart_command  shell command that restarts the (local) database and drops the caches in cold mode
+#   -tm  / --timing         timing backend (see PostgreSQL.time()), client - wall clock on the client,
+#                           server - run the queries with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), label the
+#                           server-side planning + execution time, and append the stats to labeled_stats_[in_file]. Default: client
 #
 # Dependencies:
 #   python3.7 & pip: https://docs.aws.amazon.com/elasticbeanstalk/latest/dg/eb-cli3-install-linux.html
@@ -42,6 +72,28 @@ from smart_util import Util
 #     ...
 #   file name: labeled_[in_file]
 #              labeled_std_[in_file]
+#   censoring flags of query performance on different hinted plans:
+#     1 - the plan of the query is labeled as a timeout, time = timeout cut (std = 0), 0 - otherwise,
+#     a pair is censored if it timed out max_timeouts times (or in all runs if max_timeouts = 0)
+#   format (csv):
+#     id, censored(0), censored(1), censored(2), ..., censored(2**d-1)
+#     ...
+#   file name: labeled_censored_[in_file]
+#   server-side stats of the measurements in server timing (see Label_Stats):
+#   format (csv):
+#     run, id, plan, client_time, planning_time, execution_time, shared_hit_blocks, shared_read_blocks
+#     ...
+#   file name: labeled_stats_[in_file]
+#   metadata of the measurements (dataset, timeout, settings, cache mode, ...):
+#   format (json)
+#   file name: labeled_meta_[in_file].json
+#   query performance of each run, for archiving:
+#   format (csv):
+#     id, time(0), time(1), time(2), ..., time(2**d-1)
+#     ...
+#     0.0 for plans out of the labeled range, empty for pairs not measured in the run
+#     (e.g., pruned after timeouts, or decided in former runs of the adaptive repetitions)
+#   file name: [in_file].[run]
 #
 ###########################################################
 
@@ -68,6 +120,55 @@ if __name__ == "__main__":
                         required=False, type=int, default=-1)
     parser.add_argument("-nj", "--num_join", help="num_join: number of join methods. Default: 1", 
                         required=False, type=int, default=1)
+    parser.add_argument("-nc", "--num_connections",
+                        help="num_connections: number of concurrent connections to run the queries on. Default: 1",
+                        required=False, type=int, default=1)
+    parser.add_argument("-set", "--setting",
+                        help="setting: session setting of each connection, can be given multiple times. Default: []",
+                        action='append', required=False, default=[])
+    parser.add_argument("-pin", "--pin_cpu",
+                        help="pin_cpu: CPU id to pin the backend of a connection to, can be given multiple times. "
+                             "Default: []",
+                        action='append', required=False, type=int, default=[])
+    parser.add_argument("-mt", "--max_timeouts",
+                        help="max_timeouts: skip the remaining runs of a (query, plan) pair after it times out "
+                             "this many times, 0 to run all pairs in all runs. Default: 0",
+                        required=False, type=int, default=0)
+    parser.add_argument("-jf", "--journal_file",
+                        help="journal_file: append-only journal of the measurements to resume from. "
+                             "Default: [in_file].journal",
+                        type=str, required=False, default=None)
+    parser.add_argument("-dv", "--derive",
+                        help="derive: derive the output files from the journal only, without running any query. "
+                             "Default: False",
+                        required=False, action="store_true")
+    parser.add_argument("-tb", "--time_budget",
+                        help="time_budget: time (second) for a query to be viable, repeat (query, plan) pairs "
+                             "adaptively until the confidence intervals are tight enough, 0 to run all pairs in "
+                             "all runs. Default: 0",
+                        required=False, type=float, default=0.0)
+    parser.add_argument("-tol", "--tolerance",
+                        help="tolerance: tolerance of the half width of the confidence interval, "
+                             "relative to time_budget. Default: 0.05",
+                        required=False, type=float, default=0.05)
+    parser.add_argument("-mr", "--min_runs",
+                        help="min_runs: run each (query, plan) pair at least this many times if time_budget is "
+                             "given. Default: 3",
+                        required=False, type=int, default=3)
+    parser.add_argument("-cl", "--confidence",
+                        help="confidence: confidence level of the confidence interval if time_budget is given. "
+                             "Default: 0.95",
+                        required=False, type=float, default=0.95)
+    parser.add_argument("-cm", "--cache_mode",
+                        help="cache_mode: buffer-cache state of the measurements, none / warm / cold. Default: none",
+                        type=str, required=False, default="none", choices=Cache_Control.modes)
+    parser.add_argument("-rc", "--restart_command",
+                        help="restart_command: shell command that restarts the (local) database and drops the caches "
+                             "in cold mode",
+                        type=str, required=False, default=None)
+    parser.add_argument("-tm", "--timing",
+                        help="timing: timing backend, client / server. Default: client",
+                        type=str, required=False, default="client", choices=PostgreSQL.timings)
     args = parser.parse_args()
 
     dataset = args.dataset
@@ -79,9 +180,23 @@ if __name__ == "__main__":
     start_plan = args.start_plan
     end_plan = args.end_plan
     num_of_joins = args.num_join
+    num_of_connections = args.num_connections
+    settings = args.setting
+    cpus = args.pin_cpu
+    max_timeouts = args.max_timeouts
+    journal_file = args.journal_file if args.journal_file is not None else in_file + ".journal"
+    derive = args.derive
+    cache_mode = args.cache_mode
+    restart_command = args.restart_command
+    timing = args.timing
+    time_budget = args.time_budget
+    tolerance = args.tolerance
+    min_runs = args.min_runs
+    confidence = args.confidence
 
     database_config = config.database_configs["postgresql"]
     dataset = config.datasets[dataset]
+    cache = Cache_Control(cache_mode, dataset, restart_command)
 
     # range of plan ids to label
     num_of_plans = Util.num_of_plans(dimension, num_of_joins)
@@ -103,14 +218,47 @@ if __name__ == "__main__":
     print("start_plan_id = ", start_plan_id)
     print("end_plan_id = ", end_plan_id)
 
-    # initialize DB handle
-    postgresql = PostgreSQL(
-        database_config.hostname,
-        database_config.username,
-        database_config.password,
-        dataset.database,
-        database_config.timeout
-    )
+    # adaptive repetitions
+    if time_budget > 0:
+        if min_runs < 2:
+            print("min_runs must be at least 2 to estimate the variance, but " + str(min_runs) + " is given!")
+            exit(0)
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    # @return - bool, if the mean time of the measurements is decided relative to time_budget:
+    #           the half width of its confidence interval is within tolerance * time_budget,
+    #           or the confidence interval does not cover time_budget
+    def converged(measurements):
+        n = len(measurements)
+        if n < min_runs:
+            return False
+        mean = sum(measurements) / n
+        std = math.sqrt(sum((measurement - mean) ** 2 for measurement in measurements) / (n - 1))
+        half_width = z * std / math.sqrt(n)
+        return half_width <= tolerance * time_budget or abs(mean - time_budget) > half_width
+
+    # open journal of the measurements
+    #   measured under the same configuration only
+    journal = Label_Journal(journal_file,
+                            {"dataset": args.dataset, "dimension": dimension, "num_of_joins": num_of_joins,
+                             "hostname": database_config.hostname, "database": dataset.database,
+                             "tables": dataset.tables, "timeout": database_config.timeout, "timing": timing,
+                             "settings": settings, "cache": cache.metadata()})
+    print("loaded ", journal.size(), " measurements from journal [" + journal_file + "].")
+
+    # open stats file of the measurements in server timing
+    if timing == "server" and not derive:
+        stats = Label_Stats("labeled_stats_" + in_file)
+
+    # initialize DB handles, the queries run with timeout
+    if not derive:
+        pool = PostgreSQLPool(database_config.hostname,
+                              database_config.username,
+                              database_config.password,
+                              dataset.database,
+                              num_of_connections,
+                              timing)
+        labeler = Labeler(pool, settings, cpus, cache=cache, timeout=database_config.timeout)
 
     print("start labeling queries ...")
 
@@ -124,80 +272,119 @@ if __name__ == "__main__":
 
     # 2. run queries to collect timings for plans
     #    - run [num_of_runs] in total, for each run:
-    #        - enumerate all tuples of (query_id, plan_id) into a list
+    #        - enumerate all tuples of (query_id, plan_id) not measured in the journal yet into a list
     #        - shuffle the list,
-    #        - loop the list, for each combination (query_id, plan_id):
+    #        - loop the list on [num_of_connections] connections, for each combination (query_id, plan_id):
     #            - run query[query_id] using plan[plan_id]
+    #            - append the time to the journal
     print("start running queries against DB.")
+    # timeout cut (seconds) of the queries
+    timeout_cut = database_config.timeout / 1000.0
     runs = []
     start_runs = time.time()
     for ri in range(0, num_of_runs):
         print("---------- run " + str(ri + 1) + " ----------")
-        # each run is a map of query["id"] -> [0.0, 0.0, ..., 0.0] (at most num_of_plans+1 zeros)
+        # each run is a map of query["id"] -> [None, None, ..., None] (at most num_of_plans+1 Nones, not measured)
         list_of_query_ids = [query_id for query_id in sorted(queries_map)]
         run = {}
         for query_id in list_of_query_ids:
-            run[query_id] = [0.0] * (num_of_plans + 1)
+            run[query_id] = [None] * (num_of_plans + 1)
+        # number of timeouts of each (query_id, plan_id) pair in former runs
+        timeouts = journal.timeouts(ri)
+        # measurements of each (query_id, plan_id) pair in former runs
+        measurements = journal.measurements(ri) if time_budget > 0 else {}
+        num_of_converged = 0
         # populate the combination list
         queries_plans = []
         for query_id in sorted(queries_map):
             for plan_id in range(start_plan_id, end_plan_id + 1):
                 combination = (query_id, plan_id)
+                # skip the censored pairs, labeled as timeouts
+                if 0 < max_timeouts <= timeouts.get(combination, 0):
+                    run[query_id][plan_id] = timeout_cut
+                    continue
+                # skip the pairs measured in the journal
+                if journal.has(ri, combination):
+                    continue
+                # skip the pairs whose mean time is decided, not measured in this run
+                if time_budget > 0 and converged(measurements.get(combination, [])):
+                    num_of_converged += 1
+                    continue
                 queries_plans.append(combination)
+        if len(queries_plans) < len(queries_map) * (end_plan_id - start_plan_id + 1):
+            print("skip " + str(len(queries_map) * (end_plan_id - start_plan_id + 1) - len(queries_plans)) +
+                  " censored, measured or converged (" + str(num_of_converged) + ") (query, plan) pairs.")
 
-        # shuffle the combination list
-        random.shuffle(queries_plans)
-
-        # run combination list
+        # run shuffled combination list on all connections
         start_run = time.time()
-        # show progress bar
-        bar = progressbar.ProgressBar(maxval=len(queries_plans),
-                                      widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
-        bar.start()
-        qp = 0
-        for query_plan in queries_plans:
-            query = queries_map[query_plan[0]]
-            plan = query_plan[1]
-            run[query["id"]][plan] = dataset.time_query(postgresql, dimension, query, plan)
-            qp += 1
-            bar.update(qp)
-        bar.finish()
+        if not derive and len(queries_plans) > 0:
+            def label_plan(db, query_plan):
+                query_time = dataset.time_query(db, dimension, queries_map[query_plan[0]], query_plan[1])
+                timed_out = query_time >= timeout_cut
+                # label the server-side time, a timed out query keeps the time measured on the client
+                if timing == "server":
+                    stats.record(ri, query_plan, query_time, db.last_stats)
+                    if db.last_stats is not None:
+                        query_time = db.last_stats["planning_time"] + db.last_stats["execution_time"]
+                return journal.record(ri, query_plan, query_time, timed_out)
+            labeler.run(queries_plans, label_plan)
+        for (query_id, plan_id), query_time in journal.times(ri).items():
+            if query_id in run and start_plan_id <= plan_id <= end_plan_id and run[query_id][plan_id] is None:
+                run[query_id][plan_id] = query_time
 
         end_run = time.time()
         print("run [", ri + 1, "] is done, time: " + str(end_run - start_run) + " seconds.")
         runs.append(run)
 
         # write each run to a csv file for archiving
-        archive_out_file = in_file + "." + str(ri+1)
-        with open(archive_out_file, "w") as csv_out:
-            csv_writer = csv.writer(csv_out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for query_id in sorted(run):
-                row = [query_id]
-                row.extend(run[query_id])
-                csv_writer.writerow(row)
+        if not derive:
+            archive_out_file = in_file + "." + str(ri+1)
+            with open(archive_out_file, "w") as csv_out:
+                csv_writer = csv.writer(csv_out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+                for query_id in sorted(run):
+                    row = [query_id]
+                    # plans out of the labeled range are 0.0, pairs in range not measured in this run are empty
+                    row.extend(query_time if query_time is not None else
+                               ("" if start_plan_id <= plan_id <= end_plan_id else 0.0)
+                               for plan_id, query_time in enumerate(run[query_id]))
+                    csv_writer.writerow(row)
 
+    if not derive:
+        pool.close()
+        if timing == "server":
+            stats.close()
+    journal.close()
     end_runs = time.time()
     print("all ", num_of_runs, " runs are done, time: " + str(end_runs - start_runs) + " seconds.")
 
-    # 3. compute average and standard deviation of timings of each query each plan in all runs
+    # 3. compute average and standard deviation of timings of each query each plan in all (measured) runs
+    timeouts = journal.timeouts(num_of_runs)
     for query in queries:
         for plan in range(0, num_of_plans + 1):
-            sum_of_runs = 0.0
-            for run in runs:
-                sum_of_runs += run[query["id"]][plan]
-            avg_of_runs = sum_of_runs / num_of_runs
+            times_of_runs = [run[query["id"]][plan] for run in runs if run[query["id"]][plan] is not None]
+            avg_of_runs = sum(times_of_runs) / len(times_of_runs) if len(times_of_runs) > 0 else 0.0
             sqr_sum_diffs = 0.0
-            for run in runs:
-                sqr_sum_diffs += (run[query["id"]][plan] - avg_of_runs) ** 2
-            std_of_runs = math.sqrt(sqr_sum_diffs / len(runs))
+            for query_time in times_of_runs:
+                sqr_sum_diffs += (query_time - avg_of_runs) ** 2
+            std_of_runs = math.sqrt(sqr_sum_diffs / len(times_of_runs)) if len(times_of_runs) > 0 else 0.0
+            # a censored pair is labeled as a timeout, instead of the average of its timings around the timeout cut
+            num_of_timeouts = timeouts.get((query["id"], plan), 0)
+            if max_timeouts > 0:
+                censored = num_of_timeouts >= max_timeouts
+            else:
+                censored = 0 < num_of_timeouts == len(times_of_runs)
             # only update output result for targeting plans
             if start_plan_id <= plan <= end_plan_id:
-                query["time_" + str(plan)] = avg_of_runs
-                query["time_" + str(plan) + "_std"] = std_of_runs
+                query["time_" + str(plan)] = timeout_cut if censored else avg_of_runs
+                query["time_" + str(plan) + "_std"] = 0.0 if censored else std_of_runs
+                query["censored_" + str(plan)] = 1 if censored else 0
             # other plans init to 0.0 or keep as before
             elif "time_" + str(plan) not in query.keys():
                 query["time_" + str(plan)] = 0.0
                 query["time_" + str(plan) + "_std"] = 0.0
+                query["censored_" + str(plan)] = 0
+            elif "censored_" + str(plan) not in query.keys():
+                query["censored_" + str(plan)] = 0
 
     # 4.0 resort queries by id
     queries = sorted(queries, key=lambda k: k["id"])
@@ -210,3 +397,15 @@ if __name__ == "__main__":
     out_std_file = "labeled_std_" + in_file
     Util.dump_labeled_std_queries_file(dimension, out_std_file, queries, num_of_joins)
 
+    # 4.3 write censoring flags of labeled queries to output file named labeled_censored_[in_file]
+    out_censored_file = "labeled_censored_" + in_file
+    Util.dump_labeled_censored_queries_file(dimension, out_censored_file, queries, num_of_joins)
+
+    # 4.4 write metadata of the measurements to output file named labeled_meta_[in_file].json
+    metadata = {"dataset": args.dataset, "dimension": dimension, "in_file": in_file,
+                "num_of_runs": num_of_runs, "timeout": database_config.timeout,
+                "num_of_connections": num_of_connections, "settings": settings, "pin_cpus": cpus,
+                "timing": timing}
+    metadata.update(cache.metadata())
+    Util.dump_labeling_metadata_file("labeled_meta_" + in_file + ".json", metadata)
+
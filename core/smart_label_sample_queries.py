@@ -2,10 +2,11 @@ import argparse
 import config
 import csv
 import math
-import progressbar
-import random
 import time
-from postgresql import PostgreSQL
+from postgresql import PostgreSQLPool
+from smart_cache_control import Cache_Control
+from smart_label_journal import Label_Journal
+from smart_labeler import Labeler
 from smart_util import Util
 
 
@@ -24,6 +25,19 @@ from smart_util import Util
 #   -sf  / --sels_file      input file that holds the sels of queries
 #   -st  / --sels_table     table name on which the sels_file was collected
 #   -rp  / --results_path   output path to save the results files of each query
+#   -nc  / --num_connections  number of concurrent connections to run the queries on. Default: 1
+#   -set / --setting        session setting of each connection, e.g., max_parallel_workers_per_gather=0,
+#                           can be given multiple times. Default: []
+#   -pin / --pin_cpu        CPU id to pin the backend of a connection to (round robin over connections,
+#                           the database must run on this host), can be given multiple times. Default: []
+#   -jf  / --journal_file   append-only journal of the measurements, a killed job resumes from it and skips
+#                           the measured pairs. Default: labeled_sample_[in_file].journal
+#                           A journal measured under a different configuration (see Label_Journal) is refused.
+#   -dv  / --derive         derive the output files from the journal only, without running any query. Default: False
+#   -cm  / --cache_mode     buffer-cache state of the measurements (see Cache_Control):
+#                           none - no control, warm - prewarm the table and all indexes before each run,
+#                           cold - run restart_command before each measurement (one connection only). Default: none
+#   -rc  / --restart_command  shell command that restarts the (local) database and drops the caches in cold mode
 #
 # Output:
 #   labeled_sample_[in_file]/labeled_std_sample_[in_file]:
@@ -37,6 +51,8 @@ from smart_util import Util
 #     format (csv):
 #       id, time(d1_s1), time(d1_s2), ..., time(d|d|_s|s|)
 #       ...
+#   labeled_meta_sample_[in_file].json:
+#     metadata of the measurements (dataset, timeout, settings, cache mode, ...)
 #   rp/result_{qid}[_h{hint_id}_s{sample_ratio_id}].csv:
 #     format (csv):
 #       id, coordinate[0], coordinate[1]
@@ -66,6 +82,31 @@ if __name__ == "__main__":
     parser.add_argument("-rp", "--result_path",
                         help="result_path: output path to save the results files of each query",
                         type=str, required=True)
+    parser.add_argument("-nc", "--num_connections",
+                        help="num_connections: number of concurrent connections to run the queries on. Default: 1",
+                        required=False, type=int, default=1)
+    parser.add_argument("-set", "--setting",
+                        help="setting: session setting of each connection, can be given multiple times. Default: []",
+                        action='append', required=False, default=[])
+    parser.add_argument("-pin", "--pin_cpu",
+                        help="pin_cpu: CPU id to pin the backend of a connection to, can be given multiple times. "
+                             "Default: []",
+                        action='append', required=False, type=int, default=[])
+    parser.add_argument("-jf", "--journal_file",
+                        help="journal_file: append-only journal of the measurements to resume from. "
+                             "Default: labeled_sample_[in_file].journal",
+                        type=str, required=False, default=None)
+    parser.add_argument("-dv", "--derive",
+                        help="derive: derive the output files from the journal only, without running any query. "
+                             "Default: False",
+                        required=False, action="store_true")
+    parser.add_argument("-cm", "--cache_mode",
+                        help="cache_mode: buffer-cache state of the measurements, none / warm / cold. Default: none",
+                        type=str, required=False, default="none", choices=Cache_Control.modes)
+    parser.add_argument("-rc", "--restart_command",
+                        help="restart_command: shell command that restarts the (local) database and drops the caches "
+                             "in cold mode",
+                        type=str, required=False, default=None)
     args = parser.parse_args()
 
     dataset = args.dataset
@@ -75,33 +116,45 @@ if __name__ == "__main__":
     queries_sels_file = args.sels_file
     sels_table = args.sels_table
     result_path = args.result_path
+    num_of_connections = args.num_connections
+    settings = args.setting
+    cpus = args.pin_cpu
+    journal_file = args.journal_file if args.journal_file is not None else "labeled_sample_" + in_file + ".journal"
+    derive = args.derive
+    cache_mode = args.cache_mode
+    restart_command = args.restart_command
 
     database_config = config.database_configs["postgresql"]
     dataset = config.datasets[dataset]
+    cache = Cache_Control(cache_mode, dataset, restart_command)
     sample_ratios = dataset.sample_ratios
     num_of_sample_ratios = len(sample_ratios)
 
-    # initialize DB handle
-    postgresql = PostgreSQL(
-        database_config.hostname,
-        database_config.username,
-        database_config.password,
-        dataset.database
-    )
-
-    # 0. collect the size of the table provided
-    print("start collecting sels table size ...")
-    sels_table_size = postgresql.size_table(sels_table)
-    print("size of sels table [" + sels_table + "] = " + str(sels_table_size))
-
-    # re-initialize DB handle with timeout
-    postgresql = PostgreSQL(
-        database_config.hostname,
-        database_config.username,
-        database_config.password,
-        dataset.database,
-        database_config.timeout
-    )
+    if not derive:
+        # initialize DB handles
+        pool = PostgreSQLPool(database_config.hostname,
+                              database_config.username,
+                              database_config.password,
+                              dataset.database,
+                              num_of_connections)
+
+        # 0. collect the size of the table provided (without timeout)
+        print("start collecting sels table size ...")
+        with pool.checkout() as postgresql:
+            sels_table_size = postgresql.size_table(sels_table)
+        print("size of sels table [" + sels_table + "] = " + str(sels_table_size))
+
+        # the sampling queries run with timeout
+        labeler = Labeler(pool, settings, cpus, cache=cache, timeout=database_config.timeout)
+
+    # open journal of the measurements
+    #   measured under the same configuration only
+    journal = Label_Journal(journal_file,
+                            {"dataset": args.dataset, "dimension": dimension, "sample_ratios": sample_ratios,
+                             "hostname": database_config.hostname, "database": dataset.database,
+                             "tables": dataset.tables, "sels_table": sels_table, "timeout": database_config.timeout,
+                             "settings": settings, "cache": cache.metadata()})
+    print("loaded ", journal.size(), " measurements from journal [" + journal_file + "].")
 
     # range of plan ids to label
     num_of_sampling_plans = Util.num_of_sampling_plans(dimension, num_of_sample_ratios)
@@ -121,89 +174,89 @@ if __name__ == "__main__":
    
     # Build queries_card_map <id, query_cardinality>
     queries_card_map = {}
-    for query_sels in queries_sels:
-        query_id = query_sels["id"]
-        query_sel = query_sels["sel_" + str(2 ** dimension - 1)]
-        if query_sel == 0.0:
-            query_sel = 1.0 / sels_table_size
-        queries_card_map[query_id] = query_sel * dataset.table_size
+    if not derive:
+        for query_sels in queries_sels:
+            queries_card_map[query_sels["id"]] = Util.estimate_cardinality(query_sels, dimension,
+                                                                            dataset.table_size, sels_table_size)
 
 
     # 2. run queries to collect timings for plans
     #    - run [num_of_runs] in total, for each run:
-    #        - enumerate all tuples of (query_id, plan_id) into a list
+    #        - enumerate all tuples of (query_id, plan_id) not measured in the journal yet into a list
     #        - shuffle the list,
-    #        - loop the list, for each combination (query_id, plan_id):
+    #        - loop the list on [num_of_connections] connections, for each combination (query_id, plan_id):
     #            - run query[query_id] using plan[plan_id]
+    #            - append the time to the journal
     print("start running samping queries against DB.")
+    # timeout cut (seconds) of the queries
+    timeout_cut = database_config.timeout / 1000.0
     runs = []
     start_runs = time.time()
     for ri in range(0, num_of_runs):
         print("---------- run " + str(ri + 1) + " ----------")
-        # each run is a map of query["id"] -> [0.0, 0.0, ..., 0.0] (num_of_sampling_plans zeros)
+        # each run is a map of query["id"] -> [None, None, ..., None] (num_of_sampling_plans Nones, not measured)
         list_of_query_ids = [query_id for query_id in sorted(queries_map)]
         run = {}
         for query_id in list_of_query_ids:
-            run[query_id] = [0.0] * num_of_sampling_plans
+            run[query_id] = [None] * num_of_sampling_plans
         # populate the combination list
         queries_plans = []
         for query_id in sorted(queries_map):
             for plan_id in range(0, num_of_sampling_plans):
                 combination = (query_id, plan_id)
+                # skip the pairs measured in the journal
+                if journal.has(ri, combination):
+                    continue
                 queries_plans.append(combination)
 
-        # shuffle the combination list
-        random.shuffle(queries_plans)
-
-        # run combination list
-        start_run = time.time()
-        # show progress bar
-        bar = progressbar.ProgressBar(maxval=len(queries_plans),
-                                      widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
-        bar.start()
-        qp = 0
-        for query_plan in queries_plans:
-            query_id = query_plan[0]
-            query = queries_map[query_id]
-            plan_id = query_plan[1]
+        # run shuffled combination list on all connections
+        def label_sampling_plan(db, query_plan):
+            query_id, plan_id = query_plan
             card = queries_card_map[query_id]
-            run[query_id][plan_id], result = dataset.time_sampling_query(postgresql, dimension, query, card, plan_id)
+            query_time, result = dataset.time_sampling_query(db, dimension, queries_map[query_id], card, plan_id)
             # dump the result to file only for the first run
             if ri == 0:
                 hint_id = Util.hint_id_of_sampling_plan(num_of_sample_ratios, plan_id)
                 sample_ratio_id = Util.sample_ratio_id_of_sampling_plan(num_of_sample_ratios, plan_id)
                 Util.dump_query_result(result_path, query_id, hint_id, sample_ratio_id, result)
-            qp += 1
-            bar.update(qp)
-        bar.finish()
+            return journal.record(ri, query_plan, query_time, query_time >= timeout_cut)
+
+        start_run = time.time()
+        if not derive and len(queries_plans) > 0:
+            labeler.run(queries_plans, label_sampling_plan)
+        for (query_id, plan_id), query_time in journal.times(ri).items():
+            if query_id in run and 0 <= plan_id < num_of_sampling_plans:
+                run[query_id][plan_id] = query_time
 
         end_run = time.time()
         print("run [", ri + 1, "] is done, time: " + str(end_run - start_run) + " seconds.")
         runs.append(run)
 
         # write each run to a csv file for archiving
-        archive_out_file = "labeled_sample_" + in_file + "." + str(ri+1)
-        with open(archive_out_file, "w") as csv_out:
-            csv_writer = csv.writer(csv_out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for query_id in sorted(run):
-                row = [query_id]
-                row.extend(run[query_id])
-                csv_writer.writerow(row)
+        if not derive:
+            archive_out_file = "labeled_sample_" + in_file + "." + str(ri+1)
+            with open(archive_out_file, "w") as csv_out:
+                csv_writer = csv.writer(csv_out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+                for query_id in sorted(run):
+                    row = [query_id]
+                    row.extend(0.0 if query_time is None else query_time for query_time in run[query_id])
+                    csv_writer.writerow(row)
 
+    if not derive:
+        pool.close()
+    journal.close()
     end_runs = time.time()
     print("all ", num_of_runs, " runs are done, time: " + str(end_runs - start_runs) + " seconds.")
 
-    # 3. compute average and standard deviation of timings of each query each plan in all runs
+    # 3. compute average and standard deviation of timings of each query each plan in all (measured) runs
     for query in queries:
         for plan_id in range(0, num_of_sampling_plans):
-            sum_of_runs = 0.0
-            for run in runs:
-                sum_of_runs += run[query["id"]][plan_id]
-            avg_of_runs = sum_of_runs / num_of_runs
+            times_of_runs = [run[query["id"]][plan_id] for run in runs if run[query["id"]][plan_id] is not None]
+            avg_of_runs = sum(times_of_runs) / len(times_of_runs) if len(times_of_runs) > 0 else 0.0
             sqr_sum_diffs = 0.0
-            for run in runs:
-                sqr_sum_diffs += (run[query["id"]][plan_id] - avg_of_runs) ** 2
-            std_of_runs = math.sqrt(sqr_sum_diffs / len(runs))
+            for query_time in times_of_runs:
+                sqr_sum_diffs += (query_time - avg_of_runs) ** 2
+            std_of_runs = math.sqrt(sqr_sum_diffs / len(times_of_runs)) if len(times_of_runs) > 0 else 0.0
             query["time_" + str(plan_id)] = avg_of_runs
             query["time_" + str(plan_id) + "_std"] = std_of_runs
 
@@ -218,3 +271,10 @@ if __name__ == "__main__":
     out_std_file = "labeled_std_sample_" + in_file
     Util.dump_labeled_std_sample_queries_file(dimension, num_of_sample_ratios, out_std_file, queries)
 
+    # 4.3 write metadata of the measurements to output file named labeled_meta_sample_[in_file].json
+    metadata = {"dataset": args.dataset, "dimension": dimension, "in_file": in_file,
+                "num_of_runs": num_of_runs, "timeout": database_config.timeout,
+                "num_of_connections": num_of_connections, "settings": settings, "pin_cpus": cpus}
+    metadata.update(cache.metadata())
+    Util.dump_labeling_metadata_file("labeled_meta_sample_" + in_file + ".json", metadata)
+
@@ -3,10 +3,12 @@ import config
 import csv
 import math
 import os.path
-import progressbar
-import random
 import time
-from postgresql import PostgreSQL
+from postgresql import PostgreSQL, PostgreSQLPool
+from smart_cache_control import Cache_Control
+from smart_label_journal import Label_Journal
+from smart_label_stats import Label_Stats
+from smart_labeler import Labeler
 from smart_util import Util
 
 
@@ -22,6 +24,24 @@ from smart_util import Util
 #   -if  / --in_file        input file that holds the queries
 #   -run / --run            run how many times (default: 3)
 #   -t   / --table          table name on which to run the selectivity probing queries
+#   -ss  / --single_scan    label the single scan probing query of all filtering combinations of each query instead.
+#                           Default: False
+#   -nc  / --num_connections  number of concurrent connections to run the queries on. Default: 1
+#   -set / --setting        session setting of each connection, e.g., max_parallel_workers_per_gather=0,
+#                           can be given multiple times. Default: []
+#   -pin / --pin_cpu        CPU id to pin the backend of a connection to (round robin over connections,
+#                           the database must run on this host), can be given multiple times. Default: []
+#   -jf  / --journal_file   append-only journal of the measurements, a killed job resumes from it and skips
+#                           the measured pairs. Default: [in_file].sel(s).[table].journal
+#                           A journal measured under a different configuration (see Label_Journal) is refused.
+#   -dv  / --derive         derive the output files from the journal only, without running any query. Default: False
+#   -cm  / --cache_mode     buffer-cache state of the measurements (see Cache_Control):
+#                           none - no control, warm - prewarm the (sample) table before each run,
+#                           cold - run restart_command before each measurement (one connection only). Default: none
+#   -rc  / --restart_command  shell command that restarts the (local) database and drops the caches in cold mode
+#   -tm  / --timing         timing backend (see PostgreSQL.time()), client - wall clock on the client,
+#                           server - run the queries with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), label the
+#                           server-side planning + execution time, and append the stats to labeled_sel(s)_stats_[table]_[in_file]. Default: client
 #
 # Dependencies:
 #   python3.7 & pip: https://docs.aws.amazon.com/elasticbeanstalk/latest/dg/eb-cli3-install-linux.html
@@ -39,6 +59,19 @@ from smart_util import Util
 #     ...
 #   file name: labeled_sel_[table]_[in_file]
 #              labeled_sel_std_[table]_[in_file]
+#   in single scan mode:
+#     format (csv):
+#       id, time(all), std(all)
+#       ...
+#     file name: labeled_sels_[table]_[in_file]
+#   server-side stats of the measurements in server timing (see Label_Stats):
+#   format (csv):
+#     run, id, fc, client_time, planning_time, execution_time, shared_hit_blocks, shared_read_blocks
+#     ...
+#   file name: labeled_sel_stats_[table]_[in_file] (labeled_sels_stats_[table]_[in_file] in single scan mode)
+#   metadata of the measurements (dataset, timeout, settings, cache mode, ...):
+#   format (json)
+#   file name: labeled_sel_meta_[table]_[in_file].json (labeled_sels_meta_[table]_[in_file].json in single scan mode)
 #
 ###########################################################
 
@@ -55,6 +88,39 @@ if __name__ == "__main__":
     parser.add_argument("-run", "--run", help="run: run how many times", required=False, type=int, default=3)
     parser.add_argument("-t", "--table", help="table: table name on which to run the selectivity probing queries",
                         required=True)
+    parser.add_argument("-ss", "--single_scan",
+                        help="single_scan: label the single scan probing query of all filtering combinations "
+                             "of each query instead. Default: False",
+                        dest='single_scan', action='store_true')
+    parser.set_defaults(single_scan=False)
+    parser.add_argument("-nc", "--num_connections",
+                        help="num_connections: number of concurrent connections to run the queries on. Default: 1",
+                        required=False, type=int, default=1)
+    parser.add_argument("-set", "--setting",
+                        help="setting: session setting of each connection, can be given multiple times. Default: []",
+                        action='append', required=False, default=[])
+    parser.add_argument("-pin", "--pin_cpu",
+                        help="pin_cpu: CPU id to pin the backend of a connection to, can be given multiple times. "
+                             "Default: []",
+                        action='append', required=False, type=int, default=[])
+    parser.add_argument("-jf", "--journal_file",
+                        help="journal_file: append-only journal of the measurements to resume from. "
+                             "Default: [in_file].sel(s).[table].journal",
+                        type=str, required=False, default=None)
+    parser.add_argument("-dv", "--derive",
+                        help="derive: derive the output files from the journal only, without running any query. "
+                             "Default: False",
+                        required=False, action="store_true")
+    parser.add_argument("-cm", "--cache_mode",
+                        help="cache_mode: buffer-cache state of the measurements, none / warm / cold. Default: none",
+                        type=str, required=False, default="none", choices=Cache_Control.modes)
+    parser.add_argument("-rc", "--restart_command",
+                        help="restart_command: shell command that restarts the (local) database and drops the caches "
+                             "in cold mode",
+                        type=str, required=False, default=None)
+    parser.add_argument("-tm", "--timing",
+                        help="timing: timing backend, client / server. Default: client",
+                        type=str, required=False, default="client", choices=PostgreSQL.timings)
     args = parser.parse_args()
 
     dataset = args.dataset
@@ -62,19 +128,33 @@ if __name__ == "__main__":
     in_file = args.in_file
     num_of_runs = args.run
     table = args.table
+    single_scan = args.single_scan
+    num_of_connections = args.num_connections
+    settings = args.setting
+    cpus = args.pin_cpu
+    journal_file = args.journal_file
+    derive = args.derive
+    cache_mode = args.cache_mode
+    restart_command = args.restart_command
+    timing = args.timing
 
     database_config = config.database_configs["postgresql"]
     dataset = config.datasets[dataset]
+    cache = Cache_Control(cache_mode, dataset, restart_command, relations=[table])
 
     num_of_plans = 2 ** dimension - 1  # plan 0 is the original plan (no hint)
+    # in single scan mode, there is only one probing query (fc_id = 1) of all filtering combinations for each query
+    num_of_probes = 1 if single_scan else num_of_plans
 
-    # initialize DB handle
-    postgresql = PostgreSQL(
-        database_config.hostname,
-        database_config.username,
-        database_config.password,
-        dataset.database
-    )
+    # initialize DB handles
+    if not derive:
+        pool = PostgreSQLPool(database_config.hostname,
+                              database_config.username,
+                              database_config.password,
+                              dataset.database,
+                              num_of_connections,
+                              timing)
+        labeler = Labeler(pool, settings, cpus, cache=cache)
 
     print("start labeling selectivity probing queries ...")
 
@@ -89,84 +169,127 @@ if __name__ == "__main__":
     # extract path and filename from in_file
     in_path, in_filename = os.path.split(in_file)
 
+    # open journal of the measurements
+    #   measured under the same configuration only
+    if journal_file is None:
+        journal_file = in_path + "/" + in_filename + (".sels." if single_scan else ".sel.") + table + ".journal"
+    journal = Label_Journal(journal_file,
+                            {"dataset": args.dataset, "dimension": dimension, "single_scan": single_scan,
+                             "hostname": database_config.hostname, "database": dataset.database,
+                             "tables": [table], "timeout": 0, "timing": timing,
+                             "settings": settings, "cache": cache.metadata()})
+    print("loaded ", journal.size(), " measurements from journal [" + journal_file + "].")
+
+    # open stats file of the measurements in server timing
+    if timing == "server" and not derive:
+        stats = Label_Stats(in_path + ("/labeled_sels_stats_" if single_scan else "/labeled_sel_stats_") + table +
+                            "_" + in_filename)
+
     # 2. run queries to collect timings for selectivity probing queries
     #    - run [num_of_runs] in total, for each run:
-    #        - enumerate all tuples of (query_id, fc_id) into a list
+    #        - enumerate all tuples of (query_id, fc_id) not measured in the journal yet into a list
     #        - shuffle the list,
-    #        - loop the list, for each combination (query_id, fc_id):
+    #        - loop the list on [num_of_connections] connections, for each combination (query_id, fc_id):
     #            - run probing query of selectivity for filtering combination (fc_id) for query[query_id]
+    #            - append the time to the journal
     print("start running queries against DB.")
     runs = []
     start_runs = time.time()
     for ri in range(0, num_of_runs):
         print("---------- run " + str(ri + 1) + " ----------")
-        # each run is a map of query["id"] -> [0.0, 0.0, ..., 0.0] (num_of_plans zeros)
+        # each run is a map of query["id"] -> [None, None, ..., None] (num_of_probes Nones, not measured)
         list_of_query_ids = [query_id for query_id in sorted(queries_map)]
         run = {}
         for query_id in list_of_query_ids:
-            run[query_id] = [0.0] * num_of_plans
+            run[query_id] = [None] * num_of_probes
         # populate the combination list
         queries_fcs = []
         for query_id in sorted(queries_map):
-            for fc_id in range(1, num_of_plans + 1):
+            for fc_id in range(1, num_of_probes + 1):
                 combination = (query_id, fc_id)
+                # skip the pairs measured in the journal
+                if journal.has(ri, combination):
+                    continue
                 queries_fcs.append(combination)
 
-        # shuffle the combination list
-        random.shuffle(queries_fcs)
-
-        # run combination list
+        # run shuffled combination list on all connections
         start_run = time.time()
-        # show progress bar
-        bar = progressbar.ProgressBar(maxval=len(queries_fcs),
-                                      widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
-        bar.start()
-        qp = 0
-        for query_fc in queries_fcs:
-            query = queries_map[query_fc[0]]
-            fc = query_fc[1]
-            run[query["id"]][fc - 1] = dataset.time_sel_query(postgresql, dimension, query, fc, table)
-            qp += 1
-            bar.update(qp)
-        bar.finish()
+        if not derive and len(queries_fcs) > 0:
+            def label_fc(db, query_fc):
+                query = queries_map[query_fc[0]]
+                if single_scan:
+                    sel_time = dataset.time_sels_query(db, dimension, query, table)
+                else:
+                    sel_time = dataset.time_sel_query(db, dimension, query, query_fc[1], table)
+                # label the server-side time
+                if timing == "server":
+                    stats.record(ri, query_fc, sel_time, db.last_stats)
+                    if db.last_stats is not None:
+                        sel_time = db.last_stats["planning_time"] + db.last_stats["execution_time"]
+                return journal.record(ri, query_fc, sel_time)
+            labeler.run(queries_fcs, label_fc)
+        for (query_id, fc), sel_time in journal.times(ri).items():
+            if query_id in run and 1 <= fc <= num_of_probes:
+                run[query_id][fc - 1] = sel_time
 
         end_run = time.time()
         print("run [", ri + 1, "] is done, time: " + str(end_run - start_run) + " seconds.")
         runs.append(run)
 
         # write each run to a csv file for archiving
-        archive_out_file = in_path + "/" + in_filename + ".sel." + str(ri+1)
-        with open(archive_out_file, "w") as csv_out:
-            csv_writer = csv.writer(csv_out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for query_id in sorted(run):
-                row = [query_id]
-                row.extend(run[query_id])
-                csv_writer.writerow(row)
+        if not derive:
+            archive_out_file = in_path + "/" + in_filename + (".sels." if single_scan else ".sel.") + str(ri+1)
+            with open(archive_out_file, "w") as csv_out:
+                csv_writer = csv.writer(csv_out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+                for query_id in sorted(run):
+                    row = [query_id]
+                    row.extend(0.0 if sel_time is None else sel_time for sel_time in run[query_id])
+                    csv_writer.writerow(row)
+    if not derive:
+        pool.close()
+        if timing == "server":
+            stats.close()
+    journal.close()
     end_runs = time.time()
     print("all ", num_of_runs, " runs are done, time: " + str(end_runs - start_runs) + " seconds.")
 
-    # 3. compute average and standard deviation of timings of each query each fc in all runs
+    # 3. compute average and standard deviation of timings of each query each fc in all (measured) runs
     for query in queries:
-        for fc in range(1, num_of_plans + 1):
-            sum_of_runs = 0.0
-            for run in runs:
-                sum_of_runs += run[query["id"]][fc - 1]
-            avg_of_runs = sum_of_runs / num_of_runs
+        for fc in range(1, num_of_probes + 1):
+            times_of_runs = [run[query["id"]][fc - 1] for run in runs if run[query["id"]][fc - 1] is not None]
+            avg_of_runs = sum(times_of_runs) / len(times_of_runs) if len(times_of_runs) > 0 else 0.0
             sqr_sum_diffs = 0.0
-            for run in runs:
-                sqr_sum_diffs += (run[query["id"]][fc - 1] - avg_of_runs) ** 2
-            std_of_runs = math.sqrt(sqr_sum_diffs / len(runs))
+            for sel_time in times_of_runs:
+                sqr_sum_diffs += (sel_time - avg_of_runs) ** 2
+            std_of_runs = math.sqrt(sqr_sum_diffs / len(times_of_runs)) if len(times_of_runs) > 0 else 0.0
             query["time_" + str(fc)] = avg_of_runs
             query["time_" + str(fc) + "_std"] = std_of_runs
 
     # 4.0 resort queries by id
     queries = sorted(queries, key=lambda k: k["id"])
 
-    # 4.1 write labeled sel queries to output file named labeled_sel_[table]_[in_file]
-    out_avg_file = in_path + "/labeled_sel_" + table + "_" + in_filename
-    Util.dump_labeled_sel_queries_file(dimension, out_avg_file, queries)
+    # 4.1 in single scan mode, write labeled sels queries to output file named labeled_sels_[table]_[in_file]
+    if single_scan:
+        for query in queries:
+            query["time_sels"] = query["time_1"]
+            query["time_sels_std"] = query["time_1_std"]
+        out_file = in_path + "/labeled_sels_" + table + "_" + in_filename
+        Util.dump_labeled_sels_queries_file(out_file, queries)
+    else:
+        # 4.1 write labeled sel queries to output file named labeled_sel_[table]_[in_file]
+        out_avg_file = in_path + "/labeled_sel_" + table + "_" + in_filename
+        Util.dump_labeled_sel_queries_file(dimension, out_avg_file, queries)
 
-    # 4.2 write std of labeled sel queries to output file named labeled_sel_std_[table]_[in_file]
-    out_std_file = in_path + "/labeled_sel_std_" + table + "_" + in_filename
-    Util.dump_labeled_sel_std_queries_file(dimension, out_std_file, queries)
+        # 4.2 write std of labeled sel queries to output file named labeled_sel_std_[table]_[in_file]
+        out_std_file = in_path + "/labeled_sel_std_" + table + "_" + in_filename
+        Util.dump_labeled_sel_std_queries_file(dimension, out_std_file, queries)
 
+    # 4.3 write metadata of the measurements to output file named labeled_sel(s)_meta_[table]_[in_file].json
+    out_meta_file = in_path + ("/labeled_sels_meta_" if single_scan else "/labeled_sel_meta_") + table + "_" + \
+        in_filename + ".json"
+    metadata = {"dataset": args.dataset, "dimension": dimension, "in_file": in_file,
+                "num_of_runs": num_of_runs, "timeout": 0,
+                "num_of_connections": num_of_connections, "settings": settings, "pin_cpus": cpus,
+                "timing": timing}
+    metadata.update(cache.metadata())
+    Util.dump_labeling_metadata_file(out_meta_file, metadata)
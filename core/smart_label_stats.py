@@ -0,0 +1,48 @@
+import csv
+import threading
+
+
+###########################################################
+#  Label_Stats
+#
+# Description:
+#   Append-only file of the server-side stats of the measurements of the labeling scripts
+#     (smart_label_queries.py, smart_label_sel_queries.py) in server timing (see PostgreSQL.time()),
+#   stored alongside the labels, to separate the execution in the database from the transfer cost,
+#     and to diagnose where the time budget goes.
+# Implementation:
+#   Each measurement is appended as one record as soon as it completes:
+#     format (csv):
+#       run, query_id, plan_id, client_time, planning_time, execution_time, shared_hit_blocks, shared_read_blocks
+#       ...
+#     times are in seconds, the server-side columns are empty if the query timed out.
+#
+###########################################################
+class Label_Stats:
+
+    # @param - stats_file: str, the stats file, created if it does not exist
+    def __init__(self, stats_file):
+        self.stats_file = stats_file
+        self.lock = threading.Lock()
+        self.out = open(stats_file, "a")
+        self.writer = csv.writer(self.out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+
+    # append the stats of one measurement, called concurrently from the labeling workers
+    # @param - run: int, run index (0 ~ num_of_runs - 1)
+    # @param - query_plan: (query_id, plan_id)
+    # @param - client_time: float, time (seconds) measured on the client
+    # @param - stats: {planning_time, execution_time, shared_hit_blocks, shared_read_blocks}, see PostgreSQL.time(),
+    #          None if the query timed out
+    def record(self, run, query_plan, client_time, stats):
+        row = [run, query_plan[0], query_plan[1], client_time]
+        if stats is not None:
+            row.extend([stats["planning_time"], stats["execution_time"],
+                        stats["shared_hit_blocks"], stats["shared_read_blocks"]])
+        else:
+            row.extend(["", "", "", ""])
+        with self.lock:
+            self.writer.writerow(row)
+            self.out.flush()
+
+    def close(self):
+        self.out.close()
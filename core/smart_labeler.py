@@ -0,0 +1,121 @@
+import concurrent.futures
+import os
+import progressbar
+import queue
+import random
+import threading
+
+
+###########################################################
+#  Labeler
+#
+# Description:
+#   Run the labeling tasks (e.g., (query_id, plan_id) pairs) of the labeling scripts
+#     (smart_label_queries.py, smart_label_sel_queries.py, smart_label_sample_queries.py)
+#     on a number of concurrent database connections,
+#   so that the waiting on slow (timed out) plans of one connection overlaps with the others.
+# Implementation:
+#   Each run shuffles the task list again (the same per-run randomization as the serial loop),
+#     puts it into a queue, and each worker thread, checking out its own connection of the pool (PostgreSQLPool),
+#     pulls and labels the tasks, until the queue is empty.
+#   An exception raised by a worker (e.g., by the label function) fails the run after the other workers are done.
+#   Each connection can be isolated by session settings (e.g., max_parallel_workers_per_gather=0),
+#     and its backend process can be pinned to one CPU (pg_backend_pid(), the database must run on this host),
+#     so that the concurrent labels do not compete for the same cores.
+#   With one connection, the tasks run in the shuffled order one by one, the same as the serial loop.
+#   The buffer-cache state of the measurements can be controlled (see Cache_Control):
+#     warm - the tables and indexes are prewarmed before each run,
+#     cold - the caches are evicted before each task, and the connection is reopened after (one connection only).
+#
+###########################################################
+class Labeler:
+
+    # @param - pool: PostgreSQLPool object, one worker thread per connection of the pool
+    # @param - settings: [list of str], session settings run on each connection, e.g., ["jit=off"]. Default: []
+    # @param - cpus: [list of int], CPU ids to pin the backends of the connections to, round robin,
+    #                empty for no pinning. Default: []
+    # @param - rng: random.Random object, shuffles the tasks of each run. Default: None (module random)
+    # @param - cache: Cache_Control object, buffer-cache state of the measurements. Default: None (no control)
+    # @param - timeout: int, statement timeout (milliseconds) of the tasks, 0 for no timeout. Default: 0
+    def __init__(self, pool, settings=[], cpus=[], rng=None, cache=None, timeout=0):
+        if cache is not None and cache.is_cold() and pool.size() > 1:
+            print("Cold cache mode measures on one connection, but " + str(pool.size()) + " are given!")
+            exit(0)
+        self.pool = pool
+        self.cpus = cpus
+        self.rng = rng if rng is not None else random
+        self.cache = cache
+        self.timeout = timeout
+        # run the session settings on all connections of the pool
+        dbs = [pool.acquire() for index in range(0, pool.size())]
+        for db in dbs:
+            for setting in settings:
+                db.set_session(setting)
+        for db in dbs:
+            pool.release(db)
+
+    # pin the backend of the connection of worker [index], round robin over cpus
+    def pin(self, db, index):
+        if len(self.cpus) > 0:
+            Labeler.pin_backend(db, self.cpus[index % len(self.cpus)])
+
+    # pin the backend process of the connection to the cpu
+    @staticmethod
+    def pin_backend(db, cpu):
+        pid = db.query("SELECT pg_backend_pid()")[0][0]
+        try:
+            os.sched_setaffinity(pid, {cpu})
+        except (OSError, AttributeError) as error:
+            print("Pinning backend [" + str(pid) + "] to CPU [" + str(cpu) + "] failed: " + str(error))
+
+    # run all tasks once, in a new shuffled order
+    # @param - tasks: [list of tasks], each task being a hashable object, e.g., (query_id, plan_id)
+    # @param - label: function (db, task) -> value, labels one task on the given connection,
+    #                 called concurrently from the worker threads
+    # @return - {task: value}
+    def run(self, tasks, label):
+        # shuffle the task list
+        tasks = list(tasks)
+        self.rng.shuffle(tasks)
+        todo = queue.Queue()
+        for task in tasks:
+            todo.put(task)
+
+        values = {}
+        lock = threading.Lock()
+        # show progress bar
+        bar = progressbar.ProgressBar(maxval=len(tasks),
+                                      widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
+        # prewarm the caches before the run
+        if self.cache is not None and self.cache.is_warm():
+            with self.pool.checkout() as db:
+                self.cache.warm(db)
+        bar.start()
+
+        def work(index):
+            with self.pool.checkout(self.timeout) as db:
+                self.pin(db, index)
+                while True:
+                    try:
+                        task = todo.get_nowait()
+                    except queue.Empty:
+                        return
+                    # evict the caches before each task, and reopen the connection
+                    if self.cache is not None and self.cache.is_cold():
+                        db.close()
+                        self.cache.evict()
+                        db.reconnect(retries=60)
+                        self.pin(db, index)
+                    value = label(db, task)
+                    with lock:
+                        values[task] = value
+                        bar.update(len(values))
+
+        # the exception of a failed worker is re-raised after all workers are done,
+        #   instead of dropping its task silently from the values
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.pool.size()) as executor:
+            workers = [executor.submit(work, index) for index in range(0, self.pool.size())]
+        bar.finish()
+        for worker in workers:
+            worker.result()
+        return values
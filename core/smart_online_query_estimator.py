@@ -0,0 +1,140 @@
+from config import QueryTimeEstimatorConfig as conf
+from smart_query_estimator import Query_Estimator
+import numpy as np
+from scipy.stats import norm
+
+
+###########################################################
+#  Online_Query_Estimator
+#
+# Description:
+#   Query_Estimator that keeps learning from observed executions (query_sels, plan, time)
+#     without retraining from the labeled files.
+# Implementation:
+#   Each plan's linear model [coefficients of its sels, intercept] is updated by
+#     recursive least squares (RLS) with a forgetting factor lambda (0 < lambda <= 1):
+#       phi = [x, 1]
+#       g = P phi / (lambda + phi' P phi)
+#       theta = theta + g (y - phi' theta)
+#       P = (P - g phi' P) / lambda
+#     the weight of an observation decays by lambda per newer observation of the same plan,
+#     so the models follow drift with an effective window of about 1 / (1 - lambda) observations.
+#   Observed times no less than the timeout cut are right-censored (only known to be >= timeout):
+#     if the plan's estimate is already no less than the timeout, the observation is skipped,
+#     otherwise the estimate is too low, and one RLS step is made toward a target time, in censoring mode:
+#       drop  - the timeout cut,
+#       tobit - the Tobit conditional mean E[y | y >= timeout] = m + s * lambda(a) (see Query_Estimator),
+#               m - the plan's estimate, s - the plan's residual std,
+#     so that an estimate that picked a timed-out plan is corrected toward slow.
+#   The compact form is written as a bundle snapshot every snapshot_interval updates.
+#   fit() or load() after the online updates started resets the RLS state, the updates restart from the new models.
+#
+###########################################################
+class Online_Query_Estimator(Query_Estimator):
+
+    # @param - forgetting: float, forgetting factor lambda. Default: 0.99
+    # @param - initial_covariance: float, P is initialized to initial_covariance * I,
+    #                              the larger it is, the faster the initial models are overridden. Default: 1.0
+    # @param - snapshot_file: str, bundle file to write the snapshots to. Default: None (no snapshots)
+    # @param - snapshot_interval: int, number of updates between two snapshots. Default: 100
+    # @param - sample_table: str, sample table recorded in the snapshots. Default: None
+    # @param - censoring: str, target of the timed-out observations, drop / tobit, see Query_Estimator. Default: drop
+    def __init__(self, dimension, num_of_joins=1,
+                 forgetting=0.99,
+                 initial_covariance=1.0,
+                 snapshot_file=None,
+                 snapshot_interval=100,
+                 sample_table=None,
+                 censoring="drop"):
+        super().__init__(dimension, num_of_joins, censoring=censoring)
+        if not 0.0 < forgetting <= 1.0:
+            print("Forgetting factor " + str(forgetting) + " must be in (0, 1]!")
+            exit(0)
+        self.forgetting = forgetting
+        self.initial_covariance = initial_covariance
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+        self.sample_table = sample_table
+        self.covariances = None
+        self.num_of_updates = 0
+        self.num_of_skipped = 0
+        self.num_of_censored = 0
+
+    # refit the model of the plan from the labeled data, see Query_Estimator.fit(),
+    #   the online updates restart from the refit models (start() again on the next update)
+    def fit(self, _plan, _x, _y):
+        super().fit(_plan, _x, _y)
+        self.covariances = None
+
+    # load all models, see Query_Estimator.load(),
+    #   the online updates restart from the loaded models (start() again on the next update)
+    def load(self, path, sample_table=None):
+        super().load(path, sample_table)
+        self.covariances = None
+
+    # start the online updates from the current models, must be called after fit() or load()
+    def start(self):
+        if self.coefs is None:
+            self.compact()
+        # bundles are memory-mapped read-only, copy them before updating in place
+        self.coefs = np.array(self.coefs, dtype=np.float64)
+        self.intercepts = np.array(self.intercepts, dtype=np.float64)
+        self.covariances = {}
+        for plan in range(1, self.num_of_plans + 1):
+            k = len(self.plan_sel_indexes[plan]) + 1
+            self.covariances[plan] = np.eye(k) * self.initial_covariance
+
+    # fold one observed execution into the model of the plan
+    # @param query_sels - {id, sel_1, sel_2, ..., sel_(2**d-1)} or numpy 1d array [sel_1, ..., sel_(2**d-1)]
+    # @param plan - int, the plan id the query was executed with
+    # @param time - float, the observed query time (seconds)
+    # @return - True if the model is updated, False if the observation is skipped
+    def update(self, query_sels, plan, time):
+        if self.covariances is None:
+            self.start()
+        if isinstance(query_sels, dict):
+            query_sels = self.sels_vector(query_sels)
+        sel_indexes = self.plan_sel_indexes[plan]
+        phi = np.append(np.asarray(query_sels, dtype=np.float64)[sel_indexes], 1.0)
+        theta = np.append(self.coefs[plan - 1, sel_indexes], self.intercepts[plan - 1])
+
+        # right-censored observation, only an estimate below the timeout cut is corrected
+        if time >= conf.timeout:
+            m = phi @ theta
+            if m >= conf.timeout:
+                self.num_of_skipped += 1
+                return False
+            time = self.censored_target(plan, m)
+            self.num_of_censored += 1
+
+        p = self.covariances[plan]
+        p_phi = p @ phi
+        gain = p_phi / (self.forgetting + phi @ p_phi)
+        theta = theta + gain * (time - phi @ theta)
+        p = (p - np.outer(gain, p_phi)) / self.forgetting
+        # keep P symmetric against rounding errors
+        self.covariances[plan] = (p + p.T) / 2.0
+
+        self.coefs[plan - 1, sel_indexes] = theta[:-1]
+        self.intercepts[plan - 1] = theta[-1]
+
+        self.num_of_updates += 1
+        if self.snapshot_file is not None and self.num_of_updates % self.snapshot_interval == 0:
+            self.snapshot()
+        return True
+
+    # target time of a right-censored observation of the plan
+    # @param - plan: int, the plan id
+    # @param - m: float, the plan's estimate time, less than the timeout cut
+    # @return - float, the timeout cut in drop mode, E[y | y >= timeout] in tobit mode
+    def censored_target(self, plan, m):
+        if self.censoring == "tobit":
+            s = max(self.residual_stds[plan - 1], 1e-3)
+            a = (conf.timeout - m) / s
+            return m + s * np.exp(norm.logpdf(a) - norm.logsf(a))
+        return conf.timeout
+
+    # write the current compact form to the snapshot bundle file
+    def snapshot(self):
+        if self.snapshot_file is not None:
+            self.save_bundle(self.snapshot_file, self.sample_table)
@@ -0,0 +1,103 @@
+###########################################################
+#  PlanEncoder
+#
+# Description:
+#   Encode/decode plan ids with integer bit operations for any dimension.
+#     A plan id within one join method is a d bits decimal (1 - using / 0 - not using index),
+#       where the highest bit is hint_id = 0 and the lowest bit is hint_id = d-1,
+#     example (d = 3):
+#       110 - using indexes of hint_id 0 and 1, not using index of hint_id 2
+#     With num_of_joins > 1, plan ids are laid out join method by join method:
+#       [1 ~ 2**d-1] -> join method 1, [2**d ~ 2*(2**d-1)] -> join method 2, ...
+# Implementation:
+#   All plans' decodings are precomputed into lookup tables when the encoder is constructed,
+#   and one encoder per (dimension, num_of_joins) is shared through PlanEncoder.get().
+#
+###########################################################
+class PlanEncoder:
+
+    # cache of encoders: (dimension, num_of_joins) -> PlanEncoder
+    encoders = {}
+
+    def __init__(self, dimension, num_of_joins=1):
+        self.dimension = dimension
+        self.num_of_joins = num_of_joins
+        self.num_of_index_plans = (1 << dimension) - 1  # number of index selection plans within one join method
+        self.num_of_plans = self.num_of_index_plans * num_of_joins
+
+        # lookup tables indexed by plan id [0 ~ num_of_plans], plan 0 is the original plan (no hint)
+        #   Example of tables for dimension=3, num_of_joins=1:
+        #         self.index_sets[6] = (0, 1)  # 110 -> use indexes of hint_id 0 and 1
+        #         self.sel_ids[6] = [2, 4, 6]  # 110 -> [010, 100, 110]
+        self.reduced_plans = [0] * (self.num_of_plans + 1)
+        self.join_methods = [1] * (self.num_of_plans + 1)
+        self.index_sets = [()] * (self.num_of_plans + 1)
+        self.sel_ids = [[]] * (self.num_of_plans + 1)
+        for plan in range(1, self.num_of_plans + 1):
+            reduced_plan, join_method = PlanEncoder.reduce(plan, dimension)
+            self.reduced_plans[plan] = reduced_plan
+            self.join_methods[plan] = join_method
+            self.index_sets[plan] = tuple(hint_id for hint_id in range(0, dimension)
+                                          if reduced_plan & PlanEncoder.hint_bit(hint_id, dimension))
+            self.sel_ids[plan] = PlanEncoder.decompose(reduced_plan)
+
+    @staticmethod
+    def get(dimension, num_of_joins=1):
+        key = (dimension, num_of_joins)
+        encoder = PlanEncoder.encoders.get(key)
+        if encoder is None:
+            encoder = PlanEncoder(dimension, num_of_joins)
+            PlanEncoder.encoders[key] = encoder
+        return encoder
+
+    # bit of the given hint_id in a plan id of given dimension
+    #   Example: dimension = 3, hint_id = 0 -> 100, hint_id = 2 -> 001
+    @staticmethod
+    def hint_bit(hint_id, dimension):
+        return 1 << (dimension - 1 - hint_id)
+
+    # reduce plan to be the index_selection plan within one join method
+    # @return - (reduced plan id, join method [1 ~ num_of_joins])
+    @staticmethod
+    def reduce(plan, dimension):
+        if plan < 1:
+            return plan, 1
+        num_of_index_plans = (1 << dimension) - 1
+        join_method, reduced_plan = divmod(plan - 1, num_of_index_plans)
+        return reduced_plan + 1, join_method + 1
+
+    # selectivity value ids of a reduced plan: its powers of 2 ascending, plus the plan itself if using >= 2 indexes
+    #   Example: 6 (110) -> [2, 4, 6], 2 (010) -> [2]
+    @staticmethod
+    def decompose(reduced_plan):
+        sel_ids = []
+        bits = reduced_plan
+        while bits:
+            lowest_bit = bits & -bits
+            sel_ids.append(lowest_bit)
+            bits ^= lowest_bit
+        if len(sel_ids) > 1:
+            sel_ids.append(reduced_plan)
+        return sel_ids
+
+    # exit if the plan id is out of the lookup tables [0 ~ num_of_plans]
+    def check_plan(self, plan):
+        if plan < 0 or plan >= len(self.reduced_plans):
+            print("plan " + str(plan) + " is invalid given dimension " + str(self.dimension) +
+                  ", number of joins " + str(self.num_of_joins))
+            exit(0)
+
+    def use_index(self, hint_id, plan):
+        self.check_plan(plan)
+        return (self.reduced_plans[plan] >> (self.dimension - 1 - hint_id)) & 1 == 1
+
+    def reduce_join_method(self, plan):
+        return self.reduced_plans[plan], self.join_methods[plan]
+
+    # hint ids of the indexes the plan uses, ascending
+    def index_set_of_plan(self, plan):
+        self.check_plan(plan)
+        return self.index_sets[plan]
+
+    def sel_ids_of_plan(self, plan):
+        return self.sel_ids[plan]
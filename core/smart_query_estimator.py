@@ -1,7 +1,10 @@
 from config import QueryTimeEstimatorConfig as conf
+from smart_array_file import ArrayFile
 from smart_util import Util
 import numpy as np
+import os.path
 import pickle
+from scipy.stats import norm
 from sklearn.linear_model import LinearRegression
 
 
@@ -22,16 +25,56 @@ from sklearn.linear_model import LinearRegression
 #   Example 2: the features for plan 11000 are the 3 features: sel(d1), sel(d2) and sel(d1 & d2).
 #   Example 3: the features for plan 11010 are the 4 features:
 #                sel(d1), sel(d2), sel(d4) and sel(d1 & d2 & d4).
+#   For predicting all plans at once, the models' coefficients are scattered into a dense matrix
+#     coefs [num_of_plans x (2**d-1)] over the full selectivity vector [sel_1, sel_2, ..., sel_(2**d-1)],
+#     so that all plans' times are one matrix-vector product: coefs @ sels + intercepts.
+#   The compact form can be saved as one bundle file (see ArrayFile) with the metadata
+#     (dimension, num_of_joins, timeout, sample_table) checked when loading.
+#   For uncertainty-aware estimates, the time of a plan is modeled as a normal distribution N(y, std**2),
+#     std**2 = residual_std**2 + (noise_c0 + noise_c1 * y)**2, where
+#       residual_std - std of the training residuals of the plan's model (error of the model),
+#       noise_c0 + noise_c1 * y - std of repeated runs of the plan, fit from the labeled std files (noise of runs).
+#   Labels no less than the timeout cut are only known to be >= timeout (right-censored), in censoring mode:
+#     drop  - remove them from the training data (default),
+#     tobit - fit a Tobit model y = x * b + e, e ~ N(0, s**2), observed min(y, timeout), by EM:
+#               E-step: impute censored labels with E[y | y >= timeout] = m + s * lambda(a),
+#                       a = (timeout - m) / s, lambda(a) = pdf(a) / (1 - cdf(a)), m = x * b
+#               M-step: refit b on the imputed labels, s**2 = mean of the expected squared residuals
+#             so that plans which often time out are estimated slow instead of being learned from fast queries only.
 #
 ###########################################################
 class Query_Estimator:
-    def __init__(self, dimension, num_of_joins=1):
+
+    censoring_modes = ["drop", "tobit"]
+
+    # @param censoring - str, how to train on labels no less than the timeout cut, drop / tobit. Default: drop
+    # @param tobit_iterations - int, max number of EM iterations in tobit censoring mode. Default: 50
+    def __init__(self, dimension, num_of_joins=1, censoring="drop", tobit_iterations=50):
+        if censoring not in Query_Estimator.censoring_modes:
+            print("Censoring mode " + str(censoring) + " is not supported, use one of " +
+                  str(Query_Estimator.censoring_modes) + "!")
+            exit(0)
+        self.censoring = censoring
+        self.tobit_iterations = tobit_iterations
         self.dimension = dimension
+        self.num_of_joins = num_of_joins
         self.num_of_plans = Util.num_of_plans(dimension, num_of_joins)
+        self.num_of_sels = 2 ** dimension - 1
         self.models = {}
         for plan in range(1, self.num_of_plans + 1):
             model = LinearRegression()
             self.models[plan] = model
+        # stacked coefficients of all plans, built lazily by compact() or loaded from a bundle
+        self.coefs = None
+        self.intercepts = None
+        self.sample_table = None
+        # uncertainty models of all plans, zeros (point estimates) until trained
+        self.residual_stds = np.zeros(self.num_of_plans, dtype=np.float64)
+        self.noise_coefs = np.zeros((self.num_of_plans, 2), dtype=np.float64)
+        # indexes of the features of each plan in the full selectivity vector
+        self.plan_sel_indexes = {}
+        for plan in range(1, self.num_of_plans + 1):
+            self.plan_sel_indexes[plan] = np.array(Util.sel_ids_of_plan(plan, dimension, num_of_joins)) - 1
 
     # fit model for plan
     # @prame _plan - int, the plan id of the model
@@ -40,18 +83,66 @@ class Query_Estimator:
     # @param _y - numpy 2d array, each row has only the target value for the corresponding query
     def fit(self, _plan, _x, _y):
         model = self.models[_plan]
+        # data points that are no less than the timeout cut
+        censored_index = _y[:, 0] >= conf.timeout
+        if self.censoring == "tobit" and np.any(censored_index) and not np.all(censored_index):
+            self.residual_stds[_plan - 1] = self.fit_tobit(model, _x, _y[:, 0], censored_index)
         # remove those data points that are no less than the timeout cut
-        filter_index = _y[:, 0] < conf.timeout
-        if len(_x[filter_index]) < 1:
-            print(_x.shape)
-            print(_y.shape)
+        elif np.any(~censored_index):
+            _x = _x[~censored_index]
+            _y = _y[~censored_index]
             model.fit(_x, _y)
+            self.residual_stds[_plan - 1] = np.std(_y[:, 0] - np.ravel(model.predict(_x)))
+        else:
+            model.fit(_x, _y)
+            self.residual_stds[_plan - 1] = 0.0
+        self.coefs = None
+
+    # fit Tobit model with right-censored labels by EM
+    # @param model - LinearRegression object to fit
+    # @param _x - numpy 2d array, features
+    # @param _y - numpy 1d array, labels, censored labels are treated as timeout
+    # @param censored_index - numpy 1d boolean array, True if the label is censored
+    # @return - s, std of the Tobit model's error
+    def fit_tobit(self, model, _x, _y, censored_index):
+        y = np.where(censored_index, conf.timeout, _y).astype(np.float64)
+        # start from the least squares fit of the uncensored data points
+        model.fit(_x[~censored_index], y[~censored_index].reshape(-1, 1))
+        residuals = y[~censored_index] - np.ravel(model.predict(_x[~censored_index]))
+        s = max(np.std(residuals), 1e-3)
+        for iteration in range(self.tobit_iterations):
+            # E-step
+            m = np.ravel(model.predict(_x))
+            a = (conf.timeout - m[censored_index]) / s
+            lam = np.exp(norm.logpdf(a) - norm.logsf(a))
+            imputed = y.copy()
+            imputed[censored_index] = m[censored_index] + s * lam
+            # expected squared residuals, Var[y | y >= timeout] = s**2 * (1 + a * lambda - lambda**2)
+            sqr_residuals = (y - m) ** 2
+            sqr_residuals[censored_index] = s ** 2 * (1.0 + a * lam - lam ** 2) + (s * lam) ** 2
+            # M-step
+            model.fit(_x, imputed.reshape(-1, 1))
+            new_s = max(np.sqrt(np.mean(sqr_residuals)), 1e-3)
+            if abs(new_s - s) < 1e-6:
+                s = new_s
+                break
+            s = new_s
+        return s
+
+    # fit noise model of plan: std of repeated runs = c0 + c1 * time
+    # @param _plan - int, the plan id of the model
+    # @param _times - numpy 1d array, mean time of repeated runs for each query
+    # @param _stds - numpy 1d array, std of repeated runs for each query
+    def fit_noise(self, _plan, _times, _stds):
+        # remove those data points that are no less than the timeout cut
+        filter_index = _times < conf.timeout
+        _times = _times[filter_index]
+        _stds = _stds[filter_index]
+        if len(_times) < 2:
+            self.noise_coefs[_plan - 1] = [np.mean(_stds) if len(_stds) > 0 else 0.0, 0.0]
             return
-        _x = _x[filter_index]
-        _y = _y[filter_index]
-        print(_x.shape)
-        print(_y.shape)
-        model.fit(_x, _y)
+        c1, c0 = np.polyfit(_times, _stds, 1)
+        self.noise_coefs[_plan - 1] = [max(c0, 0.0), max(c1, 0.0)]
 
     # save all models to files under the given path
     def save(self, path):
@@ -63,9 +154,16 @@ class Query_Estimator:
             filename = "query_estimator_plan_" + str(plan) + ".model"
             model_file = path + "/" + filename
             pickle.dump(model, open(model_file, "wb"))
+        uncertainty = {"residual_stds": self.residual_stds, "noise_coefs": self.noise_coefs}
+        pickle.dump(uncertainty, open(path + "/query_estimator_uncertainty.model", "wb"))
 
-    # load all models from files under the given path
-    def load(self, path):
+    # load all models from the given bundle file or from files under the given path
+    # @param path - bundle file written by save_bundle(), or the path of models written by save()
+    # @param sample_table - str, if given, the bundle must be trained on this sample table. Default: None
+    def load(self, path, sample_table=None):
+        if os.path.isfile(path):
+            self.load_bundle(path, sample_table)
+            return
         # trim the last '/'
         if path.endswith('/'):
             path = path[:-1]
@@ -73,6 +171,124 @@ class Query_Estimator:
             filename = "query_estimator_plan_" + str(plan) + ".model"
             model_file = path + "/" + filename
             self.models[plan] = pickle.load(open(model_file, "rb"))
+        self.coefs = None
+        # uncertainty models are optional for models saved before they existed
+        uncertainty_file = path + "/query_estimator_uncertainty.model"
+        if os.path.isfile(uncertainty_file):
+            uncertainty = pickle.load(open(uncertainty_file, "rb"))
+            self.residual_stds = uncertainty["residual_stds"]
+            self.noise_coefs = uncertainty["noise_coefs"]
+
+    # stack all plans' models into the dense coefficients matrix and intercepts vector
+    #   coefs[plan - 1, sel_id - 1] = coefficient of sel_id in the model of plan
+    def compact(self):
+        coefs = np.zeros((self.num_of_plans, self.num_of_sels), dtype=np.float64)
+        intercepts = np.zeros(self.num_of_plans, dtype=np.float64)
+        for plan in range(1, self.num_of_plans + 1):
+            model = self.models[plan]
+            if not hasattr(model, "coef_"):
+                print("Model of plan " + str(plan) + " is not trained yet!")
+                exit(0)
+            coefs[plan - 1, self.plan_sel_indexes[plan]] = np.ravel(model.coef_)
+            intercepts[plan - 1] = np.ravel(model.intercept_)[0]
+        self.coefs = coefs
+        self.intercepts = intercepts
+
+    # save the compact form of all models into one bundle file
+    # @param bundle_file - path of the output file
+    # @param sample_table - str, name of the sample table the selectivities are collected on. Default: None
+    def save_bundle(self, bundle_file, sample_table=None):
+        if self.coefs is None:
+            self.compact()
+        metadata = {"type": "query_estimator",
+                    "dimension": self.dimension,
+                    "num_of_joins": self.num_of_joins,
+                    "timeout": conf.timeout,
+                    "sample_table": sample_table}
+        ArrayFile.dump(bundle_file,
+                       {"coefs": self.coefs,
+                        "intercepts": self.intercepts,
+                        "residual_stds": self.residual_stds,
+                        "noise_coefs": self.noise_coefs},
+                       metadata)
+
+    # load the compact form of all models from one bundle file (memory-mapped)
+    # @param bundle_file - path of the input file
+    # @param sample_table - str, if given, the bundle must be trained on this sample table. Default: None
+    def load_bundle(self, bundle_file, sample_table=None):
+        arrays, metadata = ArrayFile.load(bundle_file)
+        expected = {"type": "query_estimator",
+                    "dimension": self.dimension,
+                    "num_of_joins": self.num_of_joins,
+                    "timeout": conf.timeout}
+        if sample_table is not None:
+            expected["sample_table"] = sample_table
+        for key, value in expected.items():
+            if metadata.get(key) != value:
+                print("Query Estimator bundle " + bundle_file + " has " + key + " = " + str(metadata.get(key)) +
+                      ", but " + str(value) + " is expected!")
+                exit(0)
+        if arrays["coefs"].shape != (self.num_of_plans, self.num_of_sels):
+            print("Query Estimator bundle " + bundle_file + " has coefs of shape " + str(arrays["coefs"].shape) +
+                  ", but " + str((self.num_of_plans, self.num_of_sels)) + " is expected!")
+            exit(0)
+        self.coefs = arrays["coefs"]
+        self.intercepts = arrays["intercepts"]
+        if "residual_stds" in arrays:
+            self.residual_stds = arrays["residual_stds"]
+            self.noise_coefs = arrays["noise_coefs"]
+        self.sample_table = metadata.get("sample_table")
+
+    # translate query_sels objects into the full selectivity vector / matrix
+    # @param query_sels - {id, sel_1, sel_2, ..., sel_(2**d-1)} or [list of such objects]
+    # @return - numpy 1d array [sel_1, ..., sel_(2**d-1)] or 2d array with one row per object
+    def sels_vector(self, query_sels):
+        if isinstance(query_sels, dict):
+            return np.array([query_sels["sel_" + str(sel_id)] for sel_id in range(1, self.num_of_sels + 1)],
+                            dtype=np.float64)
+        return np.array([self.sels_vector(x) for x in query_sels], dtype=np.float64).reshape(-1, self.num_of_sels)
+
+    # predict time for all plans
+    # @param query_sels - one of:
+    #                     {id, sel_1, sel_2, ..., sel_(2**d-1)} object, or [list of such objects],
+    #                     numpy 1d array [sel_1, ..., sel_(2**d-1)] for one query,
+    #                     numpy 2d array, each row being the selectivity vector of one query
+    # @param quantile - float, (0, 1), predict the quantile of each plan's time distribution
+    #                  instead of its mean, Default: 0.5 (point estimate)
+    # @return y - numpy 1d array [time of plan 1, ..., time of plan num_of_plans] for one query,
+    #             or numpy 2d array with one row per query
+    def predict_all(self, query_sels, mode="application", quantile=0.5):
+        if not 0.0 < quantile < 1.0:
+            print("Quantile must be in (0, 1), but " + str(quantile) + " is given!")
+            exit(0)
+        if self.coefs is None:
+            self.compact()
+        if isinstance(query_sels, dict) or (isinstance(query_sels, list) and len(query_sels) > 0
+                                            and isinstance(query_sels[0], dict)):
+            query_sels = self.sels_vector(query_sels)
+        sels = np.asarray(query_sels, dtype=np.float64)
+        y = sels @ self.coefs.T + self.intercepts
+        y = y + self.quantile_shift(y, quantile)
+        # cap predicted time to be the timeout cut when in analyze mode
+        if mode == "analyze":
+            y = np.clip(y, a_min=0.0, a_max=conf.timeout)
+        return y.astype(np.float32)
+
+    # shift of the quantile of each plan's time distribution from the point estimates
+    # @param y - numpy 1d/2d array, point estimates of plans' times
+    # @param quantile - float, (0, 1)
+    # @return - numpy array of the same shape as y (0.0 for quantile = 0.5)
+    def quantile_shift(self, y, quantile):
+        if quantile == 0.5:
+            return np.zeros_like(y)
+        return norm.ppf(quantile) * self.predict_std(y)
+
+    # std of each plan's time distribution given the point estimates
+    # @param y - numpy 1d/2d array, point estimates of plans' times as returned by predict_all()
+    # @return - numpy array of the same shape as y
+    def predict_std(self, y):
+        noise_stds = self.noise_coefs[:, 0] + self.noise_coefs[:, 1] * np.clip(y, a_min=0.0, a_max=None)
+        return np.sqrt(self.residual_stds ** 2 + noise_stds ** 2)
 
     # predict time for plan
     # @param _plan - int, the plan id of the model
@@ -80,8 +296,11 @@ class Query_Estimator:
     #             different plan ids could have different number of columns.
     # @return y - numpy 2d array, each row has only the predicted value for the corresponding query
     def predict(self, _plan, _x, mode="application"):
-        model = self.models[_plan]
-        y = model.predict(_x)
+        if self.coefs is None:
+            self.compact()
+        sel_indexes = self.plan_sel_indexes[_plan]
+        x = np.asarray(_x, dtype=np.float64).reshape(-1, len(sel_indexes))
+        y = (x @ self.coefs[_plan - 1, sel_indexes] + self.intercepts[_plan - 1]).reshape(-1, 1)
         # cap predicted time to be the timeout cut when in analyze mode
         if mode == "analyze":
             y = np.clip(y, a_min=0.0, a_max=conf.timeout)
@@ -0,0 +1,198 @@
+import numpy as np
+import os.path
+import time
+from smart_array_file import ArrayFile
+
+
+###########################################################
+#  Sample_Engine
+#
+# Description:
+#   Collect selectivities of filtering combinations on a sample table in process:
+#     the predicate columns of the sample table are loaded once from the database into numpy arrays,
+#     cached in a local ArrayFile which is memory-mapped by later runs,
+#     and the range / box predicates of a query are evaluated vectorized on the arrays,
+#     so that a selectivity is local array math instead of a database round trip.
+# Implementation:
+#   Each dimension (in the order of hint ids) of a dataset is described by a spec in dimension_specs:
+#     range - [start, end] on one column, "time" columns are stored as epoch seconds,
+#     box   - (lng0, lat0, lng1, lat1) box on a point column stored as its x and y columns,
+#     text  - full-text keyword, evaluated in the database (one lookup of matching ids per keyword, cached),
+#               needs the db handle and the id column of the sample table.
+#   Selectivity of a filtering combination fc = count(AND of masks of the dimensions in fc) / number of rows.
+#   For all combinations of a query, each dimension's predicate is evaluated once into a packed bitset over the rows
+#     (bit i = row i satisfies the predicate), and the bitset of a combination fc is the AND of two known bitsets,
+#       bitmaps[fc] = bitmaps[fc & (fc - 1)] & bitmaps[fc & -fc],
+#     i.e., fc without its lowest bit (Util.decompose_to_binary_numbers(fc)[0]), which is a smaller combination,
+#     and the single dimension of its lowest bit, so the 2**d-1 combinations cost d predicate evaluations,
+#     2**d-1-d ANDs and 2**d-1 popcounts (by a byte lookup table) over n/8 bytes each.
+#
+###########################################################
+class Sample_Engine:
+
+    # number of 1 bits of each byte value
+    popcount_table = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+    twitter_specs = [
+        {"kind": "text", "column": "text", "keyword": "keyword"},
+        {"kind": "range", "column": "create_at", "time": True, "start": "start_time", "end": "end_time"},
+        {"kind": "box", "column": "coordinate", "box": ["lng0", "lat0", "lng1", "lat1"]},
+        {"kind": "range", "column": "user_followers_count", "time": False,
+         "start": "user_followers_count_start", "end": "user_followers_count_end"},
+        {"kind": "range", "column": "user_statues_count", "time": False,
+         "start": "user_statues_count_start", "end": "user_statues_count_end"}
+    ]
+
+    dimension_specs = {
+        "twitter": twitter_specs,
+        "twitter_join": twitter_specs[:3],
+        "nyc": [
+            {"kind": "range", "column": "pickup_datetime", "time": True, "start": "start_time", "end": "end_time"},
+            {"kind": "range", "column": "trip_distance", "time": False,
+             "start": "trip_distance_start", "end": "trip_distance_end"},
+            {"kind": "box", "column": "pickup_coordinates", "box": ["lng0", "lat0", "lng1", "lat1"]}
+        ],
+        "tpch": [
+            {"kind": "range", "column": "L_EXTENDEDPRICE", "time": False,
+             "start": "extended_price_start", "end": "extended_price_end"},
+            {"kind": "range", "column": "L_SHIPDATE", "time": True, "start": "ship_date_start", "end": "ship_date_end"},
+            {"kind": "range", "column": "L_RECEIPTDATE", "time": True,
+             "start": "receipt_date_start", "end": "receipt_date_end"}
+        ]
+    }
+
+    # @param - dataset_name: str, key of config.datasets, e.g., nyc
+    # @param - dimension: int, dimension of the queries
+    # @param - table: str, sample table name
+    # @param - cache_file: str, local ArrayFile that caches the predicate columns of the sample table
+    # @param - db: PostgreSQL object, handle to the database, needed to build the cache file
+    #              and to evaluate text predicates. Default: None
+    def __init__(self, dataset_name, dimension, table, cache_file, db=None):
+        if dataset_name not in Sample_Engine.dimension_specs:
+            print("Dataset " + str(dataset_name) + " is not supported in Sample_Engine yet!")
+            exit(0)
+        self.specs = Sample_Engine.dimension_specs[dataset_name][:dimension]
+        if len(self.specs) != dimension:
+            print("Given dimension " + str(dimension) + " is not supported for dataset " + dataset_name +
+                  " in Sample_Engine yet!")
+            exit(0)
+        self.dataset_name = dataset_name
+        self.dimension = dimension
+        self.table = table
+        self.db = db
+        self.keyword_ids = {}
+        if not os.path.isfile(cache_file):
+            if db is None:
+                print("Cache file [" + cache_file + "] does NOT exist and there is no database to build it! Exit!")
+                exit(0)
+            self.build(cache_file)
+        self.arrays, metadata = ArrayFile.load(cache_file)
+        if metadata["dataset"] != dataset_name or metadata["table"] != table:
+            print("Cache file [" + cache_file + "] is built for table [" + str(metadata["table"]) + "] of dataset [" +
+                  str(metadata["dataset"]) + "], not [" + table + "] of [" + dataset_name + "]! Exit!")
+            exit(0)
+        for spec in self.specs:
+            if spec["kind"] != "text" and spec["column"] not in metadata["columns"]:
+                print("Cache file [" + cache_file + "] has no column [" + spec["column"] + "], rebuild it! Exit!")
+                exit(0)
+        self.table_size = metadata["table_size"]
+
+    # SQL expressions of the cached arrays of a spec, {array name: expression}
+    @staticmethod
+    def spec_expressions(spec):
+        column = spec["column"]
+        if spec["kind"] == "text":
+            return {"id": "t.id"}
+        if spec["kind"] == "box":
+            return {column + "_x": "t." + column + "[0]", column + "_y": "t." + column + "[1]"}
+        if spec["time"]:
+            return {column: "extract(epoch from t." + column + ")"}
+        return {column: "t." + column}
+
+    # load the predicate columns of the sample table from the database into the cache file
+    def build(self, cache_file):
+        expressions = {}
+        for spec in self.specs:
+            expressions.update(Sample_Engine.spec_expressions(spec))
+        names = list(expressions)
+        sql = "SELECT " + ", ".join(expressions[name] for name in names) + \
+              "  FROM " + self.table + " t"
+        rows = self.db.query(sql)  # [(c1, c2, ...), ...]
+        if not isinstance(rows, list) or (len(rows) > 0 and rows[0] == ("timeout",)):
+            print("Loading sample table [" + self.table + "] failed! Exit!")
+            exit(0)
+        arrays = {}
+        for index, name in enumerate(names):
+            # NULL values (None) are loaded as NaN, which never satisfies a predicate
+            arrays[name] = np.array([row[index] for row in rows], dtype=np.int64 if name == "id" else np.float64)
+        metadata = {"dataset": self.dataset_name,
+                    "table": self.table,
+                    "table_size": len(rows),
+                    "columns": [spec["column"] for spec in self.specs if spec["kind"] != "text"]}
+        ArrayFile.dump(cache_file, arrays, metadata)
+        print("sample table [" + self.table + "] with " + str(len(rows)) + " rows cached to file [" + cache_file + "].")
+
+    # @param - value: str / number of a query, time strings are like 2015-12-01T00:00:00.000Z or 2010-01-30 23:31:00
+    # @return - float, epoch seconds for time values, the number itself otherwise
+    @staticmethod
+    def to_number(value, is_time):
+        if is_time:
+            return np.datetime64(str(value).rstrip("Z").replace(" ", "T"), "us").astype(np.int64) / 1e6
+        return float(value)
+
+    # @return - numpy 1d boolean array, rows of the sample table satisfying the predicate of the spec on query
+    def mask(self, spec, query):
+        if spec["kind"] == "range":
+            values = self.arrays[spec["column"]]
+            start = Sample_Engine.to_number(query[spec["start"]], spec["time"])
+            end = Sample_Engine.to_number(query[spec["end"]], spec["time"])
+            return (values >= start) & (values <= end)
+        if spec["kind"] == "box":
+            xs = self.arrays[spec["column"] + "_x"]
+            ys = self.arrays[spec["column"] + "_y"]
+            lng0, lat0, lng1, lat1 = [float(query[key]) for key in spec["box"]]
+            return (xs >= min(lng0, lng1)) & (xs <= max(lng0, lng1)) & (ys >= min(lat0, lat1)) & (ys <= max(lat0, lat1))
+        # text
+        keyword = query[spec["keyword"]]
+        if keyword not in self.keyword_ids:
+            if self.db is None:
+                print("Text predicate of keyword [" + keyword + "] needs a database to evaluate! Exit!")
+                exit(0)
+            sql = "SELECT t.id " \
+                  "  FROM " + self.table + " t " \
+                  " WHERE to_tsvector('english', t." + spec["column"] + ")@@to_tsquery('english', '" + keyword + "')"
+            self.keyword_ids[keyword] = np.array([row[0] for row in self.db.query(sql)], dtype=np.int64)
+        return np.isin(self.arrays["id"], self.keyword_ids[keyword])
+
+    # collect selectivities of all filtering combinations on given query
+    # @param - query: query object, see dataset's sel_query()
+    # @return - [list of 2**d-1 floats], selectivity [0, 1] of filtering combination fc at index fc - 1
+    def sels_query(self, query):
+        bitmaps = [None] * 2 ** self.dimension
+        # single dimensions, hint_id 0 is the highest bit of fc
+        for hint_id, spec in enumerate(self.specs):
+            bitmaps[1 << (self.dimension - 1 - hint_id)] = np.packbits(self.mask(spec, query))
+        sels = []
+        for fc in range(1, 2 ** self.dimension):
+            lowest = fc & -fc
+            if fc != lowest:
+                bitmaps[fc] = bitmaps[fc - lowest] & bitmaps[lowest]
+            count = int(np.sum(Sample_Engine.popcount_table[bitmaps[fc]], dtype=np.int64))
+            sels.append(count / float(self.table_size))
+        return sels
+
+    # collect selectivity of given filtering combination on given query
+    # @param - query: query object, see dataset's sel_query()
+    # @param - fc: 1 ~ 2**d-1, filtering combination
+    # @return - float, selectivity [0, 1] of given filtering combination on given query
+    def sel_query(self, query, fc):
+        combination = [self.mask(self.specs[hint_id], query) for hint_id in range(0, self.dimension)
+                       if fc & (1 << (self.dimension - 1 - hint_id))]
+        return np.count_nonzero(np.logical_and.reduce(combination)) / float(self.table_size)
+
+    # @return - time (seconds) of collecting selectivities of all filtering combinations on given query
+    def time_sels_query(self, query):
+        start = time.time()
+        self.sels_query(query)
+        end = time.time()
+        return end - start
@@ -0,0 +1,123 @@
+import math
+import numpy as np
+import pickle
+from config import QueryTimeEstimatorConfig as conf
+from smart_util import Util
+from sklearn.linear_model import LinearRegression
+
+
+###########################################################
+#  Sampling_Estimator
+#
+# Description:
+#   Estimate query time and result quality on different sampling plans:
+#     hint using index on one of the [d1, d2, ...] dimensions
+#     and limit k = cardinality(query) * one of the [s1, s2, ...] sample ratios (see time_sampling_query()),
+#   so that the lossy plans can be planned for unseen queries without labeled sample files.
+# Implementation:
+#   We train one time model and one quality model (linear regression) for each hint [0 ~ d-1],
+#     shared by all sample ratios of the hint, on the features of a sampling plan:
+#       sel - selectivity of the hinted dimension, i.e. sel_ids_of_sampling_plan(),
+#       ratio - sample ratio of the plan,
+#       log(1 + k) - k = round(card * ratio), card = Util.estimate_cardinality(),
+#       ratio * sel - fraction of the table scanned by the bitmap heap scan before k rows pass all conditions.
+#   Time labels no less than the timeout cut are removed from the training data of the time models,
+#     quality estimates are clipped into [0, 1].
+#
+###########################################################
+class Sampling_Estimator:
+
+    num_of_features = 4
+
+    # @param sample_ratios - [list of float], sample ratios of the dataset, e.g., Twitter.sample_ratios
+    # @param table_size - size of the full table of the dataset
+    # @param sels_table_size - size of the sample table the sels were collected on
+    def __init__(self, dimension, sample_ratios, table_size, sels_table_size):
+        self.dimension = dimension
+        self.sample_ratios = list(sample_ratios)
+        self.num_of_sample_ratios = len(sample_ratios)
+        self.num_of_sampling_plans = Util.num_of_sampling_plans(dimension, self.num_of_sample_ratios)
+        self.table_size = table_size
+        self.sels_table_size = sels_table_size
+        self.time_models = {}
+        self.quality_models = {}
+        for hint_id in range(0, dimension):
+            self.time_models[hint_id] = LinearRegression()
+            self.quality_models[hint_id] = LinearRegression()
+
+    # @param plan - int, sampling plan id 0 ~ d * len(sample_ratios) - 1
+    # @param query_sels - {id: 1, sel_1: 0.1, ..., sel_(2**d-1): 0.01}
+    # @return - list of num_of_features floats
+    def features(self, plan, query_sels):
+        sel = query_sels["sel_" + str(Util.sel_ids_of_sampling_plan(plan, self.dimension, self.num_of_sample_ratios)[0])]
+        ratio = self.sample_ratios[Util.sample_ratio_id_of_sampling_plan(self.num_of_sample_ratios, plan)]
+        card = Util.estimate_cardinality(query_sels, self.dimension, self.table_size, self.sels_table_size)
+        return [sel, ratio, math.log1p(round(card * ratio)), ratio * sel]
+
+    # fit models for hint
+    # @param _hint_id - int, the hint id of the models
+    # @param _x - numpy 2d array, each row is features() of one sampling plan of the hint for one query
+    # @param _time - numpy 1d array, real time of the sampling plan for the corresponding row
+    # @param _quality - numpy 1d array, quality of the sampling plan for the corresponding row
+    def fit(self, _hint_id, _x, _time, _quality):
+        # remove those data points that are no less than the timeout cut
+        filter_index = _time < conf.timeout
+        if np.sum(filter_index) >= 1:
+            self.time_models[_hint_id].fit(_x[filter_index], _time[filter_index])
+        else:
+            self.time_models[_hint_id].fit(_x, _time)
+        self.quality_models[_hint_id].fit(_x, _quality)
+
+    # predict time and quality for sampling plan
+    # @param _plan - int, sampling plan id 0 ~ d * len(sample_ratios) - 1
+    # @param _x - numpy 2d array, each row is features() of the plan for one query
+    # @return - (numpy 1d array of predicted times, numpy 1d array of predicted qualities)
+    def predict(self, _plan, _x):
+        hint_id = Util.hint_id_of_sampling_plan(self.num_of_sample_ratios, _plan)
+        _x = np.asarray(_x, dtype=np.float64)
+        times = np.maximum(self.time_models[hint_id].predict(_x), 0.0)
+        qualities = np.clip(self.quality_models[hint_id].predict(_x), 0.0, 1.0)
+        return times.astype(np.float32), qualities.astype(np.float32)
+
+    # estimate all sampling plans for given queries, in place of the labeled sample files
+    # @param queries_sels - [list of query_sels], see Util.load_queries_sels_file()
+    # @return - (labeled_sample_queries, sample_queries_qualities) in the same formats as
+    #           Util.load_labeled_sample_queries_file() and Util.load_sample_queries_qualities_file()
+    def estimate_sample_queries(self, queries_sels):
+        labeled_sample_queries = [{"id": query_sels["id"]} for query_sels in queries_sels]
+        sample_queries_qualities = [{"id": query_sels["id"]} for query_sels in queries_sels]
+        for plan in range(0, self.num_of_sampling_plans):
+            x = [self.features(plan, query_sels) for query_sels in queries_sels]
+            times, qualities = self.predict(plan, x)
+            for index in range(0, len(queries_sels)):
+                labeled_sample_queries[index]["time_" + str(plan)] = float(times[index])
+                sample_queries_qualities[index]["quality_" + str(plan)] = float(qualities[index])
+        return labeled_sample_queries, sample_queries_qualities
+
+    # save all models to one file under the given path
+    def save(self, path):
+        # trim the last '/'
+        if path.endswith('/'):
+            path = path[:-1]
+        model = {"dimension": self.dimension,
+                 "sample_ratios": self.sample_ratios,
+                 "table_size": self.table_size,
+                 "sels_table_size": self.sels_table_size,
+                 "time_models": self.time_models,
+                 "quality_models": self.quality_models}
+        pickle.dump(model, open(path + "/sampling_estimator.model", "wb"))
+
+    # load all models from the file under the given path
+    @staticmethod
+    def load(path):
+        # trim the last '/'
+        if path.endswith('/'):
+            path = path[:-1]
+        model = pickle.load(open(path + "/sampling_estimator.model", "rb"))
+        sampling_estimator = Sampling_Estimator(model["dimension"],
+                                                model["sample_ratios"],
+                                                model["table_size"],
+                                                model["sels_table_size"])
+        sampling_estimator.time_models = model["time_models"]
+        sampling_estimator.quality_models = model["quality_models"]
+        return sampling_estimator
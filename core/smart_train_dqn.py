@@ -10,6 +10,7 @@ from smart_dqn import DQN
 from smart_environment import Environment
 from smart_environment_v1 import Environment1
 from smart_environment_v2 import Environment2
+from smart_environment_v3 import Environment3
 from smart_query_estimator import Query_Estimator
 import torch
 import torch.optim as optim
@@ -33,12 +34,17 @@ import torch.nn.functional as F
 #  -tr / --trace           trace the evaluation result using training set, and output for each run. Default: False
 #  -trf / --trace_file     output file (no suffix) that holds the trace result. Default: None
 #  -nes / --no_early_stop  disable early_stop when model converges. Default: enabled
-#  ** Only required when version = 1/2:
+#  -sd / --seed            seed of random generators to make training repeatable. Default: None
+#  ** Only required when version = 1/2/3:
 #  -llsf / --list_labeled_sel_file  list of labeled_sel_queries files for different sample sizes
 #  -lsqf / --list_sel_query_file    list of sel_queries files for different sample sizes
 #  -scf  / --sel_costs_file         input file that holds sel queries costs for different sample sizes
 #  -qmp  / --qe_model_path          input path to load the models used by Query Estimator
 #  -sp   / --sample_pointer         pointer to the sample size to use for the query_estimator. Default: 2
+#  -qt   / --quantile               quantile of estimated times used to choose plans. Default: 0.5
+#  ** Only required when version = 3:
+#  -lss  / --list_sample_size       list of numbers of rows of the samples, in the same order as -lsqf
+#  -cl   / --confidence             confidence level of the sels' intervals to escalate samples. Default: 0.95
 #
 # Dependencies:
 #   python3.7 & pip: https://docs.aws.amazon.com/elasticbeanstalk/latest/dg/eb-cli3-install-linux.html
@@ -92,8 +98,9 @@ class ModelMemory:
 
 
 class ReplayMemory:
-    def __init__(self, capacity):
+    def __init__(self, capacity, rng=None):
         self.capacity = capacity
+        self.rng = rng if rng is not None else random.Random()
         self.memory = []
         self.push_count = 0
 
@@ -105,7 +112,7 @@ class ReplayMemory:
         self.push_count += 1
 
     def sample(self, batch_size):
-        return random.sample(self.memory, batch_size)
+        return self.rng.sample(self.memory, batch_size)
 
     def can_provide_sample(self, batch_size):
         return len(self.memory) >= batch_size
@@ -150,7 +157,7 @@ def extract_tensors(experiences):
 # @param - time_budget: float, time (second) for a query to be viable
 # @param - number_of_runs: int, how many times to loop all queries for training
 #
-# * Only valid when version == 1/2:
+# * Only valid when version == 1/2/3:
 # @param - samples_labeled_sel_queries: [list of [list of sel queries times]], each inside list being
 #          [{id, time_sel_1, time_sel_2, ..., time_sel_(2**d-1)}]
 #          * the outside list is ordered by the sample sizes ascending (e.g., 5k, 50k, 500k)
@@ -163,6 +170,14 @@ def extract_tensors(experiences):
 # @param - query_estimator: object, Query_Estimator class instance
 # @param - sample_pointer: int, [0~2], pointer to the sample size to use for the query_estimator. Default: 0
 # @param - num_of_joins: int, number of join methods in hints set.
+# @param - quantile: float, (0, 1), quantile of the estimated time distribution used to choose plans,
+#                    higher quantiles are more conservative against the time budget. Default: 0.5
+# @param - sample_sizes: [list of int], number of rows of each sample, only valid when version == 3,
+#          * ordered by the sample sizes ascending (e.g., 5k, 50k, 500k)
+# @param - confidence: float, (0, 1), confidence level of the sels' intervals, only valid when version == 3.
+#                      Default: 0.95
+# @param - seed: int, seed of the random generators (queries order, exploration, replay sampling, torch).
+#                Default: None (not seeded)
 #
 # @return - (DQN object of trained policy network, win_rate[=len(win_queries)/len(labeled_queries)])
 def train_dqn(dimension,
@@ -187,7 +202,16 @@ def train_dqn(dimension,
               trace=False,
               trace_file=None,
               early_stop=True,
-              num_of_joins=1):
+              num_of_joins=1,
+              seed=None,
+              quantile=0.5,
+              sample_sizes=[],
+              confidence=0.95):
+
+    # seed random generators
+    rng = random.Random(seed)
+    if seed is not None:
+        torch.manual_seed(seed)
 
     # init objects
     strategy = EpsilonGreedyStrategy(eps_start, eps_end, eps_decay)
@@ -197,7 +221,7 @@ def train_dqn(dimension,
         env = Environment(dimension, labeled_queries, unit_cost, time_budget, num_of_joins)
         policy_net = DQN(dimension, num_of_joins)
         target_net = DQN(dimension, num_of_joins)
-        agent = Agent(dimension, num_of_joins)
+        agent = Agent(dimension, num_of_joins, rng=rng)
     # version 1
     elif version == '1':
         env = Environment1(dimension,
@@ -208,10 +232,11 @@ def train_dqn(dimension,
                            query_estimator,
                            time_budget,
                            sample_pointer=sample_pointer,
-                           num_of_joins=num_of_joins)
+                           num_of_joins=num_of_joins,
+                           quantile=quantile)
         policy_net = DQN(dimension, num_of_joins)
         target_net = DQN(dimension, num_of_joins)
-        agent = Agent(dimension, num_of_joins)
+        agent = Agent(dimension, num_of_joins, rng=rng)
     # version 2
     elif version == '2':
         env = Environment2(dimension,
@@ -222,19 +247,36 @@ def train_dqn(dimension,
                            query_estimator,
                            time_budget,
                            sample_pointer=sample_pointer,
-                           num_of_joins=num_of_joins)
+                           num_of_joins=num_of_joins,
+                           quantile=quantile)
         policy_net = DQN(dimension, num_of_joins)
         target_net = DQN(dimension, num_of_joins)
-        agent = Agent(dimension, num_of_joins)
+        agent = Agent(dimension, num_of_joins, rng=rng)
+    # version 3
+    elif version == '3':
+        env = Environment3(dimension,
+                           labeled_queries,
+                           samples_labeled_sel_queries,
+                           samples_query_sels,
+                           samples_sel_queries_costs,
+                           query_estimator,
+                           time_budget,
+                           sample_sizes,
+                           num_of_joins=num_of_joins,
+                           quantile=quantile,
+                           confidence=confidence)
+        policy_net = DQN(dimension, num_of_joins)
+        target_net = DQN(dimension, num_of_joins)
+        agent = Agent(dimension, num_of_joins, rng=rng)
     # default
     else:
         env = Environment(dimension, labeled_queries, unit_cost, time_budget, num_of_joins)
         policy_net = DQN(dimension, num_of_joins)
         target_net = DQN(dimension, num_of_joins)
-        agent = Agent(dimension, num_of_joins)
+        agent = Agent(dimension, num_of_joins, rng=rng)
         print("Invalid version " + str(version) + "!")
         exit(0)
-    memory = ReplayMemory(memory_size)
+    memory = ReplayMemory(memory_size, rng=rng)
     target_net.load_state_dict(policy_net.state_dict())
     target_net.eval()
     optimizer = optim.Adam(params=policy_net.parameters(), lr=learning_rate)
@@ -257,7 +299,7 @@ def train_dqn(dimension,
         win_rate = 0.0
 
         # shuffle queries order
-        random.shuffle(labeled_queries)
+        rng.shuffle(labeled_queries)
 
         for index, query in enumerate(labeled_queries):
             qid = query["id"]
@@ -384,6 +426,9 @@ if __name__ == "__main__":
                         help="no_early_stop: disable early_stop when model converges. Default: enabled",
                         dest='early_stop', action='store_false')
     parser.set_defaults(early_stop=True)
+    parser.add_argument("-sd", "--seed",
+                        help="seed: seed of random generators to make training repeatable. Default: None",
+                        type=int, required=False, default=None)
     parser.add_argument("-llsf", "--list_labeled_sel_file",
                         help="list_labeled_sel_file: list of labeled_sel_queries files for different sample sizes",
                         action='append', required=False, default=[])
@@ -399,6 +444,15 @@ if __name__ == "__main__":
     parser.add_argument("-sp", "--sample_pointer",
                         help="sample_pointer: pointer to the sample size to use for the query_estimator. Default: 2",
                         type=int, required=False, default=2)
+    parser.add_argument("-qt", "--quantile",
+                        help="quantile: quantile of estimated times used to choose plans. Default: 0.5",
+                        type=float, required=False, default=0.5)
+    parser.add_argument("-lss", "--list_sample_size",
+                        help="list_sample_size: list of numbers of rows of the samples, in the same order as -lsqf",
+                        type=int, action='append', required=False, default=[])
+    parser.add_argument("-cl", "--confidence",
+                        help="confidence: confidence level of the sels' intervals to escalate samples. Default: 0.95",
+                        type=float, required=False, default=0.95)
     args = parser.parse_args()
 
     dimension = args.dimension
@@ -416,12 +470,16 @@ if __name__ == "__main__":
     trace_file = args.trace_file
     early_stop = args.early_stop
     sample_pointer = args.sample_pointer
+    quantile = args.quantile
+    sample_sizes = args.list_sample_size
+    confidence = args.confidence
+    seed = args.seed
 
     # load labeled queries into memory
     labeled_queries = Util.load_labeled_queries_file(dimension, labeled_queries_file, num_of_joins)
 
-    # For version = 1/2
-    if version == '1' or version == '2':
+    # For version = 1/2/3
+    if version == '1' or version == '2' or version == '3':
         list_labeled_sel_file = args.list_labeled_sel_file
         list_sel_query_file = args.list_sel_query_file
         sel_costs_file = args.sel_costs_file
@@ -443,6 +501,9 @@ if __name__ == "__main__":
         if len(list_labeled_sel_file) != len(list_sel_query_file):
             print("lengths of list_labeled_sel_file & list_sel_query_file must be the same when --version is 2!")
             exit(0)
+        if version == '3' and len(sample_sizes) != len(list_sel_query_file):
+            print("-lss / --list_sample_size is required for each of list_sel_query_file when --version is 3!")
+            exit(0)
 
         samples_labeled_sel_queries = Util.load_labeled_sel_queries_files(dimension, list_labeled_sel_file)
         samples_query_sels = Util.load_queries_sels_files(dimension, list_sel_query_file)
@@ -476,7 +537,11 @@ if __name__ == "__main__":
                                         trace=trace,
                                         trace_file=trace_file,
                                         early_stop=early_stop,
-                                        num_of_joins=num_of_joins)
+                                        num_of_joins=num_of_joins,
+                                        seed=seed,
+                                        quantile=quantile,
+                                        sample_sizes=sample_sizes,
+                                        confidence=confidence)
 
     # save DQN model
     torch.save(trained_dqn.state_dict(), dqn_model_file)
@@ -2,6 +2,7 @@ import argparse
 import copy
 import random
 import time
+from smart_sampling_estimator import Sampling_Estimator
 from smart_util import Util
 from collections import namedtuple
 from smart_agent import EpsilonGreedyStrategy
@@ -22,6 +23,11 @@ import torch.nn.functional as F
 #  -lf  / --labeled_file            input file that holds labeled queries for training
 #  -lsf / --labeled_sample_file     input file that holds labeled sample queries for training
 #  -sqf / --sample_quality_file     input file that holds sample queries qualities for training
+#  -sep / --sampling_estimator_path input path that holds the models of Sampling Estimator, if given,
+#                                     the sampling plans' times and qualities are estimated from the sel_file,
+#                                     instead of loaded from labeled_sample_file and sample_quality_file. Default: None
+#  -sf  / --sel_file                input file that holds queries' selectivities, used with sampling_estimator_path.
+#                                     Default: None
 #  -uc  / --unit_cost               time (second) to collect selectivity value for one condition
 #  -tb  / --time_budget             time (second) for a query to be viable
 #  -bt  / --beta                    beta value for reward function. Default: 0.0
@@ -34,6 +40,7 @@ import torch.nn.functional as F
 #  -tr  / --trace                   trace the evaluation result using training set, and output for each run. Default: False
 #  -trf / --trace_file              output file (no suffix) that holds the trace result. Default: None
 #  -nes / --no_early_stop           disable early_stop when model converges. Default: enabled
+#  -sd  / --seed                    seed of random generators to make training repeatable. Default: None
 #
 # Dependencies:
 #   pip install torch
@@ -86,8 +93,9 @@ class ModelMemory:
 
 
 class ReplayMemory:
-    def __init__(self, capacity):
+    def __init__(self, capacity, rng=None):
         self.capacity = capacity
+        self.rng = rng if rng is not None else random.Random()
         self.memory = []
         self.push_count = 0
 
@@ -99,7 +107,7 @@ class ReplayMemory:
         self.push_count += 1
 
     def sample(self, batch_size):
-        return random.sample(self.memory, batch_size)
+        return self.rng.sample(self.memory, batch_size)
 
     def can_provide_sample(self, batch_size):
         return len(self.memory) >= batch_size
@@ -152,6 +160,7 @@ def extract_tensors(experiences):
 # @param - beta:                     float, parameter to compute reward for a viable query.
 # @param - number_of_runs:           int, how many times to loop all queries for training
 # @param - num_of_joins:             int, number of join methods in hints set.
+# @param - seed:                     int, seed of the random generators. Default: None (not seeded)
 #
 # @return - (DQN object of trained policy network, total_reward)
 def train_dqn(dimension,
@@ -175,7 +184,13 @@ def train_dqn(dimension,
               trace=False,
               trace_file=None,
               early_stop=True,
-              num_of_joins=1):
+              num_of_joins=1,
+              seed=None):
+
+    # seed random generators
+    rng = random.Random(seed)
+    if seed is not None:
+        torch.manual_seed(seed)
 
     # init objects
     strategy = EpsilonGreedyStrategy(eps_start, eps_end, eps_decay)
@@ -193,7 +208,7 @@ def train_dqn(dimension,
                               num_of_joins)
         policy_net = DQN(dimension, num_of_joins, num_of_sample_ratios)
         target_net = DQN(dimension, num_of_joins, num_of_sample_ratios)
-        agent = Agent(dimension, num_of_joins, num_of_sample_ratios)
+        agent = Agent(dimension, num_of_joins, num_of_sample_ratios, rng=rng)
     # default
     else:
         env = EnvironmentPlus(dimension, 
@@ -207,10 +222,10 @@ def train_dqn(dimension,
                               num_of_joins)
         policy_net = DQN(dimension, num_of_joins, num_of_sample_ratios)
         target_net = DQN(dimension, num_of_joins, num_of_sample_ratios)
-        agent = Agent(dimension, num_of_joins, num_of_sample_ratios)
+        agent = Agent(dimension, num_of_joins, num_of_sample_ratios, rng=rng)
         print("Invalid version " + str(version) + "!")
         exit(0)
-    memory = ReplayMemory(memory_size)
+    memory = ReplayMemory(memory_size, rng=rng)
     target_net.load_state_dict(policy_net.state_dict())
     target_net.eval()
     optimizer = optim.Adam(params=policy_net.parameters(), lr=learning_rate)
@@ -233,7 +248,7 @@ def train_dqn(dimension,
         total_reward = 0.0
 
         # shuffle queries order
-        random.shuffle(labeled_queries)
+        rng.shuffle(labeled_queries)
 
         for index, query in enumerate(labeled_queries):
             qid = query["id"]
@@ -324,10 +339,17 @@ if __name__ == "__main__":
                         type=str, required=True)
     parser.add_argument("-lsf", "--labeled_sample_file",
                         help="labeled_sample_file: input file that holds labeled sample queries for training",
-                        type=str, required=True)
+                        type=str, required=False, default=None)
     parser.add_argument("-sqf", "--sample_quality_file",
                         help="sample_quality_file: input file that holds sample queries qualities for training",
-                        type=str, required=True)
+                        type=str, required=False, default=None)
+    parser.add_argument("-sep", "--sampling_estimator_path",
+                        help="sampling_estimator_path: input path that holds the models of Sampling Estimator. "
+                             "Default: None",
+                        type=str, required=False, default=None)
+    parser.add_argument("-sf", "--sel_file",
+                        help="sel_file: input file that holds queries' selectivities. Default: None",
+                        type=str, required=False, default=None)
     parser.add_argument("-uc", "--unit_cost",
                         help="unit_cost: time (second) to collect selectivity value for one condition. Default: 0.05",
                         type=float, required=False, default=0.05)
@@ -368,6 +390,9 @@ if __name__ == "__main__":
                         help="no_early_stop: disable early_stop when model converges. Default: enabled",
                         dest='early_stop', action='store_false')
     parser.set_defaults(early_stop=True)
+    parser.add_argument("-sd", "--seed",
+                        help="seed: seed of random generators to make training repeatable. Default: None",
+                        type=int, required=False, default=None)
     args = parser.parse_args()
 
     dimension = args.dimension
@@ -388,15 +413,38 @@ if __name__ == "__main__":
     trace = args.trace
     trace_file = args.trace_file
     early_stop = args.early_stop
+    seed = args.seed
+    sampling_estimator_path = args.sampling_estimator_path
+    queries_sels_file = args.sel_file
 
     # load labeled queries into memory
     labeled_queries = Util.load_labeled_queries_file(dimension, labeled_queries_file, num_of_joins)
 
-    # load labeled sample queries into memory
-    labeled_sample_queries = Util.load_labeled_sample_queries_file(dimension, num_of_sample_ratios, labeled_sampe_queries_file)
+    # estimate sampling plans' times and qualities of queries by the Sampling Estimator
+    if sampling_estimator_path is not None:
+        if queries_sels_file is None:
+            print("sel_file is required to use Sampling Estimator!")
+            exit(0)
+        sampling_estimator = Sampling_Estimator.load(sampling_estimator_path)
+        if sampling_estimator.dimension != dimension:
+            print("Sampling Estimator is trained for dimension " + str(sampling_estimator.dimension) +
+                  ", not " + str(dimension) + "!")
+            exit(0)
+        if sampling_estimator.num_of_sample_ratios != num_of_sample_ratios:
+            print("Sampling Estimator is trained for " + str(sampling_estimator.num_of_sample_ratios) +
+                  " sample ratios, not " + str(num_of_sample_ratios) + "!")
+            exit(0)
+        queries_sels = Util.load_queries_sels_file(dimension, queries_sels_file)
+        (labeled_sample_queries, sample_queries_qualities) = sampling_estimator.estimate_sample_queries(queries_sels)
+    else:
+        if labeled_sampe_queries_file is None or sample_queries_qualities_file is None:
+            print("labeled_sample_file and sample_quality_file are required without Sampling Estimator!")
+            exit(0)
+        # load labeled sample queries into memory
+        labeled_sample_queries = Util.load_labeled_sample_queries_file(dimension, num_of_sample_ratios, labeled_sampe_queries_file)
 
-    # load sample queries qualities into memory
-    sample_queries_qualities = Util.load_sample_queries_qualities_file(dimension, num_of_sample_ratios, sample_queries_qualities_file)
+        # load sample queries qualities into memory
+        sample_queries_qualities = Util.load_sample_queries_qualities_file(dimension, num_of_sample_ratios, sample_queries_qualities_file)
 
     # train DQN model
     (trained_dqn, total_reward) = train_dqn(dimension,
@@ -414,7 +462,8 @@ if __name__ == "__main__":
                                             trace=trace,
                                             trace_file=trace_file,
                                             early_stop=early_stop,
-                                            num_of_joins=num_of_joins)
+                                            num_of_joins=num_of_joins,
+                                            seed=seed)
 
     # save DQN model
     torch.save(trained_dqn.state_dict(), dqn_model_file)
@@ -0,0 +1,102 @@
+import argparse
+import json
+import numpy as np
+from smart_explain_estimator import Explain_Estimator
+from smart_util import Util
+
+
+###########################################################
+#  smart_train_explain_estimator.py
+#
+#  -d    / --dimension          dimension: dimension of the queries. Default: 3
+#  -nj   / --num_join           number of join methods. Default: 1
+#  -ef   / --explains_file      input file that holds queries' explained plans generated by
+#                               smart_collect_queries_explains.py
+#  -lf   / --labeled_file       input file that holds queries' real running times generated by smart_label_queries.py
+#  -op   / --out_path           output path to save the models used by Explain Estimator
+#  -lslf / --labeled_sel_file   input file that holds sel queries' running times generated by
+#                               smart_label_sel_queries.py, to compare the explain time against the probing time.
+#                               Default: None
+#
+###########################################################
+
+
+if __name__ == "__main__":
+
+    # parse arguments
+    parser = argparse.ArgumentParser(description="Train Explain Estimator.")
+    parser.add_argument("-d", "--dimension",
+                        help="dimension: dimension of the queries. Default: 3",
+                        type=int, required=False, default=3)
+    parser.add_argument("-nj", "--num_join", help="num_join: number of join methods. Default: 1",
+                        required=False, type=int, default=1)
+    parser.add_argument("-ef", "--explains_file",
+                        help="explains_file: input file that holds queries' explained plans",
+                        type=str, required=True)
+    parser.add_argument("-lf", "--labeled_file",
+                        help="labeled_file: input file that holds queries's real running times",
+                        type=str, required=True)
+    parser.add_argument("-op", "--out_path",
+                        help="out_path: output path to save the models used by Explain Estimator",
+                        type=str, required=True)
+    parser.add_argument("-lslf", "--labeled_sel_file",
+                        help="labeled_sel_file: input file that holds sel queries' running times. Default: None",
+                        type=str, required=False, default=None)
+    args = parser.parse_args()
+
+    dimension = args.dimension
+    num_of_joins = args.num_join
+    explains_file = args.explains_file
+    labeled_queries_file = args.labeled_file
+    out_path = args.out_path
+    labeled_sel_queries_file = args.labeled_sel_file
+
+    num_of_plans = Util.num_of_plans(dimension, num_of_joins)
+
+    # 1. read queries' explained plans into memory
+    # Build explains_map <(id, plan), features> and explain_times <id, total explain time of all plans>
+    explains_map = {}
+    explain_times = {}
+    with open(explains_file, "r") as f_in:
+        for line in f_in:
+            record = json.loads(line)
+            explains_map[(record["id"], record["plan"])] = Explain_Estimator.explain_features(record["plan_json"])
+            explain_times[record["id"]] = explain_times.get(record["id"], 0.0) + record["explain_time"]
+
+    # 2. read queries' real running times into memory
+    labeled_queries = Util.load_labeled_queries_file(dimension, labeled_queries_file, num_of_joins)
+
+    # 3. new an Explain Estimator
+    explain_estimator = Explain_Estimator(dimension, num_of_joins)
+
+    # 4. train the Explain Estimator for all plans
+    print("start training explain estimator ...")
+    for plan in range(1, num_of_plans + 1):
+        xtr = []
+        ytr = []
+        for labeled_query in labeled_queries:
+            if (labeled_query["id"], plan) not in explains_map:
+                continue
+            xtr.append(explains_map[(labeled_query["id"], plan)])
+            ytr.append([labeled_query["time_" + str(plan)]])
+        if len(xtr) == 0:
+            print("No explained plans of plan [" + str(plan) + "] in [" + explains_file + "]!")
+            exit(0)
+        xtr = np.array(xtr)
+        ytr = np.array(ytr)
+        explain_estimator.fit(plan, xtr, ytr)
+        mae = np.mean(np.abs(explain_estimator.predict(plan, xtr) - ytr))
+        print("    plan [" + str(plan) + "] trained, mean absolute error = " + str(mae))
+
+    # 5. save Explain Estimator models to files
+    explain_estimator.save(out_path)
+    print("explain estimator models saved.")
+
+    # 6. compare the time of explaining all plans against the time of probing all sels
+    print("average time of explaining all plans of a query: " + str(np.mean(list(explain_times.values()))))
+    if labeled_sel_queries_file is not None:
+        labeled_sel_queries = Util.load_labeled_sel_queries_file(dimension, labeled_sel_queries_file)
+        probe_times = []
+        for labeled_sel_query in labeled_sel_queries:
+            probe_times.append(sum(labeled_sel_query["time_sel_" + str(sel)] for sel in range(1, 2 ** dimension)))
+        print("average time of probing all sels of a query: " + str(np.mean(probe_times)))
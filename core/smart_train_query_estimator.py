@@ -1,5 +1,6 @@
 import argparse
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from smart_query_estimator import Query_Estimator
 from smart_util import Util
 
@@ -12,6 +13,13 @@ from smart_util import Util
 #  -lf / --labeled_file    input file that holds queries' real running times generated by smart_label_queries.py
 #  -op / --out_path        output path to save the models used by Query Estimator
 #  -nj / --num_join        number of join methods. Default: 1
+#  -ob / --out_bundle      output file to save all models of Query Estimator as one bundle. Default: None
+#  -st / --sample_table    sample table the selectivities are collected on, recorded in the bundle. Default: None
+#  -lsf / --labeled_std_file  input file that holds std of queries' repeated running times generated by
+#                             smart_label_queries.py (labeled_std_*), used to fit the noise models. Default: None
+#  -nw / --num_workers     number of threads to fit plans' models in parallel. Default: 4
+#  -cm / --censoring_mode  how to train on timed-out labels: drop - remove them, tobit - right-censored Tobit model.
+#                          Default: drop
 #
 ###########################################################
 
@@ -34,6 +42,22 @@ if __name__ == "__main__":
                         type=str, required=True)
     parser.add_argument("-nj", "--num_join", help="num_join: number of join methods. Default: 1", 
                         required=False, type=int, default=1)
+    parser.add_argument("-ob", "--out_bundle",
+                        help="out_bundle: output file to save all models of Query Estimator as one bundle. Default: None",
+                        type=str, required=False, default=None)
+    parser.add_argument("-st", "--sample_table",
+                        help="sample_table: sample table the selectivities are collected on. Default: None",
+                        type=str, required=False, default=None)
+    parser.add_argument("-lsf", "--labeled_std_file",
+                        help="labeled_std_file: input file that holds std of queries' repeated running times. "
+                             "Default: None",
+                        type=str, required=False, default=None)
+    parser.add_argument("-nw", "--num_workers",
+                        help="num_workers: number of threads to fit plans' models in parallel. Default: 4",
+                        type=int, required=False, default=4)
+    parser.add_argument("-cm", "--censoring_mode",
+                        help="censoring_mode: how to train on timed-out labels, drop / tobit. Default: drop",
+                        type=str, required=False, default="drop", choices=Query_Estimator.censoring_modes)
     args = parser.parse_args()
 
     dimension = args.dimension
@@ -41,44 +65,58 @@ if __name__ == "__main__":
     labeled_queries_file = args.labeled_file
     out_path = args.out_path
     num_of_joins = args.num_join
+    out_bundle = args.out_bundle
+    sample_table = args.sample_table
+    labeled_std_file = args.labeled_std_file
+    censoring_mode = args.censoring_mode
+    num_of_workers = args.num_workers
 
     num_of_plans = Util.num_of_plans(dimension, num_of_joins)
 
-    # 1. read queries' selectivities into memory
-    queries_sels = Util.load_queries_sels_file(dimension, queries_sels_file)
-    # Build queries_sels_map <id, query_sels>
-    queries_sels_map = {}
-    for query_sels in queries_sels:
-        queries_sels_map[query_sels["id"]] = query_sels
+    # 1. read queries' selectivities into memory as a matrix [queries x sels]
+    sels_ids, sels = Util.load_matrix_file(queries_sels_file, 2 ** dimension - 1)
 
-    # 2. read queries' real running times into memory
-    labeled_queries = Util.load_labeled_queries_file(dimension, labeled_queries_file, num_of_joins)
+    # 2. read queries' real running times into memory as a matrix [queries x (num_of_plans + 1)],
+    #    and align the selectivities rows to the labeled queries by query id
+    labeled_ids, times = Util.load_matrix_file(labeled_queries_file, num_of_plans + 1)
+    sels = sels[Util.align_rows(labeled_ids, sels_ids)]
 
     # 3. new a Query Estimator
-    query_estimator = Query_Estimator(dimension, num_of_joins)
+    query_estimator = Query_Estimator(dimension, num_of_joins, censoring=censoring_mode)
 
-    # 4. train the Query Estimator for all plans
+    # 4. train the Query Estimator for all plans in parallel,
+    #    the features of each plan are the columns of its sel ids
     print("start training query estimator ...")
-    # plan = 1 ~ num_of_plans
-    for plan in range(1, num_of_plans + 1):
-        xtr = []
-        ytr = []
-        sel_ids = Util.sel_ids_of_plan(plan, dimension, num_of_joins)
-        for labeled_query in labeled_queries:
-            id = labeled_query["id"]
-            x = []
-            query_sels = queries_sels_map[id]
-            for sel_id in sel_ids:
-                x.append(query_sels["sel_" + str(sel_id)])
-            xtr.append(x)
-            y = [labeled_query["time_" + str(plan)]]
-            ytr.append(y)
-        xtr = np.array(xtr)
-        ytr = np.array(ytr)
+
+    def fit_plan(plan):
+        xtr = sels[:, query_estimator.plan_sel_indexes[plan]]
+        ytr = times[:, plan:plan + 1]
         query_estimator.fit(plan, xtr, ytr)
-        print("    plan [" + str(plan) + "] trained.")
+        return plan
+
+    # the fit runs on the worker threads, only the main thread prints
+    with ThreadPoolExecutor(max_workers=num_of_workers) as executor:
+        # plan = 1 ~ num_of_plans
+        for plan in executor.map(fit_plan, range(1, num_of_plans + 1)):
+            print("    plan [" + str(plan) + "] trained on x " +
+                  str((len(sels), len(query_estimator.plan_sel_indexes[plan]))) + ", y " + str((len(times), 1)) + ".")
+
+    # 4.1 train the noise models for all plans
+    if labeled_std_file is not None:
+        # labeled std file has the same layout as the labeled file, with std values in place of times
+        std_ids, stds = Util.load_matrix_file(labeled_std_file, num_of_plans + 1)
+        std_rows = np.isin(labeled_ids, std_ids)
+        stds = stds[Util.align_rows(labeled_ids[std_rows], std_ids)]
+        for plan in range(1, num_of_plans + 1):
+            query_estimator.fit_noise(plan, times[std_rows, plan], stds[:, plan])
+        print("    noise models trained.")
 
     # 5. save Query Estimator models to files
     query_estimator.save(out_path)
     print("query estimator models saved.")
 
+    # 6. save Query Estimator models to one bundle file
+    if out_bundle is not None:
+        query_estimator.save_bundle(out_bundle, sample_table)
+        print("query estimator bundle saved to file [" + out_bundle + "].")
+
@@ -0,0 +1,112 @@
+import argparse
+import config
+import numpy as np
+from smart_sampling_estimator import Sampling_Estimator
+from smart_util import Util
+
+
+###########################################################
+#  smart_train_sampling_estimator.py
+#
+#  -ds  / --dataset               dataset the queries run on. Default: twitter
+#  -d   / --dimension             dimension: dimension of the queries. Default: 3
+#  -sf  / --sel_file              input file that holds queries' selectivities generated by smart_collect_queries_sels.py
+#  -sts / --sels_table_size       size of the sample table on which the sel_file was collected
+#  -lsf / --labeled_sample_file   input file that holds labeled sample queries generated by
+#                                 smart_label_sample_queries.py
+#  -sqf / --sample_quality_file   input file that holds sample queries qualities generated by
+#                                 smart_collect_sample_queries_qualities.py
+#  -op  / --out_path              output path to save the models used by Sampling Estimator
+#
+###########################################################
+
+
+if __name__ == "__main__":
+
+    # parse arguments
+    parser = argparse.ArgumentParser(description="Train Sampling Estimator.")
+    parser.add_argument("-ds", "--dataset", help="dataset: dataset the queries run on. Default: twitter",
+                        type=str, required=False, default="twitter")
+    parser.add_argument("-d", "--dimension",
+                        help="dimension: dimension of the queries. Default: 3",
+                        type=int, required=False, default=3)
+    parser.add_argument("-sf", "--sel_file",
+                        help="sel_file: input file that holds queries' selectivities",
+                        type=str, required=True)
+    parser.add_argument("-sts", "--sels_table_size",
+                        help="sels_table_size: size of the sample table on which the sel_file was collected",
+                        type=int, required=True)
+    parser.add_argument("-lsf", "--labeled_sample_file",
+                        help="labeled_sample_file: input file that holds labeled sample queries",
+                        type=str, required=True)
+    parser.add_argument("-sqf", "--sample_quality_file",
+                        help="sample_quality_file: input file that holds sample queries qualities",
+                        type=str, required=True)
+    parser.add_argument("-op", "--out_path",
+                        help="out_path: output path to save the models used by Sampling Estimator",
+                        type=str, required=True)
+    args = parser.parse_args()
+
+    dataset = config.datasets[args.dataset]
+    dimension = args.dimension
+    queries_sels_file = args.sel_file
+    sels_table_size = args.sels_table_size
+    labeled_sample_queries_file = args.labeled_sample_file
+    sample_queries_qualities_file = args.sample_quality_file
+    out_path = args.out_path
+
+    num_of_sample_ratios = len(dataset.sample_ratios)
+
+    # 1. read queries' selectivities into memory
+    queries_sels = Util.load_queries_sels_file(dimension, queries_sels_file)
+    # Build queries_sels_map <id, query_sels>
+    queries_sels_map = {}
+    for query_sels in queries_sels:
+        queries_sels_map[query_sels["id"]] = query_sels
+
+    # 2. read queries' sampling plans times and qualities into memory
+    labeled_sample_queries = Util.load_labeled_sample_queries_file(dimension, num_of_sample_ratios,
+                                                                   labeled_sample_queries_file)
+    sample_queries_qualities = Util.load_sample_queries_qualities_file(dimension, num_of_sample_ratios,
+                                                                       sample_queries_qualities_file)
+    # Build sample_queries_qualities_map <id, sample_query_quality>
+    sample_queries_qualities_map = {}
+    for sample_query_quality in sample_queries_qualities:
+        sample_queries_qualities_map[sample_query_quality["id"]] = sample_query_quality
+
+    # 3. new a Sampling Estimator
+    sampling_estimator = Sampling_Estimator(dimension, dataset.sample_ratios, dataset.table_size, sels_table_size)
+
+    # 4. train the Sampling Estimator for all hints, each on the sampling plans of all sample ratios of the hint
+    print("start training sampling estimator ...")
+    for hint_id in range(0, dimension):
+        xtr = []
+        times = []
+        qualities = []
+        for sample_ratio_id in range(0, num_of_sample_ratios):
+            plan = hint_id * num_of_sample_ratios + sample_ratio_id
+            for labeled_sample_query in labeled_sample_queries:
+                id = labeled_sample_query["id"]
+                if id not in queries_sels_map or id not in sample_queries_qualities_map:
+                    continue
+                xtr.append(sampling_estimator.features(plan, queries_sels_map[id]))
+                times.append(labeled_sample_query["time_" + str(plan)])
+                qualities.append(sample_queries_qualities_map[id]["quality_" + str(plan)])
+        if len(xtr) == 0:
+            print("No labeled sample queries found in both [" + queries_sels_file + "] and [" +
+                  sample_queries_qualities_file + "]!")
+            exit(0)
+        xtr = np.array(xtr)
+        times = np.array(times)
+        qualities = np.array(qualities)
+        sampling_estimator.fit(hint_id, xtr, times, qualities)
+        # training errors of the hint over all its sample ratios, the models are shared by the plans of the hint
+        estimate_times, estimate_qualities = sampling_estimator.predict(hint_id * num_of_sample_ratios, xtr)
+        time_errors = np.abs(estimate_times - times)
+        quality_errors = np.abs(estimate_qualities - qualities)
+        print("    hint [" + str(hint_id) + "] trained, mean absolute error of time = " + str(np.mean(time_errors)) +
+              ", of quality = " + str(np.mean(quality_errors)))
+
+    # 5. save Sampling Estimator models to files
+    sampling_estimator.save(out_path)
+    print("sampling estimator models saved.")
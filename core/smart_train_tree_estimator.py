@@ -0,0 +1,133 @@
+import argparse
+import json
+import random
+import numpy as np
+from smart_tree_estimator import Tree_Estimator
+from smart_util import Util
+
+
+###########################################################
+#  smart_train_tree_estimator.py
+#
+#  -d  / --dimension         dimension: dimension of the queries. Default: 3
+#  -nj / --num_join          number of join methods. Default: 1
+#  -ef / --explains_file     input file that holds queries' explained plans generated by
+#                            smart_collect_queries_explains.py
+#  -lf / --labeled_file      input file that holds queries' real running times generated by smart_label_queries.py
+#  -mf / --model_file        output file that holds trained tree estimator model
+#  -ep / --epochs            number of passes over the training plans. Default: 100
+#  -bs / --batch_size        number of plans per forward pass. Default: 64
+#  -lr / --learning_rate     learning rate. Default: 0.001
+#  -vr / --validation_ratio  ratio of queries held out for validation. Default: 0.2
+#  -sd / --seed              seed of random generators to make training repeatable. Default: None
+#
+# Dependencies:
+#   pip install torch
+#
+###########################################################
+
+
+if __name__ == "__main__":
+
+    # parse arguments
+    parser = argparse.ArgumentParser(description="Train Tree Estimator.")
+    parser.add_argument("-d", "--dimension",
+                        help="dimension: dimension of the queries. Default: 3",
+                        type=int, required=False, default=3)
+    parser.add_argument("-nj", "--num_join", help="num_join: number of join methods. Default: 1",
+                        required=False, type=int, default=1)
+    parser.add_argument("-ef", "--explains_file",
+                        help="explains_file: input file that holds queries' explained plans",
+                        type=str, required=True)
+    parser.add_argument("-lf", "--labeled_file",
+                        help="labeled_file: input file that holds queries's real running times",
+                        type=str, required=True)
+    parser.add_argument("-mf", "--model_file",
+                        help="model_file: output file that holds trained tree estimator model",
+                        type=str, required=True)
+    parser.add_argument("-ep", "--epochs",
+                        help="epochs: number of passes over the training plans. Default: 100",
+                        type=int, required=False, default=100)
+    parser.add_argument("-bs", "--batch_size",
+                        help="batch_size: number of plans per forward pass. Default: 64",
+                        type=int, required=False, default=64)
+    parser.add_argument("-lr", "--learning_rate",
+                        help="learning_rate: learning rate. Default: 0.001",
+                        type=float, required=False, default=0.001)
+    parser.add_argument("-vr", "--validation_ratio",
+                        help="validation_ratio: ratio of queries held out for validation. Default: 0.2",
+                        type=float, required=False, default=0.2)
+    parser.add_argument("-sd", "--seed",
+                        help="seed: seed of random generators to make training repeatable. Default: None",
+                        type=int, required=False, default=None)
+    args = parser.parse_args()
+
+    dimension = args.dimension
+    num_of_joins = args.num_join
+    explains_file = args.explains_file
+    labeled_queries_file = args.labeled_file
+    model_file = args.model_file
+    validation_ratio = args.validation_ratio
+    seed = args.seed
+
+    num_of_plans = Util.num_of_plans(dimension, num_of_joins)
+
+    # 1. read queries' explained plans into memory
+    # Build explains_map <(id, plan), plan_json>
+    explains_map = {}
+    with open(explains_file, "r") as f_in:
+        for line in f_in:
+            record = json.loads(line)
+            explains_map[(record["id"], record["plan"])] = record["plan_json"]
+
+    # 2. read queries' real running times into memory
+    labeled_queries = Util.load_labeled_queries_file(dimension, labeled_queries_file, num_of_joins)
+
+    # 3. split queries into training and validation sets
+    rng = random.Random(seed)
+    rng.shuffle(labeled_queries)
+    num_of_validation = int(len(labeled_queries) * validation_ratio)
+    validation_queries = labeled_queries[:num_of_validation]
+    training_queries = labeled_queries[num_of_validation:]
+
+    plan_jsons = []
+    times = []
+    for labeled_query in training_queries:
+        for plan in range(1, num_of_plans + 1):
+            if (labeled_query["id"], plan) in explains_map:
+                plan_jsons.append(explains_map[(labeled_query["id"], plan)])
+                times.append(labeled_query["time_" + str(plan)])
+
+    # 4. train the Tree Estimator
+    print("start training tree estimator on " + str(len(plan_jsons)) + " plans ...")
+    tree_estimator = Tree_Estimator()
+    losses = tree_estimator.fit(plan_jsons,
+                                times,
+                                epochs=args.epochs,
+                                batch_size=args.batch_size,
+                                learning_rate=args.learning_rate,
+                                seed=seed)
+    print("    final training loss = " + str(losses[-1]))
+
+    # 5. validate: estimation error and the real time of the plan with the minimum estimated time
+    if len(validation_queries) > 0:
+        abs_errors = []
+        chosen_times = []
+        best_times = []
+        for labeled_query in validation_queries:
+            plans = [plan for plan in range(1, num_of_plans + 1) if (labeled_query["id"], plan) in explains_map]
+            if len(plans) == 0:
+                continue
+            estimate_times = tree_estimator.predict([explains_map[(labeled_query["id"], plan)] for plan in plans])
+            real_times = np.array([labeled_query["time_" + str(plan)] for plan in plans])
+            abs_errors.extend(np.abs(estimate_times - real_times))
+            chosen_times.append(real_times[np.argmin(estimate_times)])
+            best_times.append(np.min(real_times))
+        print("validation on " + str(len(chosen_times)) + " queries:")
+        print("    mean absolute error = " + str(np.mean(abs_errors)))
+        print("    mean real time of chosen plans = " + str(np.mean(chosen_times)) +
+              ", of best plans = " + str(np.mean(best_times)))
+
+    # 6. save Tree Estimator model
+    tree_estimator.save(model_file)
+    print("tree estimator model saved to file [" + model_file + "].")
@@ -0,0 +1,224 @@
+import math
+import random
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from config import QueryTimeEstimatorConfig as conf
+from smart_explain_estimator import Explain_Estimator
+
+
+###########################################################
+#  TreeConv
+#
+# Description:
+#   Tree convolution over binary trees in the flattened form (as in Bao):
+#     nodes - tensor [num_of_nodes + 1, in_features], row 0 is the zero padding for missing children
+#     indexes - long tensor [num_of_nodes, 3], (self, left child, right child) row ids of each node in nodes
+#   output[i] = W * [nodes[self], nodes[left], nodes[right]] + b, for node i
+#
+###########################################################
+class TreeConv(nn.Module):
+    def __init__(self, in_features, out_features):
+        super().__init__()
+        self.linear = nn.Linear(in_features=in_features * 3, out_features=out_features)
+
+    def forward(self, nodes, indexes):
+        t = nodes[indexes].flatten(start_dim=1)
+        t = self.linear(t)
+        # prepend the zero padding row for the next layer
+        return torch.cat([torch.zeros(1, t.shape[1]), t], dim=0)
+
+
+class TreeNet(nn.Module):
+    def __init__(self, in_features):
+        super().__init__()
+        self.conv1 = TreeConv(in_features, 64)
+        self.conv2 = TreeConv(64, 32)
+        self.conv3 = TreeConv(32, 16)
+        self.fc1 = nn.Linear(in_features=16, out_features=16)
+        self.out = nn.Linear(in_features=16, out_features=1)
+
+    # @param nodes - tensor [num_of_nodes + 1, in_features]
+    # @param indexes - long tensor [num_of_nodes, 3]
+    # @param tree_ids - long tensor [num_of_nodes], the tree (in the batch) each node belongs to
+    # @param num_of_trees - int, number of trees in the batch
+    def forward(self, nodes, indexes, tree_ids, num_of_trees):
+        t = F.relu(self.conv1(nodes, indexes))
+        t = F.relu(self.conv2(t, indexes))
+        t = F.relu(self.conv3(t, indexes))
+        # dynamic max pooling of all nodes of each tree:
+        #   nodes are scattered into a [num_of_trees, max_tree_size, features] padded tensor, then max over each tree,
+        #   relu outputs are >= 0, so padding with zeros does not change the max
+        t = t[1:]
+        order = torch.argsort(tree_ids)
+        sorted_tree_ids = tree_ids[order]
+        tree_sizes = torch.bincount(sorted_tree_ids, minlength=num_of_trees)
+        tree_starts = torch.cumsum(tree_sizes, dim=0) - tree_sizes
+        positions = torch.arange(sorted_tree_ids.shape[0]) - tree_starts[sorted_tree_ids]
+        padded = torch.zeros(num_of_trees, max(int(tree_sizes.max()), 1), t.shape[1])
+        padded = padded.index_put((sorted_tree_ids, positions), t[order])
+        pooled = padded.max(dim=1)[0]
+        t = F.relu(self.fc1(pooled))
+        t = self.out(t)
+        return t
+
+
+###########################################################
+#  Tree_Estimator
+#
+# Description:
+#   Estimate query time of hinted plans from their EXPLAIN trees (transformed by Bao.transform_plan_json),
+#     one model shared by all plans and join methods.
+# Implementation:
+#   Each node is encoded as:
+#     one-hot of node type (Explain_Estimator.node_types + other),
+#     one-hot of index name (index names seen in training + other),
+#     log(1 + total cost), log(1 + rows).
+#   Trees are binarized: a node with more than 2 children keeps the 1st child as the left child,
+#     and a copy of itself holding the rest children as the right child.
+#   A batch of trees is flattened into one node matrix, so one forward pass predicts many plans.
+#   The model is trained on log(1 + time), timed-out labels are kept as the timeout cut.
+#
+###########################################################
+class Tree_Estimator:
+
+    def __init__(self):
+        self.num_of_node_types = len(Explain_Estimator.node_types) + 1
+        self.index_names = []
+        self.model = None
+
+    def num_of_features(self):
+        return self.num_of_node_types + len(self.index_names) + 1 + 2
+
+    def node_vector(self, node):
+        vector = [0.0] * self.num_of_features()
+        node_type = node["Node Type"]
+        if node_type in Explain_Estimator.node_types:
+            vector[Explain_Estimator.node_types.index(node_type)] = 1.0
+        else:
+            vector[self.num_of_node_types - 1] = 1.0
+        if "Index Name" in node:
+            if node["Index Name"] in self.index_names:
+                vector[self.num_of_node_types + self.index_names.index(node["Index Name"])] = 1.0
+            else:
+                vector[self.num_of_node_types + len(self.index_names)] = 1.0
+        vector[-2] = math.log1p(node["Total Cost"])
+        vector[-1] = math.log1p(node["Plan Rows"])
+        return vector
+
+    # flatten one tree into the node vectors list and the (self, left, right) indexes list
+    # @return - row id of the root node
+    def flatten(self, node, vectors, indexes, children=None):
+        if children is None:
+            children = node.get("Plans", [])
+        vectors.append(self.node_vector(node))
+        row = len(vectors)  # row 0 is the zero padding
+        position = len(indexes)
+        indexes.append(None)
+        left = 0
+        right = 0
+        if len(children) >= 1:
+            left = self.flatten(children[0], vectors, indexes)
+        if len(children) == 2:
+            right = self.flatten(children[1], vectors, indexes)
+        elif len(children) > 2:
+            right = self.flatten(node, vectors, indexes, children[1:])
+        indexes[position] = [row, left, right]
+        return row
+
+    # encode one tree into numpy arrays
+    # @return - (vectors [num_of_nodes, num_of_features], indexes [num_of_nodes, 3]),
+    #           indexes are row ids local to the tree, row 0 being the zero padding
+    def encode(self, plan_json):
+        vectors = []
+        indexes = []
+        self.flatten(plan_json["Plan"], vectors, indexes)
+        return np.array(vectors, dtype=np.float32), np.array(indexes, dtype=np.int64)
+
+    # collate encoded trees into the flattened tensors of one batch
+    # @param encoded_trees - [list of (vectors, indexes)] returned by encode()
+    # @return - (nodes, indexes, tree_ids) tensors of the batch
+    def collate(self, encoded_trees):
+        vectors = [np.zeros((1, self.num_of_features()), dtype=np.float32)]
+        indexes = []
+        tree_ids = []
+        offset = 0
+        for tree_id, (tree_vectors, tree_indexes) in enumerate(encoded_trees):
+            vectors.append(tree_vectors)
+            # shift the local row ids of the tree, keep 0 as the padding
+            indexes.append(np.where(tree_indexes > 0, tree_indexes + offset, 0))
+            tree_ids.append(np.full(len(tree_vectors), tree_id, dtype=np.int64))
+            offset += len(tree_vectors)
+        return (torch.from_numpy(np.concatenate(vectors)),
+                torch.from_numpy(np.concatenate(indexes)),
+                torch.from_numpy(np.concatenate(tree_ids)))
+
+    # @param plan_jsons - [list of transformed plan json]
+    # @param times - [list of real query times]
+    # @param epochs - int, number of passes over the training data
+    # @param batch_size - int, number of plans per forward pass
+    # @param learning_rate - float
+    # @param seed - int, seed of the random generators. Default: None (not seeded)
+    # @return - [list of mean training loss of each epoch]
+    def fit(self, plan_jsons, times, epochs=100, batch_size=64, learning_rate=0.001, seed=None):
+        rng = random.Random(seed)
+        if seed is not None:
+            torch.manual_seed(seed)
+        # vocabulary of index names
+        index_names = set()
+        for plan_json in plan_jsons:
+            stack = [plan_json["Plan"]]
+            while stack:
+                node = stack.pop()
+                if "Index Name" in node:
+                    index_names.add(node["Index Name"])
+                stack.extend(node.get("Plans", []))
+        self.index_names = sorted(index_names)
+        self.model = TreeNet(self.num_of_features())
+
+        encoded_trees = [self.encode(plan_json) for plan_json in plan_jsons]
+        targets = np.log1p(np.minimum(np.asarray(times, dtype=np.float64), conf.timeout))
+        optimizer = torch.optim.Adam(params=self.model.parameters(), lr=learning_rate)
+        order = list(range(len(plan_jsons)))
+        losses = []
+        self.model.train()
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            total_loss = 0.0
+            for start in range(0, len(order), batch_size):
+                ids = order[start:start + batch_size]
+                nodes, indexes, tree_ids = self.collate([encoded_trees[i] for i in ids])
+                y = torch.tensor(targets[ids], dtype=torch.float32).unsqueeze(1)
+                loss = F.mse_loss(self.model(nodes, indexes, tree_ids, len(ids)), y)
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                total_loss += loss.item() * len(ids)
+            losses.append(total_loss / len(order))
+        self.model.eval()
+        return losses
+
+    # @param plan_jsons - [list of transformed plan json]
+    # @param batch_size - int, number of plans per forward pass
+    # @return - numpy 1d array, predicted time of each plan
+    def predict(self, plan_jsons, batch_size=256):
+        y = []
+        with torch.no_grad():
+            for start in range(0, len(plan_jsons), batch_size):
+                batch = [self.encode(plan_json) for plan_json in plan_jsons[start:start + batch_size]]
+                nodes, indexes, tree_ids = self.collate(batch)
+                y.append(self.model(nodes, indexes, tree_ids, len(batch)).numpy()[:, 0])
+        if len(y) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.expm1(np.concatenate(y)).astype(np.float32)
+
+    def save(self, model_file):
+        torch.save({"index_names": self.index_names, "state_dict": self.model.state_dict()}, model_file)
+
+    def load(self, model_file):
+        checkpoint = torch.load(model_file)
+        self.index_names = checkpoint["index_names"]
+        self.model = TreeNet(self.num_of_features())
+        self.model.load_state_dict(checkpoint["state_dict"])
+        self.model.eval()
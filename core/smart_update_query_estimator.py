@@ -0,0 +1,128 @@
+import argparse
+import numpy as np
+from smart_online_query_estimator import Online_Query_Estimator
+from smart_util import Util
+
+
+###########################################################
+#  smart_update_query_estimator.py
+#
+#  Replay observed executions in file order into an Online Query Estimator,
+#    and write snapshots of the updated models as a bundle file.
+#
+#  -d   / --dimension            dimension: dimension of the queries. Default: 3
+#  -nj  / --num_join             number of join methods. Default: 1
+#  -qmp / --qe_model_path        input bundle file or path of models to start the Query Estimator from
+#  -sf  / --sels_file            input file that holds observed queries' selectivities
+#  -lf  / --labeled_file         input file that holds observed queries' real running times
+#  -ob  / --out_bundle           output bundle file to write the snapshots to
+#  -si  / --snapshot_interval    number of updates between two snapshots. Default: 100
+#  -ff  / --forgetting           forgetting factor of the recursive least squares. Default: 0.99
+#  -ic  / --initial_covariance   initial covariance of the recursive least squares. Default: 1.0
+#  -st  / --sample_table         sample table the selectivities are collected on. Default: None
+#  -cs  / --censoring            target of the timed-out observations whose estimate is below the timeout,
+#                                drop (the timeout cut) / tobit (E[y | y >= timeout]). Default: drop
+#  -ap  / --all_plans            observe all plans' times of each query,
+#                                otherwise only the plan with the minimum estimated time. Default: False
+#
+###########################################################
+
+
+if __name__ == "__main__":
+
+    # parse arguments
+    parser = argparse.ArgumentParser(description="Update Query Estimator online from observed executions.")
+    parser.add_argument("-d", "--dimension",
+                        help="dimension: dimension of the queries. Default: 3",
+                        type=int, required=False, default=3)
+    parser.add_argument("-nj", "--num_join", help="num_join: number of join methods. Default: 1",
+                        required=False, type=int, default=1)
+    parser.add_argument("-qmp", "--qe_model_path",
+                        help="qe_model_path: input bundle file or path of models to start the Query Estimator from",
+                        type=str, required=True)
+    parser.add_argument("-sf", "--sels_file",
+                        help="sels_file: input file that holds observed queries' selectivities",
+                        type=str, required=True)
+    parser.add_argument("-lf", "--labeled_file",
+                        help="labeled_file: input file that holds observed queries' real running times",
+                        type=str, required=True)
+    parser.add_argument("-ob", "--out_bundle",
+                        help="out_bundle: output bundle file to write the snapshots to",
+                        type=str, required=True)
+    parser.add_argument("-si", "--snapshot_interval",
+                        help="snapshot_interval: number of updates between two snapshots. Default: 100",
+                        type=int, required=False, default=100)
+    parser.add_argument("-ff", "--forgetting",
+                        help="forgetting: forgetting factor of the recursive least squares. Default: 0.99",
+                        type=float, required=False, default=0.99)
+    parser.add_argument("-ic", "--initial_covariance",
+                        help="initial_covariance: initial covariance of the recursive least squares. Default: 1.0",
+                        type=float, required=False, default=1.0)
+    parser.add_argument("-st", "--sample_table",
+                        help="sample_table: sample table the selectivities are collected on. Default: None",
+                        type=str, required=False, default=None)
+    parser.add_argument("-cs", "--censoring",
+                        help="censoring: target of the timed-out observations, drop / tobit. Default: drop",
+                        type=str, required=False, default="drop", choices=Online_Query_Estimator.censoring_modes)
+    parser.add_argument("-ap", "--all_plans",
+                        help="all_plans: observe all plans' times of each query, "
+                             "otherwise only the plan with the minimum estimated time. Default: False",
+                        dest='all_plans', action='store_true')
+    parser.set_defaults(all_plans=False)
+    args = parser.parse_args()
+
+    dimension = args.dimension
+    num_of_joins = args.num_join
+    qe_model_path = args.qe_model_path
+    queries_sels_file = args.sels_file
+    labeled_queries_file = args.labeled_file
+    out_bundle = args.out_bundle
+    all_plans = args.all_plans
+
+    num_of_plans = Util.num_of_plans(dimension, num_of_joins)
+
+    # 1. read queries' selectivities into memory
+    queries_sels = Util.load_queries_sels_file(dimension, queries_sels_file)
+    queries_sels_map = {}
+    for query_sels in queries_sels:
+        queries_sels_map[query_sels["id"]] = query_sels
+
+    # 2. read queries' real running times into memory
+    labeled_queries = Util.load_labeled_queries_file(dimension, labeled_queries_file, num_of_joins)
+
+    # 3. load the Online Query Estimator
+    query_estimator = Online_Query_Estimator(dimension,
+                                             num_of_joins,
+                                             forgetting=args.forgetting,
+                                             initial_covariance=args.initial_covariance,
+                                             snapshot_file=out_bundle,
+                                             snapshot_interval=args.snapshot_interval,
+                                             sample_table=args.sample_table,
+                                             censoring=args.censoring)
+    query_estimator.load(qe_model_path, args.sample_table)
+    query_estimator.start()
+
+    # 4. replay observed executions in file order,
+    #    the error is measured before each update (i.e., on unseen observations)
+    print("start updating query estimator ...")
+    abs_errors = []
+    for index, labeled_query in enumerate(labeled_queries):
+        query_sels = queries_sels_map[labeled_query["id"]]
+        estimate_times = query_estimator.predict_all(query_sels)
+        if all_plans:
+            plans = range(1, num_of_plans + 1)
+        else:
+            plans = [int(np.argmin(estimate_times)) + 1]
+        for plan in plans:
+            real_time = labeled_query["time_" + str(plan)]
+            if query_estimator.update(query_sels, plan, real_time):
+                abs_errors.append(abs(float(estimate_times[plan - 1]) - real_time))
+        if (index + 1) % 100 == 0 and len(abs_errors) > 0:
+            print("    " + str(index + 1) + " queries replayed, mean absolute error = " +
+                  str(np.mean(abs_errors[-100:])))
+
+    # 5. write the final snapshot
+    query_estimator.snapshot()
+    print("query estimator updated by " + str(query_estimator.num_of_updates) + " executions (" +
+          str(query_estimator.num_of_censored) + " timeouts censored, " +
+          str(query_estimator.num_of_skipped) + " skipped), bundle saved to file [" + out_bundle + "].")
@@ -1,6 +1,9 @@
 import csv
+import json
 import math
+import numpy as np
 import os.path
+from smart_plan_encoder import PlanEncoder
 
 
 class Util:
@@ -15,16 +18,17 @@ class Util:
             num_of_plans += num_of_sampling_plans
         return num_of_plans
     
+    # whether the plan_id uses the index of the given hint_id,
+    #   e.g., dimension = 3, plan_id = 6 (110) uses hint_id 0 and 1, not hint_id 2
     @staticmethod
     def use_index(hint_id, plan_id, dimension, num_of_joins=1):
-        # translate the plan_id number into binary bits array
-        # e.g., 6 -> 0,0,0,0,0,1,1,0
-        plan_bits = [int(x) for x in '{:08b}'.format(plan_id)]
-        # plan_bit_id that represents the hint_id given dimension
-        plan_bit_id = len(plan_bits) - dimension + hint_id
-        if plan_bits[plan_bit_id] == 1:
-            return True
-        return False
+        return PlanEncoder.get(dimension, num_of_joins).use_index(hint_id, plan_id)
+
+    # hint ids of the indexes a plan uses, ascending
+    #   e.g., dimension = 3, plan_id = 6 (110) -> (0, 1)
+    @staticmethod
+    def index_set_of_plan(plan_id, dimension, num_of_joins=1):
+        return PlanEncoder.get(dimension, num_of_joins).index_set_of_plan(plan_id)
     
     @staticmethod
     def num_of_sampling_plans(dimension, num_of_sample_ratios):
@@ -41,12 +45,8 @@ class Util:
 
     @staticmethod
     def reduce_join_method(plan, dimension):
-        join_method = 1
         # reduce plan to be the index_selection plan within one join method
-        while plan > (2 ** dimension - 1):
-            plan = plan - (2 ** dimension - 1)
-            join_method += 1
-        return plan, join_method
+        return PlanEncoder.reduce(plan, dimension)
 
     # This function decomposes an integer (≥1) into a sum of several powers of 2.
     #   Example 1: if n = 6 (0000,0110), then output [4, 2], because 6 = 4 (2^2) + 2 (2^1)
@@ -74,13 +74,10 @@ class Util:
             if plan < 1 or plan > num_of_plans:
                 print("plan " + str(plan) + " is invalid given dimension "+ str(dimension) + ", number of joins " + str(num_of_joins))
                 exit(0)
-            plan, _ = Util.reduce_join_method(plan, dimension)
+            return list(PlanEncoder.get(dimension, num_of_joins).sel_ids_of_plan(plan))
         # Note: when num_of_joins == 1, parameter dimension is not used at all
         # get the sel_ids of a reduced plan within 1 ~ 2**dimension-1
-        sel_ids = Util.decompose_to_binary_numbers(plan)
-        if plan not in sel_ids:
-            sel_ids.append(plan)
-        return sel_ids
+        return PlanEncoder.decompose(plan)
     
     # return the selectivity value ids need to be collected to estimate query time of a given sampling plan
     @staticmethod
@@ -93,6 +90,62 @@ class Util:
         sel_ids.append(2**(dimension - 1 - hint_id))
         return sel_ids
 
+    # SQL of the single scan probing query of selectivities of all filtering combinations:
+    #   SELECT count(*) FILTER (WHERE <fc 1>), ..., count(*) FILTER (WHERE <fc 2**d-1>)
+    #     FROM table t
+    #    WHERE p0 OR p1 OR ... OR p(d-1)
+    #   where <fc> is the AND of the predicates of the dimensions in filtering combination fc,
+    #   every combination has at least one predicate, so only rows matching the union need to be counted.
+    # @param table - table name on which to collect selectivities
+    # @param predicates - [list of d predicate strings on table alias t], in the order of hint ids
+    # @return - str, SQL returning one row of 2**d-1 counts, count of filtering combination fc in column fc - 1
+    @staticmethod
+    def sels_sql(table, predicates):
+        dimension = len(predicates)
+        counts = []
+        for fc in range(1, 2 ** dimension):
+            conditions = [predicates[hint_id] for hint_id in range(0, dimension) if Util.use_index(hint_id, fc, dimension)]
+            counts.append("count(*) FILTER (WHERE " + " AND ".join(conditions) + ")")
+        return "SELECT " + ", ".join(counts) + \
+               "  FROM " + table + " t " + \
+               " WHERE " + " OR ".join("(" + predicate + ")" for predicate in predicates)
+
+    # build the batched probing query of the selectivities of all filtering combinations on many queries:
+    #   the parameters of the queries are shipped in a VALUES list q(qid, parameter_1, parameter_2, ...),
+    #   joined LATERAL to the single scan probing query (see sels_sql()) on the predicates over q,
+    #   so that the sels of all the queries are counted server-side in one statement (one round trip).
+    # @param table - table name on which to collect selectivities
+    # @param parameters - [list of (query key, SQL type)], see dataset's sel_parameters()
+    # @param queries - [list of query objects], each having all the keys of parameters
+    # @param predicates - [list of d predicate strings on table alias t and parameters alias q],
+    #                     see dataset's batch_sel_predicates()
+    # @return - SQL string, whose rows are (qid, count(1), count(2), ..., count(2**d-1)) ordered by qid,
+    #           qid being the index of the query in queries
+    @staticmethod
+    def batch_sels_sql(table, parameters, queries, predicates):
+        values = []
+        for qid, query in enumerate(queries):
+            literals = ["'" + str(query[key]).replace("'", "''") + "'::" + sql_type for key, sql_type in parameters]
+            values.append("(" + ", ".join([str(qid)] + literals) + ")")
+        return "SELECT q.qid, s.* " + \
+               "  FROM (VALUES " + ", ".join(values) + ") " + \
+               "       AS q(" + ", ".join(["qid"] + [key for key, sql_type in parameters]) + ") " + \
+               " CROSS JOIN LATERAL (" + Util.sels_sql(table, predicates) + ") s " + \
+               " ORDER BY q.qid"
+
+    # estimate the result cardinality of a query from its selectivities collected on a sample table,
+    #   i.e., the _card passed to time_sampling_query()
+    # @param query_sels - {id: 1, sel_1: 0.1, ..., sel_(2**d-1): 0.01}
+    # @param table_size - size of the full table of the dataset
+    # @param sels_table_size - size of the sample table the sels were collected on,
+    #                            a zero sel is treated as 1 / sels_table_size (one row)
+    @staticmethod
+    def estimate_cardinality(query_sels, dimension, table_size, sels_table_size):
+        query_sel = query_sels["sel_" + str(2 ** dimension - 1)]
+        if query_sel == 0.0:
+            query_sel = 1.0 / sels_table_size
+        return query_sel * table_size
+
     # return the number of selectivity values needed to estimate query time of a given plan
     @staticmethod
     def number_of_sels(plan):
@@ -125,6 +178,56 @@ class Util:
                     row.append(query["time_" + str(plan_id) + "_std"])
                 csv_writer.writerow(row)
 
+    # dump censoring flags of labeled queries out to file,
+    #   censored_[plan_id] = 1 if the plan of the query is labeled as a timeout (its time is the timeout cut)
+    @staticmethod
+    def dump_labeled_censored_queries_file(dimension, out_file, labeled_queries, num_of_joins=1):
+        num_of_plans = Util.num_of_plans(dimension, num_of_joins)
+        with open(out_file, "w") as csv_out:
+            csv_writer = csv.writer(csv_out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            for query in labeled_queries:
+                row = [query["id"]]
+                for plan_id in range(0, num_of_plans + 1):
+                    row.append(query["censored_" + str(plan_id)])
+                csv_writer.writerow(row)
+
+    # load censoring flags of labeled queries into memory
+    # @return - [list of {id, censored_0, censored_1, ..., censored_(num_of_plans)}], each flag being 0 / 1
+    @staticmethod
+    def load_labeled_censored_queries_file(dimension, labeled_censored_queries_file, num_of_joins=1):
+        num_of_plans = Util.num_of_plans(dimension, num_of_joins)
+        labeled_censored_queries = []
+        if os.path.isfile(labeled_censored_queries_file):
+            with open(labeled_censored_queries_file, "r") as csv_in:
+                csv_reader = csv.reader(csv_in, delimiter=',', quotechar='"')
+                for row in csv_reader:
+                    query = {"id": int(row[0])}
+                    for plan_id in range(0, num_of_plans + 1):
+                        query["censored_" + str(plan_id)] = int(row[1 + plan_id])
+                    labeled_censored_queries.append(query)
+        else:
+            print("[" + labeled_censored_queries_file + "] does NOT exist! Exit!")
+            exit(0)
+        return labeled_censored_queries
+
+    # dump metadata of labeled queries (e.g., the cache mode, timeout, settings of the measurements)
+    #   format (json): {"cache_mode": "warm", "timeout": 4000, ...}
+    @staticmethod
+    def dump_labeling_metadata_file(out_file, metadata):
+        with open(out_file, "w") as json_out:
+            json.dump(metadata, json_out, indent=2, sort_keys=True)
+
+    # load metadata of labeled queries into memory
+    # @return - dict
+    @staticmethod
+    def load_labeling_metadata_file(metadata_file):
+        if os.path.isfile(metadata_file):
+            with open(metadata_file, "r") as json_in:
+                return json.load(json_in)
+        else:
+            print("[" + metadata_file + "] does NOT exist! Exit!")
+            exit(0)
+
     # load labeled queries into memory
     @staticmethod
     def load_labeled_queries_file(dimension, labeled_queries_file, num_of_joins=1):
@@ -172,6 +275,35 @@ class Util:
                     row.append(query["time_" + str(plan_id) + "_std"])
                 csv_writer.writerow(row)
 
+    # dump labeled single scan sel queries out to file, each row being [id, time_sels, time_sels_std]
+    @staticmethod
+    def dump_labeled_sels_queries_file(out_file, labeled_sels_queries):
+        with open(out_file, "w") as csv_out:
+            csv_writer = csv.writer(csv_out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            for query in labeled_sels_queries:
+                csv_writer.writerow([query["id"], query["time_sels"], query["time_sels_std"]])
+
+    # load list of labeled single scan sel queries files into memory
+    # @return - [list of [list of {id, time_sels, time_sels_std}]], one inside list for each file
+    @staticmethod
+    def load_labeled_sels_queries_files(labeled_sels_queries_files):
+        samples_labeled_sels_queries = []
+        for labeled_sels_queries_file in labeled_sels_queries_files:
+            labeled_sels_queries = []
+            if os.path.isfile(labeled_sels_queries_file):
+                with open(labeled_sels_queries_file, "r") as csv_in:
+                    csv_reader = csv.reader(csv_in, delimiter=',', quotechar='"')
+                    for row in csv_reader:
+                        labeled_sels_queries.append({"id": int(row[0]),
+                                                     "time_sels": float(row[1]),
+                                                     "time_sels_std": float(row[2])})
+                print("[" + labeled_sels_queries_file + "] loaded into memory.")
+            else:
+                print("[" + labeled_sels_queries_file + "] does NOT exist! Exit!")
+                exit(0)
+            samples_labeled_sels_queries.append(labeled_sels_queries)
+        return samples_labeled_sels_queries
+
     # load labeled_sel_queries_file into memory
     @staticmethod
     def load_labeled_sel_queries_file(dimension, labeled_sel_queries_file):
@@ -259,6 +391,36 @@ class Util:
             exit(0)
         return queries_sels
 
+    # load a csv file of rows [id, value_1, ..., value_n] (e.g., queries sels file, labeled queries file)
+    #   as aligned numpy arrays
+    # @return - (numpy 1d int array of ids, numpy 2d float array [number of rows x num_of_values])
+    @staticmethod
+    def load_matrix_file(in_file, num_of_values):
+        if not os.path.isfile(in_file):
+            print("[" + in_file + "] does NOT exist! Exit!")
+            exit(0)
+        matrix = np.loadtxt(in_file, delimiter=",", ndmin=2, dtype=np.float64)
+        if matrix.shape[1] < num_of_values + 1:
+            print("[" + in_file + "] has " + str(matrix.shape[1]) + " columns, " + str(num_of_values + 1) +
+                  " columns are expected!")
+            exit(0)
+        return matrix[:, 0].astype(np.int64), matrix[:, 1:num_of_values + 1]
+
+    # row positions of given ids in row_ids
+    # @param ids - numpy 1d int array, ids to look up
+    # @param row_ids - numpy 1d int array, ids of the rows
+    # @return - numpy 1d int array positions, row_ids[positions] == ids
+    @staticmethod
+    def align_rows(ids, row_ids):
+        order = np.argsort(row_ids, kind="stable")
+        positions = np.searchsorted(row_ids[order], ids)
+        positions = np.minimum(positions, len(row_ids) - 1)
+        found = row_ids[order[positions]] == ids
+        if not np.all(found):
+            print("ids " + str(ids[~found][:10].tolist()) + " are NOT found!")
+            exit(0)
+        return order[positions]
+
     # load list of sel_query_files into memory
     @staticmethod
     def load_queries_sels_files(dimension, queries_sels_files):
@@ -765,6 +927,9 @@ class Util:
             result_file = result_file + "_s" + str(_sample_ratio_id)
         
         result_file = result_file + ".csv"
+        # result transferred in binary (see PostgreSQL.query_points())
+        if isinstance(_result, np.ndarray):
+            _result = _result.tolist()
         with open(result_file, "w") as csv_out:
                 csv_writer = csv.writer(csv_out, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
                 csv_writer.writerows(_result)
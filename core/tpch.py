@@ -1,6 +1,5 @@
 import csv
 import os.path
-import time
 from smart_util import Util
 
 
@@ -46,6 +45,9 @@ class TPCH:
     min_receipt_date = "1992-01-03"
     max_receipt_date = "1998-12-31"
     max_receipt_date_zoom = 12  # (1998-12-31 - 1992-01-03) = 2555 days, log2(2555) = 11.3
+    # result rows of construct_sql_str() are (L_QUANTITY, L_DISCOUNT), not (id, x, y) points
+    points_result = False
+    tables = [table]
     indexes = [
         index_on_extended_price,
         index_on_ship_date,
@@ -81,31 +83,24 @@ class TPCH:
 
         # generate hint if plan is 1 ~ 7
         if 1 <= _plan <= 7:
-            # translate the _plan number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
             hint = "/*+ BitmapScan(t"
 
             # L_EXTENDEDPRICE
-            if plan_bits[5] == 1:
+            if Util.use_index(0, _plan, 3):
                 hint = hint + " " + TPCH.index_on_extended_price
 
             # L_SHIPDATE
-            if plan_bits[6] == 1:
+            if Util.use_index(1, _plan, 3):
                 hint = hint + " " + TPCH.index_on_ship_date
 
             # L_RECEIPTDATE
-            if plan_bits[7] == 1:
+            if Util.use_index(2, _plan, 3):
                 hint = hint + " " + TPCH.index_on_receipt_date
 
             hint = hint + ") */"
             sql = hint + sql
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
     
     # time probing query of selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -132,29 +127,22 @@ class TPCH:
 
         # set up filtering on sample table if filtering combination is 1 ~ 7
         if 1 <= _fc <= 7:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # L_EXTENDEDPRICE
-            if fc_bits[5] == 1:
+            if Util.use_index(0, _fc, 3):
                 sql = sql + " AND t.L_EXTENDEDPRICE between " + _query["extended_price_start"] + " and " + \
                     _query["extended_price_end"]
 
             # L_SHIPDATE
-            if fc_bits[6] == 1:
+            if Util.use_index(1, _fc, 3):
                 sql = sql + " AND t.L_SHIPDATE between '" + _query["ship_date_start"] + "' and '" + \
                     _query["ship_date_end"] + "'"
 
             # L_RECEIPTDATE
-            if fc_bits[7] == 1:
+            if Util.use_index(2, _fc, 3):
                 sql = sql + " AND t.L_RECEIPTDATE between '" + _query["receipt_date_start"] + "' and '" + \
                     _query["receipt_date_end"] + "'"
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
     
     # collect selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -182,22 +170,18 @@ class TPCH:
 
         # set up filtering on sample table if filtering combination is 1 ~ 7
         if 1 <= _fc <= 7:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # L_EXTENDEDPRICE
-            if fc_bits[5] == 1:
+            if Util.use_index(0, _fc, 3):
                 sql = sql + " AND t.L_EXTENDEDPRICE between " + _query["extended_price_start"] + " and " + \
                     _query["extended_price_end"]
 
             # L_SHIPDATE
-            if fc_bits[6] == 1:
+            if Util.use_index(1, _fc, 3):
                 sql = sql + " AND t.L_SHIPDATE between '" + _query["ship_date_start"] + "' and '" + \
                     _query["ship_date_end"] + "'"
 
             # L_RECEIPTDATE
-            if fc_bits[7] == 1:
+            if Util.use_index(2, _fc, 3):
                 sql = sql + " AND t.L_RECEIPTDATE between '" + _query["receipt_date_start"] + "' and '" + \
                     _query["receipt_date_end"] + "'"
 
@@ -205,6 +189,87 @@ class TPCH:
         sel = sel[0][0]
         return float(sel) / float(_table_size)
     
+    # filtering predicates of given query on each dimension, in the order of hint ids
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @return - [list of _dimension predicate strings on table alias t]
+    # TODO - dimension is not used for TPCH dataset, only support 3D.
+    @staticmethod
+    def sel_predicates(_dimension, _query):
+        return [
+            # L_EXTENDEDPRICE
+            "t.L_EXTENDEDPRICE between " + _query["extended_price_start"] + " and " + _query["extended_price_end"],
+            # L_SHIPDATE
+            "t.L_SHIPDATE between '" + _query["ship_date_start"] + "' and '" + _query["ship_date_end"] + "'",
+            # L_RECEIPTDATE
+            "t.L_RECEIPTDATE between '" + _query["receipt_date_start"] + "' and '" + _query["receipt_date_end"] + "'"
+        ]
+
+    # collect selectivities of all filtering combinations on given query in one scan of the table
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @param _table - table name on which to collect selectivities
+    # @param _table_size - the size of the table provided above
+    # @return - [list of 2**_dimension-1 floats], selectivity [0, 1] of filtering combination fc at index fc - 1
+    @staticmethod
+    def sels_query(_db, _dimension, _query, _table, _table_size):
+        sql = Util.sels_sql(_table, TPCH.sel_predicates(_dimension, _query))
+        sels = _db.query(sql)  # [(1, 2, ..., 2**d-1)]
+        return [float(sel) / float(_table_size) for sel in sels[0]]
+
+    # time the single scan probing query of selectivities of all filtering combinations on given query
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @param _table - table name on which to run the selectivity probing query
+    # @return - time (seconds) of the single scan probing query of all filtering combinations on given query
+    @staticmethod
+    def time_sels_query(_db, _dimension, _query, _table):
+        sql = Util.sels_sql(_table, TPCH.sel_predicates(_dimension, _query))
+        return _db.time(sql)
+
+    # parameters of the selectivity predicates of a query, shipped in the VALUES list of the batched probing query
+    # @param _dimension - dimension of queries
+    # @return - [list of (query key, SQL type)]
+    @staticmethod
+    def sel_parameters(_dimension):
+        return [("extended_price_start", "numeric"), ("extended_price_end", "numeric"),
+                ("ship_date_start", "date"), ("ship_date_end", "date"),
+                ("receipt_date_start", "date"), ("receipt_date_end", "date")]
+
+    # selectivity predicates on parameters of alias q, in the order of hint ids, see sel_parameters()
+    # @param _dimension - dimension of queries
+    # @return - [list of _dimension predicate strings on table alias t and parameters alias q]
+    @staticmethod
+    def batch_sel_predicates(_dimension):
+        return [
+            # L_EXTENDEDPRICE
+            "t.L_EXTENDEDPRICE between q.extended_price_start and q.extended_price_end",
+            # L_SHIPDATE
+            "t.L_SHIPDATE between q.ship_date_start and q.ship_date_end",
+            # L_RECEIPTDATE
+            "t.L_RECEIPTDATE between q.receipt_date_start and q.receipt_date_end"
+        ]
+
+    # collect selectivities of all filtering combinations on given queries in one batched probing query
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _queries - [list of query objects], see sel_query()
+    # @param _table - table name on which to collect selectivities
+    # @param _table_size - the size of the table provided above
+    # @return - [list of [list of 2**_dimension-1 floats]], sels of each query in the order of _queries,
+    #           see sels_query()
+    @staticmethod
+    def batch_sels_query(_db, _dimension, _queries, _table, _table_size):
+        sql = Util.batch_sels_sql(_table, TPCH.sel_parameters(_dimension), _queries,
+                                  TPCH.batch_sel_predicates(_dimension))
+        rows = _db.query(sql)  # [(qid, 1, 2, ..., 2**d-1), ...]
+        if len(rows) != len(_queries):
+            print("Batched probing query of " + str(len(_queries)) + " queries failed on table [" + _table + "]!")
+            exit(0)
+        return [[float(sel) / float(_table_size) for sel in row[1:]] for row in rows]
+
     # load queries into memory
     # TODO - dimension is not used for TPCH dataset, only support 3D.
     @staticmethod
@@ -274,24 +339,22 @@ class TPCH:
             print("Given plan id " + str(_plan) + " is not invalid!")
             exit(0)
 
+        hint = ""
+
         # generate hint if plan is 1 ~ 7
         if 1 <= _plan <= 7:
-            # translate the _plan number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
             hint = "/*+ BitmapScan(t"
 
             # L_EXTENDEDPRICE
-            if plan_bits[5] == 1:
+            if Util.use_index(0, _plan, 3):
                 hint = hint + " " + TPCH.index_on_extended_price
 
             # L_SHIPDATE
-            if plan_bits[6] == 1:
+            if Util.use_index(1, _plan, 3):
                 hint = hint + " " + TPCH.index_on_ship_date
 
             # L_RECEIPTDATE
-            if plan_bits[7] == 1:
+            if Util.use_index(2, _plan, 3):
                 hint = hint + " " + TPCH.index_on_receipt_date
 
             hint = hint + ") */"
@@ -50,6 +50,9 @@ class Twitter:
     min_user_statues_count = -1
     max_user_statues_count = 2653135
     max_user_statues_count_zoom = 22  # log2(2653135 - (-1)) = 21.33
+    # result rows of construct_sql_str() are (id, x, y) points (see PostgreSQL.query_points())
+    points_result = True
+    tables = [table]
     indexes = [
         index_on_text,
         index_on_time,
@@ -104,31 +107,24 @@ class Twitter:
 
         # generate hint if plan is 1 ~ 7
         if 1 <= _plan <= 7:
-            # translate the _plan number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
             hint = "/*+ BitmapScan(t"
 
             # text
-            if plan_bits[5] == 1:
+            if Util.use_index(0, _plan, 3):
                 hint = hint + " " + Twitter.index_on_text
 
             # time
-            if plan_bits[6] == 1:
+            if Util.use_index(1, _plan, 3):
                 hint = hint + " " + Twitter.index_on_time
 
             # space
-            if plan_bits[7] == 1:
+            if Util.use_index(2, _plan, 3):
                 hint = hint + " " + Twitter.index_on_space
 
             hint = hint + ") */"
             sql = hint + sql
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
 
     # time given query using given plan
     # @param _db - handle to database util
@@ -161,35 +157,28 @@ class Twitter:
 
         # generate hint if plan is 1 ~ 15
         if 1 <= _plan <= 15:
-            # translate the _plan number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
             hint = "/*+ BitmapScan(t"
 
             # text
-            if plan_bits[4] == 1:
+            if Util.use_index(0, _plan, 4):
                 hint = hint + " " + Twitter.index_on_text
 
             # create_at
-            if plan_bits[5] == 1:
+            if Util.use_index(1, _plan, 4):
                 hint = hint + " " + Twitter.index_on_time
 
             # coordinate
-            if plan_bits[6] == 1:
+            if Util.use_index(2, _plan, 4):
                 hint = hint + " " + Twitter.index_on_space
 
             # user_followers_count
-            if plan_bits[7] == 1:
+            if Util.use_index(3, _plan, 4):
                 hint = hint + " " + Twitter.index_on_user_followers_count
 
             hint = hint + ") */"
             sql = hint + sql
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
 
     # time given query using given plan
     # @param _db - handle to database util
@@ -226,39 +215,32 @@ class Twitter:
 
         # generate hint if plan is 1 ~ 31
         if 1 <= _plan <= 31:
-            # translate the _plan number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
             hint = "/*+ BitmapScan(t"
 
             # text
-            if plan_bits[3] == 1:
+            if Util.use_index(0, _plan, 5):
                 hint = hint + " " + Twitter.index_on_text
 
             # create_at
-            if plan_bits[4] == 1:
+            if Util.use_index(1, _plan, 5):
                 hint = hint + " " + Twitter.index_on_time
 
             # coordinate
-            if plan_bits[5] == 1:
+            if Util.use_index(2, _plan, 5):
                 hint = hint + " " + Twitter.index_on_space
 
             # user_followers_count
-            if plan_bits[6] == 1:
+            if Util.use_index(3, _plan, 5):
                 hint = hint + " " + Twitter.index_on_user_followers_count
 
             # user_statues_count
-            if plan_bits[7] == 1:
+            if Util.use_index(4, _plan, 5):
                 hint = hint + " " + Twitter.index_on_user_statues_count
 
             hint = hint + ") */"
             sql = hint + sql
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
 
     # time probing query of selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -303,27 +285,20 @@ class Twitter:
 
         # set up filtering on sample table if filtering combination is 1 ~ 7
         if 1 <= _fc <= 7:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # text
-            if fc_bits[5] == 1:
+            if Util.use_index(0, _fc, 3):
                 sql = sql + " AND to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')"
 
             # time
-            if fc_bits[6] == 1:
+            if Util.use_index(1, _fc, 3):
                 sql = sql + " AND t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # space
-            if fc_bits[7] == 1:
+            if Util.use_index(2, _fc, 3):
                 sql = sql + " AND t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                        "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
 
     # time probing query of selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -351,32 +326,25 @@ class Twitter:
 
         # set up filtering on sample table if filtering combination is 1 ~ 15
         if 1 <= _fc <= 15:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # text
-            if fc_bits[4] == 1:
+            if Util.use_index(0, _fc, 4):
                 sql = sql + " AND to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')"
 
             # time
-            if fc_bits[5] == 1:
+            if Util.use_index(1, _fc, 4):
                 sql = sql + " AND t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # space
-            if fc_bits[6] == 1:
+            if Util.use_index(2, _fc, 4):
                 sql = sql + " AND t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                        "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
             # user_followers_count
-            if fc_bits[7] == 1:
+            if Util.use_index(3, _fc, 4):
                 sql = sql + " AND t.user_followers_count between " + str(_query["user_followers_count_start"]) + \
                                                            " and " + str(_query["user_followers_count_end"])
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
 
     # time probing query of selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -407,37 +375,30 @@ class Twitter:
 
         # set up filtering on sample table if filtering combination is 1 ~ 31
         if 1 <= _fc <= 31:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # text
-            if fc_bits[3] == 1:
+            if Util.use_index(0, _fc, 5):
                 sql = sql + " AND to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')"
 
             # time
-            if fc_bits[4] == 1:
+            if Util.use_index(1, _fc, 5):
                 sql = sql + " AND t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # space
-            if fc_bits[5] == 1:
+            if Util.use_index(2, _fc, 5):
                 sql = sql + " AND t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                        "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
             # user_followers_count
-            if fc_bits[6] == 1:
+            if Util.use_index(3, _fc, 5):
                 sql = sql + " AND t.user_followers_count between " + str(_query["user_followers_count_start"]) + \
                                                            " and " + str(_query["user_followers_count_end"])
 
             # user_statues_count
-            if fc_bits[7] == 1:
+            if Util.use_index(4, _fc, 5):
                 sql = sql + " AND t.user_statues_count between " + str(_query["user_statues_count_start"]) + \
                                                          " and " + str(_query["user_statues_count_end"])
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
 
     # collect selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -484,20 +445,16 @@ class Twitter:
 
         # set up filtering on sample table if filtering combination is 1 ~ 7
         if 1 <= _fc <= 7:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # text
-            if fc_bits[5] == 1:
+            if Util.use_index(0, _fc, 3):
                 sql = sql + " AND to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')"
 
             # time
-            if fc_bits[6] == 1:
+            if Util.use_index(1, _fc, 3):
                 sql = sql + " AND t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # space
-            if fc_bits[7] == 1:
+            if Util.use_index(2, _fc, 3):
                 sql = sql + " AND t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                        "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
@@ -532,25 +489,21 @@ class Twitter:
 
         # set up filtering on sample table if filtering combination is 1 ~ 15
         if 1 <= _fc <= 15:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # text
-            if fc_bits[4] == 1:
+            if Util.use_index(0, _fc, 4):
                 sql = sql + " AND to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')"
 
             # create_at
-            if fc_bits[5] == 1:
+            if Util.use_index(1, _fc, 4):
                 sql = sql + " AND t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # coordinate
-            if fc_bits[6] == 1:
+            if Util.use_index(2, _fc, 4):
                 sql = sql + " AND t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                        "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
             # user_followers_count
-            if fc_bits[7] == 1:
+            if Util.use_index(3, _fc, 4):
                 sql = sql + " AND t.user_followers_count between " + str(_query["user_followers_count_start"]) + \
                                                            " and " + str(_query["user_followers_count_end"])
 
@@ -588,30 +541,26 @@ class Twitter:
 
         # set up filtering on sample table if filtering combination is 1 ~ 31
         if 1 <= _fc <= 31:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # text
-            if fc_bits[3] == 1:
+            if Util.use_index(0, _fc, 5):
                 sql = sql + " AND to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')"
 
             # create_at
-            if fc_bits[4] == 1:
+            if Util.use_index(1, _fc, 5):
                 sql = sql + " AND t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # coordinate
-            if fc_bits[5] == 1:
+            if Util.use_index(2, _fc, 5):
                 sql = sql + " AND t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                        "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
             # user_followers_count
-            if fc_bits[6] == 1:
+            if Util.use_index(3, _fc, 5):
                 sql = sql + " AND t.user_followers_count between " + str(_query["user_followers_count_start"]) + \
                                                            " and " + str(_query["user_followers_count_end"])
 
             # user_statues_count
-            if fc_bits[7] == 1:
+            if Util.use_index(4, _fc, 5):
                 sql = sql + " AND t.user_statues_count between " + str(_query["user_statues_count_start"]) + \
                                                          " and " + str(_query["user_statues_count_end"])
 
@@ -619,6 +568,114 @@ class Twitter:
         sel = sel[0][0]
         return float(sel) / float(_table_size)
 
+    # filtering predicates of given query on each dimension, in the order of hint ids
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @return - [list of _dimension predicate strings on table alias t]
+    @staticmethod
+    def sel_predicates(_dimension, _query):
+        if _dimension < 3 or _dimension > 5:
+            print("Given dimension " + str(_dimension) + " is not supported in Twitter.sel_predicates() yet!")
+            exit(0)
+        predicates = [
+            # text
+            "to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')",
+            # create_at
+            "t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'",
+            # coordinate
+            "t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
+                                 "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
+        ]
+        if _dimension >= 4:
+            # user_followers_count
+            predicates.append("t.user_followers_count between " + str(_query["user_followers_count_start"]) +
+                              " and " + str(_query["user_followers_count_end"]))
+        if _dimension >= 5:
+            # user_statues_count
+            predicates.append("t.user_statues_count between " + str(_query["user_statues_count_start"]) +
+                              " and " + str(_query["user_statues_count_end"]))
+        return predicates
+
+    # collect selectivities of all filtering combinations on given query in one scan of the table
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @param _table - table name on which to collect selectivities
+    # @param _table_size - the size of the table provided above
+    # @return - [list of 2**_dimension-1 floats], selectivity [0, 1] of filtering combination fc at index fc - 1
+    @staticmethod
+    def sels_query(_db, _dimension, _query, _table, _table_size):
+        sql = Util.sels_sql(_table, Twitter.sel_predicates(_dimension, _query))
+        sels = _db.query(sql)  # [(1, 2, ..., 2**d-1)]
+        return [float(sel) / float(_table_size) for sel in sels[0]]
+
+    # time the single scan probing query of selectivities of all filtering combinations on given query
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @param _table - table name on which to run the selectivity probing query
+    # @return - time (seconds) of the single scan probing query of all filtering combinations on given query
+    @staticmethod
+    def time_sels_query(_db, _dimension, _query, _table):
+        sql = Util.sels_sql(_table, Twitter.sel_predicates(_dimension, _query))
+        return _db.time(sql)
+
+    # parameters of the selectivity predicates of a query, shipped in the VALUES list of the batched probing query
+    # @param _dimension - dimension of queries
+    # @return - [list of (query key, SQL type)]
+    @staticmethod
+    def sel_parameters(_dimension):
+        parameters = [("keyword", "text"), ("start_time", "timestamp"), ("end_time", "timestamp"),
+                      ("lng0", "float8"), ("lat0", "float8"), ("lng1", "float8"), ("lat1", "float8")]
+        if _dimension >= 4:
+            parameters += [("user_followers_count_start", "int"), ("user_followers_count_end", "int")]
+        if _dimension >= 5:
+            parameters += [("user_statues_count_start", "int"), ("user_statues_count_end", "int")]
+        return parameters
+
+    # selectivity predicates on parameters of alias q, in the order of hint ids, see sel_parameters()
+    # @param _dimension - dimension of queries
+    # @return - [list of _dimension predicate strings on table alias t and parameters alias q]
+    @staticmethod
+    def batch_sel_predicates(_dimension):
+        if _dimension < 3 or _dimension > 5:
+            print("Given dimension " + str(_dimension) + " is not supported in Twitter.batch_sel_predicates() yet!")
+            exit(0)
+        predicates = [
+            # text
+            "to_tsvector('english', t.text)@@to_tsquery('english', q.keyword)",
+            # create_at
+            "t.create_at between q.start_time and q.end_time",
+            # coordinate
+            "t.coordinate <@ box(point(q.lng0, q.lat0), point(q.lng1, q.lat1))"
+        ]
+        if _dimension >= 4:
+            # user_followers_count
+            predicates.append("t.user_followers_count between q.user_followers_count_start and "
+                              "q.user_followers_count_end")
+        if _dimension >= 5:
+            # user_statues_count
+            predicates.append("t.user_statues_count between q.user_statues_count_start and q.user_statues_count_end")
+        return predicates
+
+    # collect selectivities of all filtering combinations on given queries in one batched probing query
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _queries - [list of query objects], see sel_query()
+    # @param _table - table name on which to collect selectivities
+    # @param _table_size - the size of the table provided above
+    # @return - [list of [list of 2**_dimension-1 floats]], sels of each query in the order of _queries,
+    #           see sels_query()
+    @staticmethod
+    def batch_sels_query(_db, _dimension, _queries, _table, _table_size):
+        sql = Util.batch_sels_sql(_table, Twitter.sel_parameters(_dimension), _queries,
+                                  Twitter.batch_sel_predicates(_dimension))
+        rows = _db.query(sql)  # [(qid, 1, 2, ..., 2**d-1), ...]
+        if len(rows) != len(_queries):
+            print("Batched probing query of " + str(len(_queries)) + " queries failed on table [" + _table + "]!")
+            exit(0)
+        return [[float(sel) / float(_table_size) for sel in row[1:]] for row in rows]
+
     # load queries into memory
     @staticmethod
     def load_queries_file(dimension, in_file):
@@ -729,11 +786,12 @@ class Twitter:
             print("Given plan id " + str(_plan) + " is not invalid!")
             exit(0)
 
+        hint = ""
+
         if _plan > 0:
             hint = "/*+ BitmapScan(t"
-            for hint_id in range(0, _dimension):
-                if Util.use_index(hint_id, _plan, _dimension):
-                    hint = hint + " " + Twitter.indexes[hint_id]
+            for hint_id in Util.index_set_of_plan(_plan, _dimension):
+                hint = hint + " " + Twitter.indexes[hint_id]
             hint = hint + ") */"
 
         return hint
@@ -759,7 +817,8 @@ class Twitter:
     #                  and put a limit k = cardinality(_query) * one of the sample ratios [6.25%, 12.5%, 25%, 50%, 75%]
     #                e.g., 0 - hint using idx_tweets_text and limit 6.25%
     #                      6 - hint using idx_tweets_create_at and limit 12.5%
-    # @return - (time (seconds) of running this query using this plan, result of this query using this plan)
+    # @return - (time (seconds) of running this query using this plan,
+    #            result (id, coordinate[0], coordinate[1]) of this query using this plan, see PostgreSQL.query_points())
     @staticmethod
     def time_sampling_query(_db, _dimension, _query, _card, _plan):
 
@@ -784,7 +843,7 @@ class Twitter:
         sql = sql + " limit " + str(sample_k)
 
         start = time.time()
-        result = _db.query(sql)
+        result = _db.query_points(sql)
         end = time.time()
         return end - start, result
 
@@ -1,6 +1,5 @@
 import csv
 import os.path
-import time
 from smart_util import Util
 
 
@@ -62,6 +61,9 @@ class TwitterJoin:
     min_user_statues_count = -1
     max_user_statues_count = 2649730
     max_user_statues_count_zoom = 22  # log2(2649730 - (-1)) = 21.33
+    # result rows of construct_sql_str() are (id, coordinate), not (id, x, y) points
+    points_result = False
+    tables = [tweets_table, users_table]
     indexes = [
         index_on_text,
         index_on_time,
@@ -139,31 +141,24 @@ class TwitterJoin:
 
             # add BitmapScan hint if offset plan is 1 ~ 7
             if 1 <= _plan <= 7:
-                # translate the _plan number into binary bits array
-                # e.g., 6 -> 0,0,0,0,0,1,1,0
-                plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
                 # there is at least one hint on table t
-                if plan_bits[5] + plan_bits[6] + plan_bits[7] >= 1:
+                if any(Util.use_index(hint_id, _plan, 3) for hint_id in range(0, 3)):
                     hint = hint + " BitmapScan(t"
                     # text
-                    if plan_bits[5] == 1:
+                    if Util.use_index(0, _plan, 3):
                         hint = hint + " " + TwitterJoin.index_on_text
                     # create_at
-                    if plan_bits[6] == 1:
+                    if Util.use_index(1, _plan, 3):
                         hint = hint + " " + TwitterJoin.index_on_time
                     # coordinate
-                    if plan_bits[7] == 1:
+                    if Util.use_index(2, _plan, 3):
                         hint = hint + " " + TwitterJoin.index_on_space
                     hint = hint + ")"
 
             hint = hint + " */"
             sql = hint + sql
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
     
     # time given query using given plan
     # @param _db - handle to database util
@@ -217,26 +212,22 @@ class TwitterJoin:
 
             # add BitmapScan hint if offset plan is 1 ~ 15
             if 1 <= _plan <= 15:
-                # translate the _plan number into binary bits array
-                # e.g., 6 -> 0,0,0,0,0,1,1,0
-                plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
                 # there is at least one hint on table t
-                if plan_bits[4] + plan_bits[5] + plan_bits[6] >= 1:
+                if any(Util.use_index(hint_id, _plan, 4) for hint_id in range(0, 3)):
                     hint = hint + " BitmapScan(t"
                     # text
-                    if plan_bits[4] == 1:
+                    if Util.use_index(0, _plan, 4):
                         hint = hint + " " + TwitterJoin.index_on_text
                     # create_at
-                    if plan_bits[5] == 1:
+                    if Util.use_index(1, _plan, 4):
                         hint = hint + " " + TwitterJoin.index_on_time
                     # coordinate
-                    if plan_bits[6] == 1:
+                    if Util.use_index(2, _plan, 4):
                         hint = hint + " " + TwitterJoin.index_on_space
                     hint = hint + ")"
 
                 # use user_followers_count index on table u
-                if plan_bits[7] == 1:
+                if Util.use_index(3, _plan, 4):
                     hint = hint + " BitmapScan(u"
                     hint = hint + " " + TwitterJoin.index_on_user_followers_count
                     hint = hint + ")"
@@ -244,10 +235,7 @@ class TwitterJoin:
             hint = hint + " */"
             sql = hint + sql
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
 
     # time given query using given plan
     # @param _db - handle to database util
@@ -305,42 +293,35 @@ class TwitterJoin:
 
             # add BitmapScan hint if offset plan is 1 ~ 31
             if 1 <= _plan <= 31:
-                # translate the _plan number into binary bits array
-                # e.g., 6 -> 0,0,0,0,0,1,1,0
-                plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
                 # there is at least one hint on table t
-                if plan_bits[3] + plan_bits[4] + plan_bits[5] >= 1:
+                if any(Util.use_index(hint_id, _plan, 5) for hint_id in range(0, 3)):
                     hint = hint + " BitmapScan(t"
                     # text
-                    if plan_bits[3] == 1:
+                    if Util.use_index(0, _plan, 5):
                         hint = hint + " " + TwitterJoin.index_on_text
                     # create_at
-                    if plan_bits[4] == 1:
+                    if Util.use_index(1, _plan, 5):
                         hint = hint + " " + TwitterJoin.index_on_time
                     # coordinate
-                    if plan_bits[5] == 1:
+                    if Util.use_index(2, _plan, 5):
                         hint = hint + " " + TwitterJoin.index_on_space
                     hint = hint + ")"
 
                 # there is at least one hint on table u
-                if plan_bits[6] + plan_bits[7] >= 1:
+                if any(Util.use_index(hint_id, _plan, 5) for hint_id in range(3, 5)):
                     hint = hint + " BitmapScan(u"
                     # user_followers_count
-                    if plan_bits[6] == 1:
+                    if Util.use_index(3, _plan, 5):
                         hint = hint + " " + TwitterJoin.index_on_user_followers_count
                     # user_statues_count
-                    if plan_bits[7] == 1:
+                    if Util.use_index(4, _plan, 5):
                         hint = hint + " " + TwitterJoin.index_on_user_statues_count
                     hint = hint + ")"
 
             hint = hint + " */"
             sql = hint + sql
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
     
     # time probing query of selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -381,27 +362,20 @@ class TwitterJoin:
 
         # set up filtering on sample table if filtering combination is 1 ~ 7
         if 1 <= _fc <= 7:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # text
-            if fc_bits[5] == 1:
+            if Util.use_index(0, _fc, 3):
                 sql = sql + " AND to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')"
 
             # time
-            if fc_bits[6] == 1:
+            if Util.use_index(1, _fc, 3):
                 sql = sql + " AND t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # space
-            if fc_bits[7] == 1:
+            if Util.use_index(2, _fc, 3):
                 sql = sql + " AND t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                        "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
-        start = time.time()
-        _db.query(sql)
-        end = time.time()
-        return end - start
+        return _db.time(sql)
     
     # collect selectivity for given filtering combination on given query
     # @param _db - handle to database util
@@ -444,20 +418,16 @@ class TwitterJoin:
 
         # set up filtering on sample table if filtering combination is 1 ~ 7
         if 1 <= _fc <= 7:
-            # translate the _fc number into binary bits array
-            # e.g., 6 -> 0,0,0,0,0,1,1,0
-            fc_bits = [int(x) for x in '{:08b}'.format(_fc)]
-
             # text
-            if fc_bits[5] == 1:
+            if Util.use_index(0, _fc, 3):
                 sql = sql + " AND to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')"
 
             # time
-            if fc_bits[6] == 1:
+            if Util.use_index(1, _fc, 3):
                 sql = sql + " AND t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'"
 
             # space
-            if fc_bits[7] == 1:
+            if Util.use_index(2, _fc, 3):
                 sql = sql + " AND t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
                                                        "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
 
@@ -465,6 +435,92 @@ class TwitterJoin:
         sel = sel[0][0]
         return float(sel) / float(_table_size)
     
+    # filtering predicates of given query on each dimension, in the order of hint ids
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @return - [list of _dimension predicate strings on table alias t]
+    @staticmethod
+    def sel_predicates(_dimension, _query):
+        if _dimension != 3:
+            print("Given dimension " + str(_dimension) + " is not supported in TwitterJoin.sel_predicates() yet!")
+            exit(0)
+        return [
+            # text
+            "to_tsvector('english', t.text)@@to_tsquery('english', '" + _query["keyword"] + "')",
+            # time
+            "t.create_at between '" + _query["start_time"] + "' and '" + _query["end_time"] + "'",
+            # space
+            "t.coordinate <@ box '((" + str(_query["lng0"]) + "," + str(_query["lat0"]) + ")," \
+                                 "(" + str(_query["lng1"]) + "," + str(_query["lat1"]) + "))'"
+        ]
+
+    # collect selectivities of all filtering combinations on given query in one scan of the table
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @param _table - table name on which to collect selectivities
+    # @param _table_size - the size of the table provided above
+    # @return - [list of 2**_dimension-1 floats], selectivity [0, 1] of filtering combination fc at index fc - 1
+    @staticmethod
+    def sels_query(_db, _dimension, _query, _table, _table_size):
+        sql = Util.sels_sql(_table, TwitterJoin.sel_predicates(_dimension, _query))
+        sels = _db.query(sql)  # [(1, 2, ..., 2**d-1)]
+        return [float(sel) / float(_table_size) for sel in sels[0]]
+
+    # time the single scan probing query of selectivities of all filtering combinations on given query
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _query - query object, see sel_query()
+    # @param _table - table name on which to run the selectivity probing query
+    # @return - time (seconds) of the single scan probing query of all filtering combinations on given query
+    @staticmethod
+    def time_sels_query(_db, _dimension, _query, _table):
+        sql = Util.sels_sql(_table, TwitterJoin.sel_predicates(_dimension, _query))
+        return _db.time(sql)
+
+    # parameters of the selectivity predicates of a query, shipped in the VALUES list of the batched probing query
+    # @param _dimension - dimension of queries
+    # @return - [list of (query key, SQL type)]
+    @staticmethod
+    def sel_parameters(_dimension):
+        return [("keyword", "text"), ("start_time", "timestamp"), ("end_time", "timestamp"),
+                ("lng0", "float8"), ("lat0", "float8"), ("lng1", "float8"), ("lat1", "float8")]
+
+    # selectivity predicates on parameters of alias q, in the order of hint ids, see sel_parameters()
+    # @param _dimension - dimension of queries
+    # @return - [list of _dimension predicate strings on table alias t and parameters alias q]
+    @staticmethod
+    def batch_sel_predicates(_dimension):
+        if _dimension != 3:
+            print("Given dimension " + str(_dimension) + " is not supported in TwitterJoin.batch_sel_predicates() yet!")
+            exit(0)
+        return [
+            # text
+            "to_tsvector('english', t.text)@@to_tsquery('english', q.keyword)",
+            # time
+            "t.create_at between q.start_time and q.end_time",
+            # space
+            "t.coordinate <@ box(point(q.lng0, q.lat0), point(q.lng1, q.lat1))"
+        ]
+
+    # collect selectivities of all filtering combinations on given queries in one batched probing query
+    # @param _db - handle to database util
+    # @param _dimension - dimension of queries
+    # @param _queries - [list of query objects], see sel_query()
+    # @param _table - table name on which to collect selectivities
+    # @param _table_size - the size of the table provided above
+    # @return - [list of [list of 2**_dimension-1 floats]], sels of each query in the order of _queries,
+    #           see sels_query()
+    @staticmethod
+    def batch_sels_query(_db, _dimension, _queries, _table, _table_size):
+        sql = Util.batch_sels_sql(_table, TwitterJoin.sel_parameters(_dimension), _queries,
+                                  TwitterJoin.batch_sel_predicates(_dimension))
+        rows = _db.query(sql)  # [(qid, 1, 2, ..., 2**d-1), ...]
+        if len(rows) != len(_queries):
+            print("Batched probing query of " + str(len(_queries)) + " queries failed on table [" + _table + "]!")
+            exit(0)
+        return [[float(sel) / float(_table_size) for sel in row[1:]] for row in rows]
+
     # load queries into memory
     @staticmethod
     def load_queries_file(dimension, in_file):
@@ -559,6 +615,8 @@ class TwitterJoin:
 
         num_of_plans = Util.num_of_plans(_dimension, TwitterJoin.num_of_joins)
 
+        hint = ""
+
         # generate hint if plan is 1 ~ num_of_plans
         if 1 <= _plan <= num_of_plans:
             hint = " /*+ "
@@ -572,21 +630,17 @@ class TwitterJoin:
 
             # add BitmapScan hint if offset plan is 1 ~ 7
             if 1 <= _plan <= 7:
-                # translate the _plan number into binary bits array
-                # e.g., 6 -> 0,0,0,0,0,1,1,0
-                plan_bits = [int(x) for x in '{:08b}'.format(_plan)]
-
                 # there is at least one hint on table t
-                if plan_bits[5] + plan_bits[6] + plan_bits[7] >= 1:
+                if any(Util.use_index(hint_id, _plan, 3) for hint_id in range(0, 3)):
                     hint = hint + " BitmapScan(t"
                     # text
-                    if plan_bits[5] == 1:
+                    if Util.use_index(0, _plan, 3):
                         hint = hint + " " + TwitterJoin.index_on_text
                     # create_at
-                    if plan_bits[6] == 1:
+                    if Util.use_index(1, _plan, 3):
                         hint = hint + " " + TwitterJoin.index_on_time
                     # coordinate
-                    if plan_bits[7] == 1:
+                    if Util.use_index(2, _plan, 3):
                         hint = hint + " " + TwitterJoin.index_on_space
                     hint = hint + ")"
 